@@ -1,34 +1,133 @@
-from flask import Blueprint, request, send_file, jsonify
-import zipfile
+from flask import Blueprint, current_app, request, send_file, jsonify
+import hashlib
+import os
+import shutil
 from pathlib import Path
+from typing import Optional
+from werkzeug.datastructures import MultiDict
+from werkzeug.formparser import parse_form_data
 from logger import get_logger
+from config import MAX_UPLOAD_MB
+from result_archive import build_result_archive, result_archive_path
+from scheduler import DEFAULT_PRIORITY, PRIORITY_WEIGHTS, read_queue
+from storage_io import atomic_write_json
 
 api = Blueprint('api', __name__)
 
 import uuid
 import json
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class _PartWriter:
+    """
+    Write target of an upload: counts, hashes and writes each chunk it is handed straight into a file.
+    Used as the file container of the multipart parser, so Werkzeug never spools the upload elsewhere.
+    """
+
+    def __init__(self, path: Path):
+        self.file = open(path, 'wb')
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge()
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # The parser rewinds finished files for reading; the upload is only ever read from disk
+        return offset
+
+    def close(self):
+        self.file.close()
+
+
+def _receive_upload(part_path: Path) -> tuple[Optional[_PartWriter], Optional[str], MultiDict]:
+    """
+    Stream the uploaded PDF into part_path in chunks, hashing it on the way. The caller renames the file
+    into place once the upload is complete. Returns the writer of the PDF (None if a multipart body has no
+    'file' field), its filename (None for a raw body) and the form fields.
+    """
+    if request.mimetype == 'application/pdf':
+        writer = _PartWriter(part_path)
+        try:
+            while True:
+                chunk = request.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        finally:
+            writer.close()
+        return writer, None, MultiDict()
+    writers = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        # Only the first file part is the PDF; further ones are counted against the limit and dropped
+        writer = _PartWriter(part_path if not writers else Path(os.devnull))
+        writers.append(writer)
+        return writer
+
+    try:
+        _, form, files = parse_form_data(request.environ, stream_factory=stream_factory,
+                                         max_content_length=current_app.config.get('MAX_CONTENT_LENGTH'))
+    finally:
+        for writer in writers:
+            writer.close()
+    upload = files.get('file')
+    if upload is None or upload.stream is not writers[0]:
+        return None, None, form
+    return writers[0], upload.filename, form
+
 @api.route('/convert', methods=['POST'])
 def submit_pdf_job():
-    """Submit a PDF file for conversion. Returns a job_id for status tracking and download."""
+    """
+    Submit a PDF file for conversion. Returns a job_id for status tracking and download.
+    Accepts a multipart form with a 'file' field, or the raw PDF as an application/pdf request body.
+    Both are written to the job directory as they arrive.
+    """
     logger = get_logger()
-    if 'file' not in request.files:
+    if request.mimetype not in ('multipart/form-data', 'application/pdf'):
         return jsonify({'error': 'No file part'}), 400
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
     from main import STORAGE_ROOT
     job_id = str(uuid.uuid4())
     job_dir = Path(STORAGE_ROOT) / job_id
     job_dir.mkdir(exist_ok=True)
     pdf_path = job_dir / "originalbook.pdf"
-    file.save(pdf_path)
-    # Optionally, write a job metadata file
-    meta = {"status": "pending", "filename": "originalbook.pdf"}
-    with open(job_dir / "job.json", "w", encoding="utf-8") as f:
-        json.dump(meta, f)
-    logger.info(f"Job {job_id} submitted with file originalbook.pdf")
-    return jsonify({"job_id": job_id}), 202
+    part_path = pdf_path.with_name(f"{pdf_path.name}.part")
+    try:
+        try:
+            upload, filename, form = _receive_upload(part_path)
+        except UploadTooLarge:
+            return jsonify({'error': f'File exceeds {MAX_UPLOAD_MB} MB'}), 413
+        if upload is None:
+            return jsonify({'error': 'No file part'}), 400
+        if filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+        priority = request.args.get('priority', form.get('priority', DEFAULT_PRIORITY))
+        if priority not in PRIORITY_WEIGHTS:
+            return jsonify({'error': f"priority must be one of {', '.join(PRIORITY_WEIGHTS)}"}), 400
+        if upload.size == 0:
+            return jsonify({'error': 'Empty file'}), 400
+        size, sha256 = upload.size, upload.digest.hexdigest()
+        # The worker picks the book up as soon as the PDF appears, so its priority has to be there first
+        meta = {"status": "pending", "filename": "originalbook.pdf", "size": size, "sha256": sha256, "priority": priority}
+        atomic_write_json(job_dir / "job.json", meta, indent=None)
+        os.replace(part_path, pdf_path)
+    finally:
+        part_path.unlink(missing_ok=True)
+        if not pdf_path.exists():
+            shutil.rmtree(job_dir, ignore_errors=True)
+    logger.info(f"Job {job_id} submitted with file originalbook.pdf ({size} bytes, sha256 {sha256})")
+    return jsonify({"job_id": job_id, "sha256": sha256}), 202
 
 # Endpoint to check job status
 @api.route('/job_status/<job_id>', methods=['GET'])
@@ -44,32 +143,48 @@ def job_status(job_id):
             progress = json.load(f)
         status = progress.get("status", "pending")
     else:
+        progress = {}
         status = "pending"
-    return jsonify({"job_id": job_id, "status": status})
+    response = {"job_id": job_id, "status": status}
+    # Written by the worker during the conversion: pages done/total, stage, pages/sec and ETA, the node
+    # holding the job; for killed conversions, why and when the book is retried
+    for key in ("step", "progress", "owner", "killed", "attempts", "next_retry_at"):
+        if key in progress:
+            response[key] = progress[key]
+    if status in ("pending", "failed"):
+        # Queue snapshots published by the worker schedulers of all nodes
+        try:
+            queued = read_queue(Path(STORAGE_ROOT))["jobs"].get(job_id)
+        except OSError:
+            queued = None
+        if queued:
+            response.update({"queue_position": queued["position"], "estimated_start": queued["estimated_start"],
+                             "page_count": queued["page_count"], "priority": queued["priority"]})
+    return jsonify(response)
 
 # Endpoint to download result zip
 @api.route('/download/<job_id>', methods=['GET'])
 def download_result(job_id):
-    """Download the result zip for a completed job."""
+    """
+    Download the result zip for a completed job. The worker builds the zip when the job completes;
+    it is streamed from disk with HTTP Range and conditional request support.
+    """
     from main import STORAGE_ROOT
     job_dir = Path(STORAGE_ROOT) / job_id
     if not job_dir.exists():
         return jsonify({"error": "Job not found"}), 404
     # Find the .md file and images dir
     md_files = list(job_dir.glob("*.md"))
-    if not md_files:
+    progress_path = job_dir / "pdf2markdown-progress.json"
+    status = None
+    if progress_path.exists():
+        with open(progress_path, "r", encoding="utf-8") as f:
+            status = json.load(f).get("status")
+    if not md_files or status != "completed":
         return jsonify({"error": "Result not ready"}), 404
     book_id = md_files[0].stem
-    zip_path = job_dir / f"{book_id}_result.zip"
-    # If zip does not exist, create it
+    zip_path = result_archive_path(job_dir, md_files[0])
+    # Jobs completed before archives were built by the worker get theirs on first download
     if not zip_path.exists():
-        meta_path = job_dir / "bookmetadata.json"
-        image_dir_path = job_dir / "images"
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            zipf.write(md_files[0], arcname=f"{book_id}.md")
-            if meta_path.exists():
-                zipf.write(meta_path, arcname="bookmetadata.json")
-            if image_dir_path.exists():
-                for img_file in image_dir_path.iterdir():
-                    zipf.write(img_file, arcname=f"images/{img_file.name}")
-    return send_file(str(zip_path), as_attachment=True, download_name=f"{book_id}_result.zip")
+        build_result_archive(job_dir, md_files[0])
+    return send_file(str(zip_path), as_attachment=True, download_name=f"{book_id}_result.zip", conditional=True)
@@ -0,0 +1,234 @@
+"""
+Synthetic PDF corpus for the benchmarks, generated from a fixed seed with a minimal PDF writer.
+The text and tables books are the same bytes on every machine. The scanned and images books embed
+JPEGs encoded by Pillow, whose bytes depend on its libjpeg build, and scans are drawn with Pillow's
+default font (FreeType, or a bitmap font on Pillow < 10.1). The benchmark therefore records a SHA-256
+of every corpus file and only compares output hashes against a baseline built from the same files.
+
+Kinds:
+    text     pages of paragraphs with a real text layer
+    scanned  full-page images of rendered text, without a text layer (OCR path)
+    tables   ruled tables with a heading per page
+    images   text with several embedded photos per page
+"""
+
+import hashlib
+import io
+import random
+import zlib
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 72
+KINDS = ("text", "scanned", "tables", "images")
+DEFAULT_SIZES = (4, 16, 48)
+SEED = 20240601
+
+WORDS = (
+    "the of and to in is was for on that with as by at from his her this which or had an be were are "
+    "not but have it they their one all been has there who more when would will also into its some "
+    "time river history language village between children market letter evening winter mountain "
+    "government music garden student window question country science morning library journey"
+).split()
+
+
+class MinimalPdf:
+    """Just enough of a PDF writer for generated pages: Helvetica text, line art and JPEG images."""
+
+    def __init__(self):
+        self.objects: List[bytes] = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+        self.pages: List[int] = []
+
+    def _add(self, body: bytes) -> int:
+        self.objects.append(body)
+        return len(self.objects)
+
+    def _add_stream(self, entries: str, data: bytes) -> int:
+        return self._add(f"<< {entries} /Length {len(data)} >>\nstream\n".encode() + data + b"\nendstream")
+
+    def add_jpeg(self, jpeg: bytes, width: int, height: int) -> int:
+        return self._add_stream(f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                                f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode", jpeg)
+
+    def add_page(self, content: str, images: Dict[str, int] | None = None):
+        content_id = self._add_stream("/Filter /FlateDecode", zlib.compress(content.encode("cp1252"), 9))
+        xobjects = " ".join(f"/{name} {obj} 0 R" for name, obj in (images or {}).items())
+        resources = f"<< /Font << /F1 3 0 R >> /XObject << {xobjects} >> >>"
+        self.pages.append(self._add(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                                    f"/Resources {resources} /Contents {content_id} 0 R >>".encode()))
+
+    def write(self, path: Path):
+        self.objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+        kids = " ".join(f"{page} 0 R" for page in self.pages)
+        self.objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode()
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(self.objects, start=1):
+            offsets.append(len(out))
+            out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+        xref = len(out)
+        out += f"xref\n0 {len(self.objects) + 1}\n0000000000 65535 f \n".encode()
+        out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+        out += f"trailer\n<< /Size {len(self.objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        path.write_bytes(bytes(out))
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph_lines(rng: random.Random, lines: int, width: int = 88) -> List[str]:
+    text = " ".join(_sentence(rng, rng.randint(6, 16)) for _ in range(lines))
+    wrapped, line = [], ""
+    for word in text.split():
+        if len(line) + len(word) + 1 > width:
+            wrapped.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    wrapped.append(line)
+    return wrapped[:lines]
+
+
+def _text_block(lines: List[str], x: float, y: float, size: int = 11, leading: int = 14) -> str:
+    body = " T* ".join(f"({_escape(line)}) Tj" for line in lines)
+    return f"BT /F1 {size} Tf {leading} TL {x} {y} Td {body} ET\n"
+
+
+def _text_page(rng: random.Random, page: int) -> str:
+    content = _text_block([f"Chapter {page + 1}"], MARGIN, PAGE_HEIGHT - MARGIN, size=18)
+    y = PAGE_HEIGHT - MARGIN - 36
+    for _ in range(4):
+        lines = _paragraph_lines(rng, 9)
+        content += _text_block(lines, MARGIN, y)
+        y -= 14 * len(lines) + 16
+    return content
+
+
+def _table_page(rng: random.Random, page: int) -> str:
+    content = _text_block([f"Table {page + 1}. {_sentence(rng, 5)}"], MARGIN, PAGE_HEIGHT - MARGIN, size=14)
+    columns, rows = rng.randint(3, 6), rng.randint(12, 24)
+    cell_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+    cell_height = 20
+    top = PAGE_HEIGHT - MARGIN - 30
+    content += "0.5 w\n"
+    for row in range(rows + 1):
+        content += f"{MARGIN} {top - row * cell_height} m {PAGE_WIDTH - MARGIN} {top - row * cell_height} l S\n"
+    for column in range(columns + 1):
+        content += f"{MARGIN + column * cell_width:.2f} {top} m {MARGIN + column * cell_width:.2f} {top - rows * cell_height} l S\n"
+    for row in range(rows):
+        for column in range(columns):
+            if row == 0:
+                cell = rng.choice(WORDS).capitalize()
+            elif column == 0:
+                cell = rng.choice(WORDS)
+            else:
+                cell = f"{rng.uniform(0, 10000):.2f}"
+            content += _text_block([cell], MARGIN + column * cell_width + 4, top - (row + 1) * cell_height + 6, size=9)
+    return content
+
+
+def _jpeg(image) -> bytes:
+    # Deterministic for one Pillow build only: other libjpeg versions may encode different bytes
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def _photo(rng: random.Random, size: Tuple[int, int]):
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", size, tuple(rng.randint(0, 255) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randint(0, size[0]), rng.randint(0, size[1])
+        box = (x0, y0, x0 + rng.randint(20, size[0] // 2), y0 + rng.randint(20, size[1] // 2))
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse(box, fill=color)
+        else:
+            draw.rectangle(box, fill=color)
+    return image
+
+
+def _scanned_page(rng: random.Random, page: int):
+    """A page of text rendered to a 150 dpi grayscale-looking RGB image, as a scanner would produce."""
+    from PIL import Image, ImageDraw, ImageFont
+    scale = 150 / 72
+    image = Image.new("RGB", (int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale)), (250, 250, 246))
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=22)
+    except TypeError:
+        # Pillow < 10.1 (no sized default font): a different page image, so a different corpus
+        font = ImageFont.load_default()
+    y = MARGIN * scale
+    draw.text((MARGIN * scale, y), f"Chapter {page + 1}", fill=(20, 20, 20), font=font)
+    y += 60
+    for line in _paragraph_lines(rng, 36, width=70):
+        draw.text((MARGIN * scale, y), line, fill=(20, 20, 20), font=font)
+        y += 34
+    return image
+
+
+def build_book(kind: str, pages: int, path: Path, seed: int = SEED) -> Path:
+    """Write one synthetic book. The same (kind, pages, seed) produces the same bytes with the same Pillow build."""
+    rng = random.Random(f"{seed}-{kind}-{pages}")
+    pdf = MinimalPdf()
+    for page in range(pages):
+        if kind == "text":
+            pdf.add_page(_text_page(rng, page))
+        elif kind == "tables":
+            pdf.add_page(_table_page(rng, page))
+        elif kind == "scanned":
+            scan = _scanned_page(rng, page)
+            image = pdf.add_jpeg(_jpeg(scan), *scan.size)
+            pdf.add_page(f"q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Scan Do Q\n", {"Scan": image})
+        elif kind == "images":
+            content = _text_block([f"Plate {page + 1}"], MARGIN, PAGE_HEIGHT - MARGIN, size=18)
+            content += _text_block(_paragraph_lines(rng, 6), MARGIN, PAGE_HEIGHT - MARGIN - 30)
+            images = {}
+            for slot in range(4):
+                photo = _photo(rng, (480, 320))
+                name = f"Im{slot}"
+                images[name] = pdf.add_jpeg(_jpeg(photo), *photo.size)
+                x = MARGIN + (slot % 2) * 240
+                y = MARGIN + (1 - slot // 2) * 230
+                content += f"q 216 0 0 144 {x} {y} cm /{name} Do Q\n"
+                content += _text_block([f"Figure {page + 1}.{slot + 1}"], x, y - 14, size=9)
+            pdf.add_page(content, images)
+        else:
+            raise ValueError(f"Unknown book kind: {kind}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pdf.write(path)
+    return path
+
+
+def build_corpus(corpus_dir: Path, sizes=DEFAULT_SIZES, kinds=KINDS) -> List[Tuple[str, int, Path]]:
+    """Generate missing books of every kind and size. Returns (kind, pages, path) per book."""
+    books = []
+    for kind in kinds:
+        for pages in sizes:
+            path = corpus_dir / f"{kind}-{pages:03d}p.pdf"
+            if not path.exists():
+                build_book(kind, pages, path)
+            books.append((kind, pages, path))
+    return books
+
+
+def corpus_digests(books: List[Tuple[str, int, Path]]) -> Dict[str, str]:
+    """SHA-256 of every corpus file by book name, to tell whether two runs converted the same corpus."""
+    digests = {}
+    for _, _, path in books:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        digests[path.stem] = digest.hexdigest()
+    return digests
@@ -0,0 +1,318 @@
+"""
+Offline benchmark of the conversion pipeline on the synthetic corpus.
+
+Runs MarkerPDFConverter.convert_pdf_to_markdown ("converter" mode) and PDF2MarkdownWorker.process_pdf
+("worker" mode) on every book and records pages/sec, wall time per pipeline stage, peak RSS and a
+SHA-256 of the output (markdown and images). Results are compared with a stored baseline; the run
+fails when throughput drops by more than the threshold or, unless allowed, when the output changed.
+A baseline is only comparable when it was built from the same corpus files (their SHA-256 is recorded
+with the results); otherwise the run fails, as the scanned and images books depend on the Pillow build.
+Without a baseline (or without one for a mode or book that was run) it fails too, so a gate that
+compares nothing never passes; record one with --update-baseline.
+
+    python -m benchmarks.run                      # compare with benchmarks/baseline.json
+    python -m benchmarks.run --update-baseline    # record a new baseline on the reference machine
+    python -m benchmarks.run --sizes 4 --kinds text,tables --modes converter
+    CHUNK_PAGES=8 python -m benchmarks.run --single-pass-diff --modes worker
+
+The service settings (CHUNK_PAGES, STREAM_PAGES, ...) are taken from the environment as usual and
+stored with the results. The page cache is disabled unless --keep-page-cache is given, since repeated
+runs would otherwise measure cache hits.
+"""
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from importlib import metadata as importlib_metadata
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DEFAULT_CORPUS_DIR = BENCHMARK_DIR / "corpus"
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+DEFAULT_RESULTS_DIR = BENCHMARK_DIR / "results"
+MODES = ("converter", "worker")
+SETTINGS = ("CHUNK_PAGES", "STREAM_PAGES", "PARALLEL_PAGE_THRESHOLD", "PARALLEL_PROCESSES", "IMAGE_FORMAT",
+            "IMAGE_MAX_DIMENSION", "IMAGE_WRITER_THREADS", "RESULT_ARCHIVE", "MODEL_SNAPSHOT_PATH")
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS (VmHWM) of this process. Not every kernel or sandbox allows it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int:
+    """Peak RSS of this process since the last reset. Page-range processes forked by parallel mode are not included."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KB on Linux and cannot be reset
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def output_digest(md_path: Path, image_dir_path: Path) -> str:
+    """SHA-256 over the markdown and every image (name and bytes), independent of where they were written."""
+    digest = hashlib.sha256()
+    digest.update(md_path.read_bytes())
+    if image_dir_path.exists():
+        for image_path in sorted(image_dir_path.iterdir()):
+            digest.update(image_path.name.encode())
+            digest.update(image_path.read_bytes())
+    return digest.hexdigest()
+
+
+def single_pass_diff(converter, pdf_path: Path, md_path: Path, work_dir: Path) -> Dict[str, Any]:
+    """
+    Compare the output with the book rendered in one Marker pass. Chunks, stream windows and parallel
+    page ranges are separate Marker documents, so document-wide processing (heading levels, headers
+    and footers, text continuing across a boundary) can differ; with none of them set the diff is empty.
+    """
+    reference_dir = work_dir / "single-pass"
+    reference_dir.mkdir(parents=True)
+    reference, _metadata, _image_count = converter._render(pdf_path, reference_dir / "images")
+    lines = md_path.read_text(encoding="utf-8").splitlines()
+    reference_lines = reference.splitlines()
+    matcher = difflib.SequenceMatcher(None, reference_lines, lines, autojunk=False)
+    changed = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal")
+    return {"similarity": round(matcher.ratio(), 4), "changed_lines": changed, "single_pass_lines": len(reference_lines)}
+
+
+def environment() -> Dict[str, Any]:
+    versions = {}
+    for package in ("marker-pdf", "surya-ocr", "torch", "pypdfium2"):
+        try:
+            versions[package] = importlib_metadata.version(package)
+        except importlib_metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        import PIL
+        from PIL import features
+        # The scanned and images books of the corpus are encoded and drawn with these
+        versions.update({"pillow": PIL.__version__, "libjpeg": features.version("jpg"), "freetype": features.version("freetype2")})
+    except ImportError:
+        versions.update({"pillow": None, "libjpeg": None, "freetype": None})
+    return {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(), **versions}
+
+
+class StageTimes:
+    """Instrumentation sink summing stage wall time for the book being converted."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+
+    def __call__(self, name: str, seconds: float):
+        self.seconds[name] += seconds
+
+    def take(self) -> Dict[str, float]:
+        seconds = {name: round(value, 3) for name, value in sorted(self.seconds.items())}
+        self.seconds.clear()
+        return seconds
+
+
+def run_book(mode: str, converter, pdf_path: Path, work_dir: Path, stage_times: StageTimes, diff_single_pass: bool = False) -> Dict[str, Any]:
+    """Convert one book in a fresh directory and measure it."""
+    from service import PDF2MarkdownWorker
+    guid_dir = work_dir / f"bench-{pdf_path.stem}"
+    guid_dir.mkdir(parents=True)
+    source = guid_dir / "originalbook.pdf"
+    shutil.copyfile(pdf_path, source)
+    md_path = guid_dir / "originalbook.md"
+    image_dir_path = guid_dir / "images"
+    stage_times.take()
+    reset_peak_rss()
+    started = time.perf_counter()
+    error = None
+    if mode == "converter":
+        converter.convert_pdf_to_markdown(str(source), str(md_path), image_dir_path, guid_dir.name)
+    else:
+        worker = PDF2MarkdownWorker(work_dir, converter)
+        worker.process_pdf(guid_dir, source)
+        progress = worker.load_progress(guid_dir)
+        if progress.get("status") != "completed":
+            error = progress.get("error", f"status {progress.get('status')}")
+    seconds = time.perf_counter() - started
+    result = {"seconds": round(seconds, 3), "stages": stage_times.take(), "peak_rss_mb": round(peak_rss_bytes() / (1024 * 1024), 1)}
+    if error:
+        result["error"] = error
+    else:
+        result["output_sha256"] = output_digest(md_path, image_dir_path)
+        if diff_single_pass:
+            # After the measurement, so the reference render is not timed
+            result["single_pass_diff"] = single_pass_diff(converter, source, md_path, guid_dir)
+    return result
+
+
+def run_benchmark(books, modes: List[str], repeat: int, warmup: bool, diff_single_pass: bool = False) -> Dict[str, Any]:
+    import instrumentation
+    from pdf_utils import get_page_count
+    from service import MarkerPDFConverter
+    import config
+    from benchmarks.corpus import corpus_digests
+    started = time.perf_counter()
+    converter = MarkerPDFConverter()
+    model_load_seconds = time.perf_counter() - started
+    stage_times = StageTimes()
+    instrumentation.add_sink(stage_times)
+    results: Dict[str, Any] = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "settings": {name: getattr(config, name) for name in SETTINGS},
+        "corpus": corpus_digests(books),
+        "model_load_seconds": round(model_load_seconds, 3),
+        "modes": {}
+    }
+    with tempfile.TemporaryDirectory(prefix="pdf2markdown-bench-") as tmp:
+        if warmup and books:
+            # First calls pay for lazy initialization inside torch and the models
+            print(f"Warming up on {books[0][2].name}...", flush=True)
+            run_book("converter", converter, books[0][2], Path(tmp) / "warmup", stage_times)
+        for mode in modes:
+            mode_results = {}
+            for kind, pages, pdf_path in books:
+                page_count = get_page_count(pdf_path)
+                runs = [run_book(mode, converter, pdf_path, Path(tmp) / f"{mode}-{attempt}", stage_times, diff_single_pass and attempt == 0)
+                        for attempt in range(repeat)]
+                # The fastest run is the least disturbed by the rest of the machine
+                best = min(runs, key=lambda run: run["seconds"])
+                if "single_pass_diff" in runs[0]:
+                    best["single_pass_diff"] = runs[0]["single_pass_diff"]
+                best.update({"kind": kind, "pages": page_count,
+                             "pages_per_second": round(page_count / best["seconds"], 3) if best["seconds"] else None})
+                if repeat > 1:
+                    best["median_seconds"] = round(statistics.median(run["seconds"] for run in runs), 3)
+                mode_results[pdf_path.stem] = best
+                print(f"  {mode:9} {pdf_path.stem:16} {best['seconds']:8.2f}s {best['pages_per_second'] or 0:7.2f} pages/s "
+                      f"{best['peak_rss_mb']:8.0f} MB{'  ERROR: ' + best['error'] if 'error' in best else ''}", flush=True)
+                if "single_pass_diff" in best:
+                    diff = best["single_pass_diff"]
+                    print(f"  {'':9} {'':16} vs single pass: {diff['similarity']:.2%} similar, {diff['changed_lines']} lines changed", flush=True)
+            total_pages = sum(book["pages"] for book in mode_results.values())
+            total_seconds = sum(book["seconds"] for book in mode_results.values())
+            results["modes"][mode] = {
+                "pages": total_pages,
+                "seconds": round(total_seconds, 3),
+                "pages_per_second": round(total_pages / total_seconds, 3) if total_seconds else None,
+                "books": mode_results
+            }
+    instrumentation.remove_sink(stage_times)
+    return results
+
+
+def _imaging(environment: Optional[Dict[str, Any]]) -> str:
+    environment = environment or {}
+    return f"Pillow {environment.get('pillow')}, libjpeg {environment.get('libjpeg')}, FreeType {environment.get('freetype')}"
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, allow_output_changes: bool) -> List[str]:
+    """Return the failures of results against baseline (empty when the run passes)."""
+    failures = []
+    base_corpus = baseline.get("corpus")
+    if not base_corpus:
+        return ["the baseline records no corpus digests; record it again with --update-baseline."]
+    differing = sorted(name for name, digest in results["corpus"].items() if base_corpus.get(name) != digest)
+    if differing:
+        # Output hashes and throughput of different input files say nothing about the release
+        return [f"corpus files differ from the baseline's ({', '.join(differing)}); the Pillow build "
+                f"(baseline {_imaging(baseline.get('environment'))}, here {_imaging(results['environment'])}) "
+                f"may encode them differently. Record a baseline on this machine with --update-baseline."]
+    if baseline.get("environment") != results["environment"]:
+        print(f"Note: baseline environment {baseline.get('environment')} differs from {results['environment']}")
+    if baseline.get("settings") != results["settings"]:
+        print(f"Note: baseline settings {baseline.get('settings')} differ from {results['settings']}")
+    for mode, mode_results in results["modes"].items():
+        base_mode = baseline.get("modes", {}).get(mode)
+        if not base_mode:
+            failures.append(f"{mode}: no baseline for this mode")
+            continue
+        current, previous = mode_results["pages_per_second"], base_mode.get("pages_per_second")
+        if current and previous:
+            change = current / previous - 1
+            print(f"{mode}: {current:.3f} pages/s vs baseline {previous:.3f} ({change:+.1%})")
+            if change < -threshold:
+                failures.append(f"{mode}: throughput dropped {-change:.1%} (threshold {threshold:.0%})")
+        for name, book in mode_results["books"].items():
+            base_book = base_mode.get("books", {}).get(name)
+            if "error" in book:
+                failures.append(f"{mode}/{name}: {book['error']}")
+            elif not base_book:
+                failures.append(f"{mode}/{name}: no baseline for this book")
+            elif base_book and base_book.get("output_sha256") and book["output_sha256"] != base_book["output_sha256"]:
+                message = f"{mode}/{name}: output differs from the baseline"
+                if allow_output_changes:
+                    print(f"Note: {message}")
+                else:
+                    failures.append(message)
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the PDF to Markdown pipeline on a synthetic corpus.")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS_DIR, help="Corpus directory (generated if missing)")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in (4, 16, 48)), help="Comma-separated page counts")
+    parser.add_argument("--kinds", default="text,scanned,tables,images", help="Comma-separated book kinds")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated modes: converter, worker")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per book; the fastest is kept")
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the untimed warm-up conversion")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed throughput drop as a fraction (default 0.10)")
+    parser.add_argument("--allow-output-changes", action="store_true", help="Report but do not fail on output differences")
+    parser.add_argument("--keep-page-cache", action="store_true", help="Use PAGE_CACHE_DIR if it is set")
+    parser.add_argument("--single-pass-diff", action="store_true",
+                        help="Also render each book in one pass and record how much the output differs from it")
+    parser.add_argument("--output", type=Path, help="Results file (default benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    if any(mode not in MODES for mode in modes):
+        parser.error(f"modes must be among {', '.join(MODES)}")
+    # Settings are read when the service modules are imported, so adjust the environment first
+    if not args.keep_page_cache:
+        os.environ["PAGE_CACHE_DIR"] = ""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(BENCHMARK_DIR.parent))
+    from benchmarks.corpus import build_corpus
+
+    books = build_corpus(args.corpus, [int(size) for size in args.sizes.split(",")], args.kinds.split(","))
+    print(f"Corpus: {len(books)} books in {args.corpus}", flush=True)
+    results = run_benchmark(books, modes, max(1, args.repeat), not args.no_warmup, args.single_pass_diff)
+
+    output = args.output or DEFAULT_RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"FAIL no baseline at {args.baseline}; record one with --update-baseline on the reference machine.")
+        return 1
+    failures = compare(results, json.loads(args.baseline.read_text()), args.threshold, args.allow_output_changes)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+bookmetadata.json and its Marker metadata sidecar.
+bookmetadata.json holds the book's own metadata plus a short conversion summary, so services that
+only need the title or page count read a few hundred bytes. Marker's detailed metadata (page_stats
+of every page, table of contents) goes to a gzip-compressed JSON sidecar that BookMetadata loads
+only when it is accessed.
+"""
+
+import gzip
+import json
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from storage_io import atomic_write_bytes, atomic_write_json
+
+METADATA_FILENAME = "bookmetadata.json"
+MARKER_METADATA_FILENAME = "marker_metadata.json.gz"
+
+
+def summarize_marker_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Totals of Marker's per-page stats: pages by text extraction method and blocks by type."""
+    methods: Dict[str, int] = {}
+    blocks: Dict[str, int] = {}
+    for stats in metadata.get('page_stats', []):
+        method = stats.get('text_extraction_method') or "unknown"
+        methods[method] = methods.get(method, 0) + 1
+        for block_type, count in stats.get('block_counts') or []:
+            blocks[block_type] = blocks.get(block_type, 0) + count
+    return {
+        'pages': len(metadata.get('page_stats', [])),
+        'table_of_contents_entries': len(metadata.get('table_of_contents') or []),
+        'text_extraction_methods': methods,
+        'block_counts': blocks
+    }
+
+
+def write_marker_metadata(guid_dir: Path, metadata: Dict[str, Any]) -> Path:
+    """Write the sidecar atomically. The gzip header carries no timestamp, so equal metadata gives equal bytes."""
+    path = guid_dir / MARKER_METADATA_FILENAME
+    data = json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+    atomic_write_bytes(path, gzip.compress(data, compresslevel=6, mtime=0))
+    return path
+
+
+def read_book_metadata(guid_dir: Path) -> Dict[str, Any]:
+    """bookmetadata.json of a job, or an empty dict if there is none."""
+    try:
+        with open(guid_dir / METADATA_FILENAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_book_metadata(guid_dir: Path, metadata: Dict[str, Any]):
+    atomic_write_json(guid_dir / METADATA_FILENAME, metadata, indent=None)
+
+
+class BookMetadata:
+    """Read access to a job's metadata; the Marker sidecar is decompressed on first use only."""
+
+    def __init__(self, guid_dir: Path):
+        self.guid_dir = Path(guid_dir)
+
+    @cached_property
+    def summary(self) -> Dict[str, Any]:
+        return read_book_metadata(self.guid_dir)
+
+    @cached_property
+    def marker_metadata(self) -> Dict[str, Any]:
+        """Marker's full metadata. Jobs converted before the sidecar existed have it inline."""
+        if 'marker_metadata' in self.summary:
+            return self.summary['marker_metadata']
+        try:
+            with gzip.open(self.guid_dir / MARKER_METADATA_FILENAME, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @property
+    def page_stats(self) -> List[Dict[str, Any]]:
+        return self.marker_metadata.get('page_stats', [])
+
+    @property
+    def table_of_contents(self) -> List[Dict[str, Any]]:
+        return self.marker_metadata.get('table_of_contents') or []
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        return self.summary.get(key, default)
@@ -0,0 +1,94 @@
+"""
+CPU and memory available to this container.
+os.cpu_count() and the physical memory size describe the host; a container limited by cgroup v2
+(cpu.max, memory.max) or v1 (cpu.cfs_quota_us, memory.limit_in_bytes) may get much less.
+"""
+
+import math
+import os
+from pathlib import Path
+from typing import Optional
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+# cgroup v1 reports "no limit" as a page-aligned value close to 2^63
+UNLIMITED_V1_BYTES = 1 << 60
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_v2_dirs():
+    """This process's cgroup directory first, then the root (the usual view inside a container)."""
+    own = _read(Path("/proc/self/cgroup"))
+    for line in (own or "").splitlines():
+        if line.startswith("0::"):
+            relative = line[3:].lstrip("/")
+            if relative:
+                yield CGROUP_ROOT / relative
+    yield CGROUP_ROOT
+
+
+def _cgroup_v1_dirs(controller: str):
+    """This process's directory in a cgroup v1 controller hierarchy, then the hierarchy's root."""
+    own = _read(Path("/proc/self/cgroup"))
+    for line in (own or "").splitlines():
+        parts = line.split(":", 2)
+        if len(parts) != 3:
+            continue
+        _, controllers, relative = parts
+        if controller in controllers.split(",") and relative.strip("/"):
+            yield CGROUP_ROOT / controller / relative.strip("/")
+    yield CGROUP_ROOT / controller
+
+
+def cpu_limit() -> Optional[float]:
+    """CPUs granted by the CFS quota, or None when unlimited."""
+    for directory in _cgroup_v2_dirs():
+        value = _read(directory / "cpu.max")
+        if value is not None:
+            quota, _, period = value.partition(" ")
+            if quota == "max":
+                return None
+            return int(quota) / int(period or 100000)
+    for directory in _cgroup_v1_dirs("cpu"):
+        quota = _read(directory / "cpu.cfs_quota_us")
+        period = _read(directory / "cpu.cfs_period_us")
+        if quota is not None:
+            return int(quota) / int(period) if int(quota) > 0 and period else None
+    return None
+
+
+def memory_limit_bytes() -> Optional[int]:
+    """Memory limit of the cgroup, or None when unlimited."""
+    for directory in _cgroup_v2_dirs():
+        value = _read(directory / "memory.max")
+        if value is not None:
+            return None if value == "max" else int(value)
+    for directory in _cgroup_v1_dirs("memory"):
+        value = _read(directory / "memory.limit_in_bytes")
+        if value is not None:
+            return int(value) if int(value) < UNLIMITED_V1_BYTES else None
+    return None
+
+
+def effective_cpu_count() -> int:
+    """CPUs this process may use: its affinity mask, capped by the cgroup quota (rounded up)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return max(1, cpus)
+
+
+def effective_memory_bytes() -> int:
+    """Memory this process may use: the cgroup limit, or the physical memory when unlimited."""
+    physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    limit = memory_limit_bytes()
+    return min(physical, limit) if limit is not None else physical
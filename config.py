@@ -0,0 +1,145 @@
+"""
+Runtime settings for the PDF to Markdown service.
+All values are read from environment variables so they can be set per container.
+"""
+
+import os
+import socket
+from cgroup_limits import effective_cpu_count
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def _env_choice(name: str, default: str, choices: tuple) -> str:
+    value = os.environ.get(name, default).strip().lower()
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(repr(choice) for choice in choices)}, not {value!r}")
+    return value
+
+
+# Number of pages converted per checkpointed chunk. 0 converts the whole book in one pass.
+# Experimental: chunks are separate Marker documents, so the output can differ from a single pass.
+CHUNK_PAGES = _env_int("CHUNK_PAGES", 0)
+
+# Seconds between scans of the storage directory for new jobs when inotify is not used.
+POLL_INTERVAL_SECONDS = _env_int("POLL_INTERVAL_SECONDS", 10)
+
+# How new jobs are discovered: "inotify" (falls back to polling if unavailable) or "poll".
+JOB_WATCHER = os.environ.get("JOB_WATCHER", "inotify").lower()
+
+# Seconds between full reconciliation scans when inotify is used (catches changes made by other NFS clients).
+RECONCILE_INTERVAL_SECONDS = _env_int("RECONCILE_INTERVAL_SECONDS", 60)
+
+# Number of worker processes converting books in parallel. Each is a child of the process holding the models.
+WORKER_PROCESSES = _env_int("WORKER_PROCESSES", 1)
+
+# Private memory (MB) a worker process may use before it is killed and restarted. 0 disables the cap.
+WORKER_MAX_MEMORY_MB = _env_int("WORKER_MAX_MEMORY_MB", 0)
+
+# A worker process exits after converting this many books and is replaced by a fresh fork. 0 disables it.
+WORKER_MAX_BOOKS = _env_int("WORKER_MAX_BOOKS", 0)
+
+# A worker process whose private memory exceeds this (MB) after a book is replaced by a fresh fork. 0 disables it.
+WORKER_RECYCLE_MEMORY_MB = _env_int("WORKER_RECYCLE_MEMORY_MB", 0)
+
+# Private memory (MB) of one conversion (worker process and its page-range processes) before the watchdog kills it. 0 disables it.
+JOB_MAX_MEMORY_MB = _env_int("JOB_MAX_MEMORY_MB", 0)
+
+# Seconds a conversion may run, plus JOB_TIMEOUT_SECONDS_PER_PAGE per page, before the watchdog kills it. Both 0 disables it.
+JOB_TIMEOUT_SECONDS = _env_int("JOB_TIMEOUT_SECONDS", 0)
+JOB_TIMEOUT_SECONDS_PER_PAGE = _env_int("JOB_TIMEOUT_SECONDS_PER_PAGE", 0)
+
+# Killed conversion attempts after which a book is left failed.
+JOB_MAX_ATTEMPTS = _env_int("JOB_MAX_ATTEMPTS", 3)
+
+# Seconds before a killed book is retried, doubled for every further attempt.
+JOB_RETRY_BACKOFF_SECONDS = _env_int("JOB_RETRY_BACKOFF_SECONDS", 60)
+
+# Books with at least this many pages are split into page ranges converted concurrently. 0 disables it.
+PARALLEL_PAGE_THRESHOLD = _env_int("PARALLEL_PAGE_THRESHOLD", 0)
+
+# Processes used to convert one book in parallel. 0 divides the container's CPUs between the worker processes.
+PARALLEL_PROCESSES = _env_int("PARALLEL_PROCESSES", 0) or max(1, effective_cpu_count() // max(1, WORKER_PROCESSES))
+
+# Directory of the content-addressed page cache. Empty disables the cache.
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR", "")
+
+# Size bound of the page cache in MB; least recently used pages are evicted beyond it.
+PAGE_CACHE_MAX_MB = _env_int("PAGE_CACHE_MAX_MB", 2048)
+
+# Re-encode extracted images as "png", "jpeg" or "webp". Empty keeps Marker's format.
+IMAGE_FORMAT = _env_choice("IMAGE_FORMAT", "", ("", "png", "jpeg", "jpg", "webp"))
+
+# JPEG/WebP quality used when re-encoding images.
+IMAGE_QUALITY = _env_int("IMAGE_QUALITY", 85)
+
+# Downscale images whose longest side exceeds this many pixels. 0 keeps the original size.
+IMAGE_MAX_DIMENSION = _env_int("IMAGE_MAX_DIMENSION", 0)
+
+# Threads encoding and writing images while the markdown is post-processed.
+IMAGE_WRITER_THREADS = _env_int("IMAGE_WRITER_THREADS", 4)
+
+# Render and write the book this many pages at a time so memory stays flat as books grow. 0 renders it whole.
+STREAM_PAGES = _env_int("STREAM_PAGES", 0)
+
+# Pre-serialized model snapshot (see model_snapshot.py). Used when the file exists, otherwise models are created normally.
+MODEL_SNAPSHOT_PATH = os.environ.get("MODEL_SNAPSHOT_PATH", "")
+
+# Build {stem}_result.zip for the download API when a job completes (1) or only on first download (0).
+RESULT_ARCHIVE = _env_int("RESULT_ARCHIVE", 1) == 1
+
+# Largest accepted upload in MB.
+MAX_UPLOAD_MB = _env_int("MAX_UPLOAD_MB", 1024)
+
+# Memory (MB) all converting books on this node may be estimated to use together. 0 disables admission control.
+MEMORY_BUDGET_MB = _env_int("MEMORY_BUDGET_MB", 0)
+
+# Estimated memory (MB) of one conversion before its pages are counted.
+JOB_BASE_MEMORY_MB = _env_int("JOB_BASE_MEMORY_MB", 3000)
+
+# Estimated memory (MB) per page held at once (one chunk or stream window when those are enabled).
+JOB_MEMORY_PER_PAGE_MB = _env_int("JOB_MEMORY_PER_PAGE_MB", 8)
+
+# Pages of scheduling cost a queued book loses per minute of waiting, so large books are eventually run.
+SCHEDULER_AGING_PAGES_PER_MINUTE = _env_int("SCHEDULER_AGING_PAGES_PER_MINUTE", 10)
+
+# Initial conversion speed used for estimated start times until finished books provide a measurement.
+ESTIMATED_SECONDS_PER_PAGE = float(os.environ.get("ESTIMATED_SECONDS_PER_PAGE") or 2.0)
+
+# Seconds between the metrics snapshots worker pool processes write for the /metrics endpoint.
+METRICS_SNAPSHOT_SECONDS = _env_int("METRICS_SNAPSHOT_SECONDS", 5)
+
+# Extract pages with a trustworthy text layer directly instead of running the Marker models on them (1 enables it).
+TEXT_FAST_PATH = _env_int("TEXT_FAST_PATH", 0) == 1
+
+# Fewest visible characters a page needs for the text fast path.
+TEXT_FAST_PATH_MIN_CHARS = _env_int("TEXT_FAST_PATH_MIN_CHARS", 200)
+
+# Largest fraction of the page area images may cover on a fast-path page (figures need the models).
+TEXT_FAST_PATH_MAX_IMAGE_COVERAGE = float(os.environ.get("TEXT_FAST_PATH_MAX_IMAGE_COVERAGE") or 0.02)
+
+# Most vector path objects (table rules, diagrams) a fast-path page may contain.
+TEXT_FAST_PATH_MAX_PATHS = _env_int("TEXT_FAST_PATH_MAX_PATHS", 10)
+
+# Match torch threads and Marker batch sizes to the container's CPU and memory limits ("auto") or keep the library defaults ("off").
+TUNING = os.environ.get("TUNING", "auto").lower()
+
+# Calibrated tuning profile written by "python tuning.py calibrate". Empty uses the automatic settings only.
+TUNING_PROFILE_PATH = os.environ.get("TUNING_PROFILE_PATH", "")
+
+# Least number of seconds between page progress updates written to pdf2markdown-progress.json.
+PROGRESS_WRITE_INTERVAL_SECONDS = _env_int("PROGRESS_WRITE_INTERVAL_SECONDS", 5)
+
+# Seconds between progress rewrites while a render reports no pages (stage, elapsed time, ETA). 0 disables them.
+PROGRESS_HEARTBEAT_SECONDS = _env_int("PROGRESS_HEARTBEAT_SECONDS", 30)
+
+# Name of this node in job leases and progress files. Defaults to the host name (the container id under Docker).
+NODE_ID = os.environ.get("NODE_ID", "") or socket.gethostname()
+
+# Seconds a job lease stays valid without a heartbeat. A book whose lease expired is taken over by another node.
+LEASE_SECONDS = _env_int("LEASE_SECONDS", 120)
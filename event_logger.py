@@ -1,8 +1,9 @@
 import os
-import json
 import uuid
 import time
 from typing import Any
+from pathlib import Path
+from storage_io import atomic_write_json
 
 def write_service_event(topic: str, book_id: str, service: str, storage_root: str = "storage", **extra: Any) -> str:
     """
@@ -20,8 +21,8 @@ def write_service_event(topic: str, book_id: str, service: str, storage_root: st
     os.makedirs(events_dir, exist_ok=True)
     filename = f"{event['timestamp']}_{topic}_{book_id}_{event['guid']}.json"
     filepath = os.path.join(events_dir, filename)
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(event, f, indent=2)
+    # Consumers pick up every *.json in events/, so the file must appear complete
+    atomic_write_json(Path(filepath), event)
     return filepath
 
 # Example usage:
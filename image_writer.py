@@ -0,0 +1,140 @@
+"""
+Parallel, deduplicating image persistence.
+Output names are decided on the calling thread (so markdown references can be rewritten right away)
+while encoding and writing run on a thread pool. Identical images are written once.
+"""
+
+import base64
+import hashlib
+import io
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from logger import get_logger
+
+FORMAT_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpeg', 'WEBP': 'webp'}
+
+
+def _format_for_filename(filename: str) -> str:
+    if filename.lower().endswith(('.jpg', '.jpeg')):
+        return 'JPEG'
+    if filename.lower().endswith('.webp'):
+        return 'WEBP'
+    return 'PNG'
+
+
+class ImageWriter:
+    """
+    Saves the images of one conversion into image_dir_path.
+    image_format ("png", "jpeg", "webp") re-encodes every image; empty keeps the format implied by
+    the image name, as Marker produced it. max_dimension > 0 downscales larger images.
+    """
+
+    def __init__(self, image_dir_path: Path, image_format: str = "", quality: int = 85, max_dimension: int = 0,
+                 max_workers: int = 4, book_id: str | None = None):
+        self.image_dir_path = image_dir_path
+        self.image_format = image_format.upper().replace('JPG', 'JPEG') if image_format else ""
+        self.quality = quality
+        self.max_dimension = max_dimension
+        self.book_id = book_id
+        self.logger = get_logger()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf2markdown-images")
+        self._by_hash: Dict[str, str] = {}
+        # relative path -> (image ids referencing it, write future)
+        self._pending: Dict[str, Tuple[List[str], Future]] = {}
+        self._paths: Dict[str, str] = {}
+        image_dir_path.mkdir(exist_ok=True)
+
+    @property
+    def reencodes(self) -> bool:
+        return bool(self.image_format or self.max_dimension)
+
+    def _content_hash(self, image_data: Any) -> Optional[str]:
+        digest = hashlib.blake2b(digest_size=16)
+        if hasattr(image_data, 'tobytes'):
+            digest.update(f"{image_data.mode}:{image_data.size}".encode())
+            digest.update(image_data.tobytes())
+        elif isinstance(image_data, bytes):
+            digest.update(image_data)
+        elif isinstance(image_data, str):
+            digest.update(image_data.encode())
+        else:
+            return None
+        return digest.hexdigest()
+
+    def _output_filename(self, image_id: str) -> str:
+        if not self.image_format:
+            return image_id
+        return f"{Path(image_id).stem}.{FORMAT_EXTENSIONS[self.image_format]}"
+
+    def submit(self, image_id: str, image_data: Any) -> Optional[str]:
+        """Queue an image and return its relative path (images/<file>), or None for unsupported data."""
+        content_hash = self._content_hash(image_data)
+        if content_hash is None:
+            self.logger.warning(f"Unknown image data type for {image_id}: {type(image_data)}", self.book_id)
+            return None
+        if content_hash in self._by_hash:
+            relative_path = self._by_hash[content_hash]
+            self._paths[image_id] = relative_path
+            self._pending[relative_path][0].append(image_id)
+            self.logger.debug(lambda: f"Image {image_id} duplicates {relative_path}", self.book_id)
+            return relative_path
+        filename = self._output_filename(image_id)
+        relative_path = f"{self.image_dir_path.name}/{filename}"
+        self._by_hash[content_hash] = relative_path
+        self._paths[image_id] = relative_path
+        future = self._executor.submit(self._write, self.image_dir_path / filename, image_data)
+        self._pending[relative_path] = ([image_id], future)
+        return relative_path
+
+    def submit_all(self, images: Dict[str, Any]) -> Dict[str, str]:
+        """Queue all images and return the image_id -> relative path map for reference rewriting."""
+        for image_id, image_data in images.items():
+            self.submit(image_id, image_data)
+        return dict(self._paths)
+
+    def _write(self, image_path: Path, image_data: Any):
+        if isinstance(image_data, str):
+            if image_data.startswith('data:'):
+                image_data = image_data.split(',', 1)[1]
+            image_data = base64.b64decode(image_data)
+        if isinstance(image_data, bytes):
+            if not self.reencodes:
+                with open(image_path, 'wb') as f:
+                    f.write(image_data)
+                return
+            from PIL import Image
+            image_data = Image.open(io.BytesIO(image_data))
+        image_format = self.image_format or _format_for_filename(image_path.name)
+        if self.max_dimension and max(image_data.size) > self.max_dimension:
+            image_data = image_data.copy()
+            image_data.thumbnail((self.max_dimension, self.max_dimension))
+        save_kwargs = {}
+        if image_format == 'JPEG':
+            if image_data.mode not in ('RGB', 'L'):
+                image_data = image_data.convert('RGB')
+            save_kwargs['quality'] = self.quality
+        elif image_format == 'WEBP':
+            save_kwargs['quality'] = self.quality
+        image_data.save(image_path, format=image_format, **save_kwargs)
+
+    def wait(self) -> Tuple[int, Dict[str, str]]:
+        """Wait for all writes. Returns (number of images saved, image_id -> relative path) for successful writes."""
+        image_count = 0
+        paths: Dict[str, str] = {}
+        for image_ids, future in self._pending.values():
+            try:
+                future.result()
+            except Exception as e:
+                self.logger.warning(f"Could not save image {image_ids[0]}: {e}", self.book_id)
+                continue
+            for image_id in image_ids:
+                paths[image_id] = self._paths[image_id]
+                image_count += 1
+        self._executor.shutdown()
+        unique = len(self._pending)
+        if image_count == 0:
+            self.logger.debug("No images found or extracted from the document", self.book_id)
+        else:
+            self.logger.debug(f"Successfully extracted {image_count} images ({unique} unique files)", self.book_id)
+        return image_count, paths
@@ -0,0 +1,40 @@
+"""
+Stage timing for the conversion pipeline.
+stage(name) times a block of work and passes (name, seconds) to every registered sink. Without sinks
+it costs two perf_counter calls, so it can wrap hot paths. Sinks run on the calling thread and must
+be cheap and thread-safe.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+
+StageSink = Callable[[str, float], None]
+
+_sinks: List[StageSink] = []
+
+
+def add_sink(sink: StageSink):
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def remove_sink(sink: StageSink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def record_stage(name: str, seconds: float):
+    for sink in _sinks:
+        sink(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage name. The time is recorded whether or not the block raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _sinks:
+            record_stage(name, time.perf_counter() - started)
@@ -0,0 +1,185 @@
+"""
+Event-driven job discovery.
+A background thread watches the storage root with inotify and queues {guid} folders as PDFs arrive.
+Full scans only run at startup, on a reconciliation interval, or on every poll when inotify is unavailable
+(inotify does not see changes made by other NFS clients, so reconciliation stays on in both modes).
+"""
+
+import ctypes
+import ctypes.util
+import os
+import queue
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+from logger import get_logger
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+IGNORED_DIRS = {"events"}
+
+
+class Inotify:
+    """Minimal ctypes binding to the Linux inotify API."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: dict[int, Path] = {}
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(str(path)), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch failed for {path}: {os.strerror(errno)}")
+        self.watches[wd] = path
+        return wd
+
+    def read_events(self) -> List[tuple[Optional[Path], int, str]]:
+        """Block until events arrive and return them as (watched path, mask, name)."""
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            offset += length
+            events.append((self.watches.get(wd), mask, name))
+        return events
+
+
+class JobDiscovery:
+    """Queues {guid} folders that may hold new work and decides when a full reconciliation scan is due."""
+
+    ROOT_MASK = IN_CREATE | IN_MOVED_TO
+    JOB_MASK = IN_CLOSE_WRITE | IN_MOVED_TO
+
+    def __init__(self, storage_root: Path, poll_interval: float, reconcile_interval: float, use_inotify: bool = True):
+        self.storage_root = storage_root
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        self.use_inotify = use_inotify
+        self.logger = get_logger(storage_root)
+        self._queue: "queue.Queue[Path]" = queue.Queue()
+        self._inotify: Optional[Inotify] = None
+        self._next_reconcile = 0.0
+
+    @property
+    def event_driven(self) -> bool:
+        return self._inotify is not None
+
+    def start(self):
+        """Start the inotify watcher thread, falling back to polling if inotify is not available."""
+        if not self.use_inotify:
+            self.logger.info(f"Job discovery: polling every {self.poll_interval:.0f}s")
+            return
+        try:
+            self._inotify = Inotify()
+            self._inotify.add_watch(self.storage_root, self.ROOT_MASK)
+            for entry in os.scandir(self.storage_root):
+                if entry.is_dir() and entry.name not in IGNORED_DIRS:
+                    self._watch_job_dir(Path(entry.path))
+        except (OSError, AttributeError) as e:
+            self.logger.warning(f"inotify unavailable ({e}), falling back to polling every {self.poll_interval:.0f}s")
+            self._inotify = None
+            return
+        threading.Thread(target=self._watch_loop, name="pdf2markdown-job-watcher", daemon=True).start()
+        self.logger.info(f"Job discovery: watching {len(self._inotify.watches)} folders, reconciling every {self.reconcile_interval:.0f}s")
+
+    def _watch_job_dir(self, guid_dir: Path):
+        try:
+            self._inotify.add_watch(guid_dir, self.JOB_MASK)
+        except OSError as e:
+            # Typically ENOSPC (fs.inotify.max_user_watches); reconciliation still finds the job
+            self.logger.warning(f"Could not watch {guid_dir}: {e}")
+
+    def _watch_loop(self):
+        while True:
+            try:
+                events = self._inotify.read_events()
+            except OSError as e:
+                self.logger.warning(f"inotify read failed: {e}")
+                time.sleep(self.poll_interval)
+                continue
+            for watched, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    self.logger.warning("inotify queue overflowed, scheduling a full scan")
+                    self.request_reconcile()
+                elif watched == self.storage_root:
+                    if mask & IN_ISDIR and name not in IGNORED_DIRS:
+                        guid_dir = self.storage_root / name
+                        self._watch_job_dir(guid_dir)
+                        self._queue.put(guid_dir)
+                elif watched is not None and name.startswith("original") and name.endswith(".pdf"):
+                    self._queue.put(watched)
+
+    def request_reconcile(self):
+        self._next_reconcile = 0.0
+        # Wake a consumer blocked in next_batch
+        self._queue.put(self.storage_root)
+
+    def next_batch(self, max_wait: Optional[float] = None) -> Optional[List[Path]]:
+        """
+        Wait for work. Returns the queued {guid} folders, or None when a full scan should run instead.
+        Without inotify every call after the poll interval is a full scan. With max_wait the call returns
+        (possibly an empty list) after at most that many seconds.
+        """
+        batch: List[Path] = []
+        timeout = self._next_reconcile - time.monotonic()
+        if max_wait is not None:
+            timeout = min(timeout, max_wait)
+        if timeout > 0:
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                while True:
+                    guid_dir = self._queue.get_nowait()
+                    if guid_dir not in batch:
+                        batch.append(guid_dir)
+            except queue.Empty:
+                pass
+        batch = [guid_dir for guid_dir in batch if guid_dir != self.storage_root]
+        if (batch or max_wait is not None) and time.monotonic() < self._next_reconcile:
+            return batch
+        self._next_reconcile = time.monotonic() + (self.reconcile_interval if self.event_driven else self.poll_interval)
+        return None
+
+
+class DiscoveryFeed:
+    """
+    A worker process's view of its node's JobDiscovery. The pool parent runs the one watcher of the
+    node and forwards every batch through a queue; None in the queue stands for a full scan.
+    """
+
+    def __init__(self, channel):
+        self._channel = channel
+
+    def next_batch(self, max_wait: Optional[float] = None) -> Optional[List[Path]]:
+        """Same contract as JobDiscovery.next_batch; batches queued meanwhile are merged."""
+        try:
+            first = self._channel.get(timeout=max_wait)
+        except queue.Empty:
+            return []
+        batches = [first]
+        while True:
+            try:
+                batches.append(self._channel.get_nowait())
+            except queue.Empty:
+                break
+        if any(batch is None for batch in batches):
+            return None
+        merged: List[Path] = []
+        for batch in batches:
+            merged.extend(guid_dir for guid_dir in batch if guid_dir not in merged)
+        return merged
@@ -0,0 +1,173 @@
+"""
+Persistent index of finished jobs.
+Lets job discovery skip completed and failed books without globbing their folders or parsing their progress files.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+import weakref
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+from storage_io import atomic_write_json
+
+INDEX_FILENAME = "pdf2markdown-index.json"
+
+# Worker processes are forked from the threaded server. Every index lock is taken around a fork, so
+# no thread is inside a read-modify-write (holding the lock and the lock file) when the child is made.
+_instances: "weakref.WeakSet[JobIndex]" = weakref.WeakSet()
+_held_at_fork = []
+
+
+def _before_fork():
+    for index in list(_instances):
+        index._lock.acquire()
+        _held_at_fork.append(index)
+
+
+def _after_fork_in_parent():
+    while _held_at_fork:
+        _held_at_fork.pop()._lock.release()
+
+
+def _after_fork_in_child():
+    while _held_at_fork:
+        _held_at_fork.pop()._lock = threading.Lock()
+
+
+os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent, after_in_child=_after_fork_in_child)
+
+
+def pdf_signature(pdf_path: Path) -> Dict[str, int]:
+    """Size and modification time of a book's PDF, kept with its entry to notice a replaced PDF."""
+    stat = pdf_path.stat()
+    return {"pdf_size": stat.st_size, "pdf_mtime_ns": stat.st_mtime_ns}
+
+
+def current_signature(pdf_path: Path) -> Optional[Dict[str, int]]:
+    """pdf_signature, or None if the PDF cannot be read; such an entry is scanned like one recorded without it."""
+    try:
+        return pdf_signature(pdf_path)
+    except OSError:
+        return None
+
+
+class JobIndex:
+    """Maps book ids to their last terminal state ("completed" or "failed"), shared by all workers through the storage root."""
+
+    def __init__(self, storage_root: Path):
+        self.path = storage_root / INDEX_FILENAME
+        self._lock_path = storage_root / f".{INDEX_FILENAME}.lock"
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+        _instances.add(self)
+        self.refresh()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            # A corrupt index only costs a full rescan, so start over rather than fail
+            return {}
+
+    def refresh(self):
+        """Reload the index if another process has written it since the last read."""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            if mtime != self._mtime:
+                self._entries = self._read()
+                self._mtime = mtime
+
+    def get(self, book_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(book_id)
+
+    def status_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for entry in self._entries.values():
+                counts[entry.get("status")] = counts.get(entry.get("status"), 0) + 1
+        return counts
+
+    def is_completed(self, book_id: str) -> bool:
+        entry = self.get(book_id)
+        return entry is not None and entry.get("status") == "completed"
+
+    def settled(self, book_id: str, now: Optional[float] = None) -> bool:
+        """
+        Whether a full scan can skip the book: completed, or failed with its PDF signature recorded and no
+        retry due. A killed book is looked at again once its next_retry_at has passed.
+        """
+        entry = self.get(book_id)
+        if entry is None:
+            return False
+        if entry.get("status") == "completed":
+            return True
+        # Failures recorded without a signature could not notice a replaced PDF, so they are still scanned
+        if entry.get("status") != "failed" or "pdf_size" not in entry:
+            return False
+        next_retry_at = entry.get("next_retry_at")
+        if not next_retry_at:
+            return True
+        now = time.time() if now is None else now
+        return datetime.fromisoformat(next_retry_at).timestamp() > now
+
+    def pdf_replaced(self, guid_dir: Path) -> bool:
+        """Whether the PDF of a recorded book changed since the entry was written (a single stat, no glob)."""
+        entry = self.get(guid_dir.name)
+        if entry is None or "pdf_size" not in entry:
+            return False
+        try:
+            return pdf_signature(guid_dir / entry["pdf"]) != {"pdf_size": entry["pdf_size"], "pdf_mtime_ns": entry["pdf_mtime_ns"]}
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def entry(status: str, pdf_name: str, error: Optional[str] = None, signature: Optional[Dict[str, int]] = None,
+              next_retry_at: Optional[str] = None) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {"status": status, "pdf": pdf_name}
+        if error:
+            entry["error"] = error
+        if signature:
+            entry.update(signature)
+        if next_retry_at:
+            entry["next_retry_at"] = next_retry_at
+        return entry
+
+    def record(self, book_id: str, status: str, pdf_name: str, error: Optional[str] = None, signature: Optional[Dict[str, int]] = None,
+               next_retry_at: Optional[str] = None):
+        """Record a terminal job state. The read-modify-write is serialized across processes with a lock file."""
+        self.record_many({book_id: self.entry(status, pdf_name, error, signature, next_retry_at)})
+
+    def record_many(self, entries: Dict[str, Dict[str, Any]]):
+        """Record several books (built with entry()) in one locked read-modify-write, e.g. a scan's backfill."""
+        if entries:
+            self._update(lambda current: current.update(entries))
+
+    def forget(self, book_id: str):
+        """Drop a book from the index so the next scan treats it as new (e.g. after a re-upload)."""
+        self._update(lambda entries: entries.pop(book_id, None))
+
+    def _update(self, change):
+        with self._lock:
+            fd = os.open(self._lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                entries = self._read()
+                change(entries)
+                atomic_write_json(self.path, entries, indent=None)
+                self._entries = entries
+                self._mtime = self.path.stat().st_mtime
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
@@ -0,0 +1,178 @@
+"""
+Job leases shared by all nodes mounting the same STORAGE_ROOT.
+A book is claimed by creating pdf2markdown-lease.{generation} in its {guid} folder with O_EXCL, one
+generation above the newest lease file; of several nodes racing for a book only one create succeeds.
+The owner renews its lease with a heartbeat. Once the newest lease has expired (or, on the owner's own
+node, its process is gone) the book may be taken over by creating the next generation. A process that
+finds a newer generation than its own has lost the book and must stop writing to it. A new claim is
+checked to be the newest lease after it is written, so a claimer that stalled on an old view backs off.
+A lease file left empty by a creator that crashed blocks the book for UNREADABLE_LEASE_SECONDS.
+Expiry compares wall clocks, so the nodes' clocks must be kept in sync (NTP) to well within LEASE_SECONDS.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from process_utils import pid_alive
+from storage_io import atomic_write_json
+from config import LEASE_SECONDS, NODE_ID
+
+LEASE_PREFIX = "pdf2markdown-lease."
+# How long a lease file without readable content (its creator crashed between create and write) blocks the book.
+# The content is written right after the create, so a live creator finishes well within this.
+UNREADABLE_LEASE_SECONDS = 10
+
+
+def _lease_files(guid_dir: Path) -> Dict[int, Path]:
+    try:
+        names = os.listdir(guid_dir)
+    except FileNotFoundError:
+        return {}
+    return {int(name[len(LEASE_PREFIX):]): guid_dir / name
+            for name in names if name.startswith(LEASE_PREFIX) and name[len(LEASE_PREFIX):].isdigit()}
+
+
+def current_lease(guid_dir: Path, lease_seconds: float = LEASE_SECONDS) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """(generation, content) of the newest lease of a job, or None if it was never claimed."""
+    files = _lease_files(guid_dir)
+    while files:
+        generation = max(files)
+        path = files.pop(generation)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return generation, json.load(f)
+        except FileNotFoundError:
+            # Removed as an old generation meanwhile
+            continue
+        except ValueError:
+            # Created but not written yet: valid for a short grace period from its creation
+            try:
+                return generation, {"expires_at": path.stat().st_mtime + min(lease_seconds, UNREADABLE_LEASE_SECONDS)}
+            except FileNotFoundError:
+                continue
+    return None
+
+
+def lease_active(lease: Dict[str, Any], node_id: str = NODE_ID, now: Optional[float] = None) -> bool:
+    """Whether a lease still holds. On its own node a lease of a process that no longer exists does not."""
+    if lease.get("released"):
+        return False
+    if lease.get("node") == node_id and "pid" in lease and not pid_alive(lease["pid"]):
+        return False
+    return lease.get("expires_at", 0) > (time.time() if now is None else now)
+
+
+def active_lease(guid_dir: Path, node_id: str = NODE_ID) -> Optional[Dict[str, Any]]:
+    """The lease of whoever is converting the book right now, or None."""
+    current = current_lease(guid_dir)
+    if current is not None and lease_active(current[1], node_id):
+        return current[1]
+    return None
+
+
+class JobLease:
+    """Claim of one node process on a job directory, renewed by a heartbeat thread while converting."""
+
+    def __init__(self, guid_dir: Path, node_id: str = NODE_ID, lease_seconds: float = LEASE_SECONDS):
+        self.guid_dir = guid_dir
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.generation: Optional[int] = None
+        self.acquired_at = 0.0
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @property
+    def path(self) -> Path:
+        return self.guid_dir / f"{LEASE_PREFIX}{self.generation}"
+
+    def owner(self) -> Dict[str, Any]:
+        """Who holds the job, as recorded in the progress file."""
+        return {"node": self.node_id, "pid": os.getpid(), "lease": self.generation}
+
+    def _content(self, now: float) -> Dict[str, Any]:
+        return {**self.owner(), "generation": self.generation, "acquired_at": self.acquired_at,
+                "renewed_at": now, "expires_at": now + self.lease_seconds}
+
+    def acquire(self) -> bool:
+        """Claim the job, taking it over if its lease expired. Returns False if someone else holds it."""
+        now = time.time()
+        current = current_lease(self.guid_dir, self.lease_seconds)
+        if current is not None and lease_active(current[1], self.node_id, now):
+            return False
+        generation = current[0] + 1 if current is not None else 1
+        path = self.guid_dir / f"{LEASE_PREFIX}{generation}"
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            # Another process claimed this generation first
+            return False
+        self.generation = generation
+        self.acquired_at = now
+        try:
+            os.write(fd, json.dumps(self._content(now)).encode('utf-8'))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        # A process that read an old generation and stalled can create a generation that a newer claim has
+        # already pruned; the claim only holds if it is the newest lease
+        current = current_lease(self.guid_dir, self.lease_seconds)
+        if current is None or current[0] != generation:
+            path.unlink(missing_ok=True)
+            self.generation = None
+            return False
+        # The previous generation stays as the floor for the next claim; older ones are no longer needed
+        for old_generation, old_path in _lease_files(self.guid_dir).items():
+            if old_generation < generation - 1:
+                old_path.unlink(missing_ok=True)
+        return True
+
+    def holds(self) -> bool:
+        """Whether this process still owns the newest lease."""
+        if self.generation is None:
+            return False
+        current = current_lease(self.guid_dir, self.lease_seconds)
+        return (current is not None and current[0] == self.generation
+                and current[1].get("node") == self.node_id and current[1].get("pid") == os.getpid())
+
+    def renew(self) -> bool:
+        """Extend the lease. Returns False if it was taken over meanwhile."""
+        if not self.holds():
+            return False
+        atomic_write_json(self.path, self._content(time.time()), indent=None)
+        return True
+
+    def start_heartbeat(self, on_lost: Callable[[], None], interval: Optional[float] = None):
+        """Renew the lease in the background; on_lost is called once if the job was taken over."""
+        interval = interval or self.lease_seconds / 4
+        self._stop.clear()
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    renewed = self.renew()
+                except OSError as e:
+                    # A transient storage error; the lease stays valid until it expires
+                    from logger import get_logger
+                    get_logger().warning(f"Could not renew lease {self.path}: {e}")
+                    continue
+                if not renewed:
+                    on_lost()
+                    return
+
+        self._heartbeat = threading.Thread(target=beat, name=f"lease-{self.guid_dir.name}", daemon=True)
+        self._heartbeat.start()
+
+    def release(self):
+        """Stop the heartbeat and mark the lease released. The file is kept as the floor for the next generation."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        if self.holds():
+            atomic_write_json(self.path, {**self._content(time.time()), "released": True, "expires_at": 0}, indent=None)
+        self.generation = None
+
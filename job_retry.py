@@ -0,0 +1,60 @@
+"""
+Retry state of books whose conversion was killed, by the watchdog or because the worker process died.
+It is kept in pdf2markdown-progress.json: "killed" records why, "attempts" counts the killed attempts
+and "next_retry_at" delays the next one with exponential backoff. After JOB_MAX_ATTEMPTS the book
+stays failed until its PDF is replaced or its progress file and job index entry are removed.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from config import JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF_SECONDS
+from timestamps import isoformat_utc
+
+# Watchdog kill reasons
+MEMORY = "memory"
+TIMEOUT = "timeout"
+WORKER_MEMORY = "worker_memory"
+EXITED = "exited"
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    return JOB_RETRY_BACKOFF_SECONDS * 2 ** max(0, attempts - 1)
+
+
+def killed_progress(progress: Dict[str, Any], reason: str, detail: str, now: Optional[float] = None) -> Dict[str, Any]:
+    """Progress file content for a killed conversion. The chunk checkpoint is kept so the retry resumes, and the owner for the record."""
+    now = time.time() if now is None else now
+    attempts = int(progress.get("attempts", 0)) + 1
+    killed = {
+        "status": "failed",
+        "error": f"Conversion killed: {detail}",
+        "killed": {"reason": reason, "detail": detail, "at": isoformat_utc(now)},
+        "attempts": attempts
+    }
+    for key in ("chunks", "owner"):
+        if progress.get(key):
+            killed[key] = progress[key]
+    if attempts < JOB_MAX_ATTEMPTS:
+        killed["next_retry_at"] = isoformat_utc(now + retry_delay_seconds(attempts))
+    return killed
+
+
+def retry_blocked(progress: Dict[str, Any], now: Optional[float] = None) -> Optional[str]:
+    """Why a killed book must not be converted yet, or None if it may run."""
+    if progress.get("status") != "failed" or "killed" not in progress:
+        return None
+    attempts = int(progress.get("attempts", 0))
+    if attempts >= JOB_MAX_ATTEMPTS:
+        return f"gave up after {attempts} killed attempts"
+    next_retry_at = progress.get("next_retry_at")
+    if next_retry_at:
+        now = time.time() if now is None else now
+        if datetime.fromisoformat(next_retry_at).timestamp() > now:
+            return f"next retry at {next_retry_at}"
+    return None
+
+
+def carried_retry_state(progress: Dict[str, Any]) -> Dict[str, Any]:
+    """What a new attempt keeps from the previous progress file, so the attempts keep counting."""
+    return {"attempts": progress["attempts"]} if "attempts" in progress else {}
@@ -1,8 +1,21 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Dict, List, Optional, TextIO, Tuple, Union
+
+# A log message, or a function building it. Functions are only called if the message will be
+# emitted, so expensive f-strings can be passed as lambda: f"..." at no cost when filtered.
+LogMessage = Union[str, Callable[[], str]]
+
+def _resolve(message: LogMessage) -> str:
+    return message() if callable(message) else message
 
 class StorageLogger:
     """Logger that writes logs to both console and files in storage directory."""
@@ -33,6 +46,27 @@ class StorageLogger:
         service_formatter = logging.Formatter('%(asctime)s - %(levelname)s - [%(name)s] %(message)s')
         service_handler.setFormatter(service_formatter)
         self.logger.addHandler(service_handler)
+        self._fork_locks: List = []
+        os.register_at_fork(before=self._before_fork, after_in_parent=self._after_fork_in_parent,
+                            after_in_child=self._after_fork_in_child)
+
+    def _locks_for_fork(self) -> List:
+        """Locks taken around a fork, in the order threads take them, so no thread is writing a log line."""
+        return [handler.lock for handler in self.logger.handlers if handler.lock is not None]
+
+    def _before_fork(self):
+        self._fork_locks = self._locks_for_fork()
+        for lock in self._fork_locks:
+            lock.acquire()
+
+    def _after_fork_in_parent(self):
+        for lock in reversed(self._fork_locks):
+            lock.release()
+        self._fork_locks = []
+
+    def _after_fork_in_child(self):
+        # logging itself re-creates the handler locks in the child
+        self._fork_locks = []
     
     def _write_to_book_log(self, message: str, level: str, book_id: Optional[str] = None):
         """Write log entry to book-specific log file."""
@@ -61,29 +95,37 @@ class StorageLogger:
             print(f"[Logger] Failed to write to book log file: {e}")
             print(f"[{datetime.now().isoformat()}] {level} [{self.service_name}] [{book_id}] {message}")
     
-    def debug(self, message: str, book_id: Optional[str] = None):
+    def debug(self, message: LogMessage, book_id: Optional[str] = None):
         """Log debug message."""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        message = _resolve(message)
         if not message or message.strip() == '':
             return
         self.logger.debug(message)
         self._write_to_book_log(message, "DEBUG", book_id)
     
-    def info(self, message: str, book_id: Optional[str] = None):
+    def info(self, message: LogMessage, book_id: Optional[str] = None):
         """Log info message."""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        message = _resolve(message)
         if not message or message.strip() == '':
             return
         self.logger.info(message)
         self._write_to_book_log(message, "INFO", book_id)
     
-    def warning(self, message: str, book_id: Optional[str] = None):
+    def warning(self, message: LogMessage, book_id: Optional[str] = None):
         """Log warning message."""
+        message = _resolve(message)
         if not message or message.strip() == '':
             return
         self.logger.warning(message)
         self._write_to_book_log(message, "WARNING", book_id)
     
-    def error(self, message: str, book_id: Optional[str] = None, error: Optional[Exception] = None):
+    def error(self, message: LogMessage, book_id: Optional[str] = None, error: Optional[Exception] = None):
         """Log error message with optional exception details."""
+        message = _resolve(message)
         if not message or message.strip() == '':
             message = "Empty error message"
         if error:
@@ -94,20 +136,152 @@ class StorageLogger:
             self.logger.error(message)
             self._write_to_book_log(message, "ERROR", book_id)
     
-    def error_with_error(self, message: str, error: Exception, book_id: Optional[str] = None):
+    def error_with_error(self, message: LogMessage, error: Exception, book_id: Optional[str] = None):
         """Convenience method for logging errors with automatic error extraction."""
         self.error(message, book_id, error)
 
+    def flush(self):
+        """Flush the console and service log handlers."""
+        for handler in self.logger.handlers:
+            handler.flush()
+
+    def close(self):
+        """Flush everything before the process exits."""
+        self.flush()
+
+class AsyncStorageLogger(StorageLogger):
+    """
+    StorageLogger whose file and console output happens on background threads.
+    Callers only enqueue records: console/service-log records go through a QueueHandler, and
+    per-book lines are written by a writer thread that keeps book log files open (up to
+    max_open_files, least recently used closed first) and flushes once per batch.
+
+    QueueHandler.prepare still formats each record (message and traceback) on the calling thread;
+    only the stream and file writes move off it. close() is registered with atexit, which does
+    not run in forked children leaving through os._exit (multiprocessing workers) or a signal, so
+    those call flush() or close() themselves before exiting.
+    """
+
+    def __init__(self, storage_root: Path, service_name: str = "PDF2MarkdownService", log_level: str = "INFO",
+                 max_open_files: int = 64, flush_interval: float = 0.5):
+        super().__init__(storage_root, service_name, log_level)
+        self.max_open_files = max_open_files
+        self.flush_interval = flush_interval
+        self._handlers = list(self.logger.handlers)
+        self._start()
+        atexit.register(self.close)
+
+    def _start(self):
+        """(Re)start the background threads; also runs in forked children, where threads do not survive."""
+        self._record_queue: "queue.Queue" = queue.Queue()
+        self._book_queue: "queue.Queue[Optional[Tuple[str, str]]]" = queue.Queue()
+        self._book_files: "OrderedDict[str, TextIO]" = OrderedDict()
+        # Held by the writer thread while it writes book log files
+        self._book_lock = threading.Lock()
+        self.logger.handlers.clear()
+        self.logger.addHandler(logging.handlers.QueueHandler(self._record_queue))
+        self._listener = logging.handlers.QueueListener(self._record_queue, *self._handlers, respect_handler_level=True)
+        self._listener.start()
+        self._writer = threading.Thread(target=self._write_book_logs, name="pdf2markdown-book-log-writer", daemon=True)
+        self._writer.start()
+
+    def _locks_for_fork(self) -> List:
+        # Handlers (the QueueHandler puts under its lock), the queues, then the book log writer
+        return (super()._locks_for_fork() + [handler.lock for handler in self._handlers if handler.lock is not None]
+                + [self._record_queue.mutex, self._book_lock, self._book_queue.mutex])
+
+    def _after_fork_in_child(self):
+        super()._after_fork_in_child()
+        self._start()
+
+    def _write_to_book_log(self, message: str, level: str, book_id: Optional[str] = None):
+        if level not in ['ERROR', 'WARN', 'WARNING'] or not book_id:
+            return
+        if not message or message.strip() == '':
+            return
+        line = f"[{datetime.now().isoformat()}] {level} [{self.service_name}] [{book_id}] {message}\n"
+        self._book_queue.put((book_id, line))
+
+    def _book_file(self, book_id: str) -> TextIO:
+        f = self._book_files.get(book_id)
+        if f is not None:
+            self._book_files.move_to_end(book_id)
+            return f
+        book_log_dir = self.storage_root / book_id
+        book_log_dir.mkdir(exist_ok=True)
+        f = open(book_log_dir / f"{self.service_name}-book.log", 'a', encoding='utf-8')
+        self._book_files[book_id] = f
+        while len(self._book_files) > self.max_open_files:
+            _, oldest = self._book_files.popitem(last=False)
+            oldest.close()
+        return f
+
+    def _write_book_logs(self):
+        while True:
+            item = self._book_queue.get()
+            batch: List[Optional[Tuple[str, str]]] = [item]
+            # Collect whatever else arrives shortly after, then write it in one go
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._book_queue.get(timeout=timeout) if timeout > 0 else self._book_queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            lines_by_book: Dict[str, List[str]] = {}
+            for entry in batch:
+                if entry is not None:
+                    lines_by_book.setdefault(entry[0], []).append(entry[1])
+            with self._book_lock:
+                for book_id, lines in lines_by_book.items():
+                    try:
+                        f = self._book_file(book_id)
+                        f.writelines(lines)
+                        f.flush()
+                    except Exception as e:
+                        # Fallback to console if file writing fails
+                        print(f"[Logger] Failed to write to book log file: {e}")
+                        for line in lines:
+                            print(line, end='')
+            for _ in batch:
+                self._book_queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def flush(self):
+        """Block until all queued records and book log lines are written."""
+        if not self._writer.is_alive():
+            return
+        self._record_queue.join()
+        self._book_queue.join()
+        super().flush()
+
+    def close(self):
+        """Drain the queues and close the open files."""
+        if not self._writer.is_alive():
+            return
+        self._book_queue.put(None)
+        self._writer.join(timeout=10)
+        self._listener.stop()
+        for f in self._book_files.values():
+            f.close()
+        self._book_files.clear()
+
 # Global logger instance
 _global_logger: Optional[StorageLogger] = None
 
 def get_logger(storage_root: Optional[Path] = None) -> StorageLogger:
-    """Get or create global logger instance."""
+    """Get or create global logger instance. LOG_BACKEND=sync selects the synchronous logger."""
     global _global_logger
     if _global_logger is None:
         if storage_root is None:
             storage_root = Path(os.environ.get("STORAGE_ROOT", "../storage")).resolve()
-        _global_logger = StorageLogger(storage_root, "PDF2MarkdownService", "INFO")
+        log_level = os.environ.get("LOG_LEVEL", "INFO")
+        if os.environ.get("LOG_BACKEND", "async").lower() == "sync":
+            _global_logger = StorageLogger(storage_root, "PDF2MarkdownService", log_level)
+        else:
+            _global_logger = AsyncStorageLogger(storage_root, "PDF2MarkdownService", log_level)
     return _global_logger
 
 def set_logger(logger: StorageLogger):
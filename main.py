@@ -7,12 +7,15 @@ Main loop and job orchestration only (Single Responsibility Principle).
 import os
 import time
 from pathlib import Path
-from service import PDF2MarkdownWorker
 from logger import get_logger
-from event_logger import write_service_event
+from worker_pool import WorkerPool
+from job_index import JobIndex
+from metrics import MetricsCollector, install as install_metrics
+from scheduler import read_queue
+from config import MAX_UPLOAD_MB, WORKER_PROCESSES, WORKER_MAX_MEMORY_MB
 
 # --- Flask server for health check ---
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from api import api as api_blueprint
 import threading
 
@@ -22,48 +25,94 @@ STORAGE_ROOT = Path(os.environ.get("STORAGE_ROOT", str(DEFAULT_STORAGE_ROOT))).r
 # Flag to indicate if the worker loop has started
 worker_loop_started = threading.Event()
 
+# Startup phase reported by /ping: importing -> loading_models -> starting_workers -> ready (or failed)
+startup_state = {"phase": "starting", "phase_started": time.monotonic(), "durations": {}}
+
+def set_startup_phase(phase: str):
+    now = time.monotonic()
+    startup_state["durations"][startup_state["phase"]] = round(now - startup_state["phase_started"], 3)
+    startup_state["phase"] = phase
+    startup_state["phase_started"] = now
+
 app = Flask(__name__)
+# Werkzeug rejects larger request bodies before they are read
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024 + 1024 * 1024
 app.register_blueprint(api_blueprint, url_prefix='/api')
 
 @app.route('/ping')
 def ping():
     if worker_loop_started.is_set():
-        return jsonify({"status": "ok"}), 200
-    else:
-        return jsonify({"status": "starting"}), 503
+        return jsonify({"status": "ok", "phase": "ready", "durations": startup_state["durations"]}), 200
+    status = "failed" if startup_state["phase"] == "failed" else "starting"
+    return jsonify({
+        "status": status,
+        "phase": startup_state["phase"],
+        "phase_seconds": round(time.monotonic() - startup_state["phase_started"], 1),
+        "durations": startup_state["durations"]
+    }), 503
+
+metrics_collector = MetricsCollector()
+job_index = None
+
+def _scrape_gauges():
+    """Gauges computed when /metrics is scraped, from the job index and the scheduler's queue snapshot."""
+    global job_index
+    gauges = [("pdf2markdown_ready", "1 once the worker is ready.", {}, 1 if worker_loop_started.is_set() else 0)]
+    for phase, seconds in startup_state["durations"].items():
+        gauges.append(("pdf2markdown_startup_phase_seconds", "Duration of the startup phases.", {"phase": phase}, seconds))
+    if job_index is None:
+        job_index = JobIndex(STORAGE_ROOT)
+    job_index.refresh()
+    jobs = {"completed": 0, "failed": 0, **job_index.status_counts()}
+    try:
+        queue = read_queue(STORAGE_ROOT)
+        jobs["queued"] = len(queue["jobs"])
+        jobs["running"] = len(queue["running"])
+        gauges.append(("pdf2markdown_estimated_seconds_per_page", "Conversion speed the scheduler uses for start time estimates.",
+                       {}, queue["seconds_per_page"] or 0))
+    except OSError:
+        pass
+    for status, count in jobs.items():
+        gauges.append(("pdf2markdown_jobs", "Books by status (terminal states from the job index, queued and running from the scheduler).",
+                       {"status": status}, count))
+    gauges.append(("pdf2markdown_queue_depth", "Books waiting to be converted.", {}, jobs.get("queued", 0)))
+    return gauges
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_collector.render(_scrape_gauges()), mimetype="text/plain; version=0.0.4")
 
 def run_worker():
     logger = get_logger(STORAGE_ROOT)
     logger.info(f"Using storage root: {STORAGE_ROOT}")
+    install_metrics()
+    metrics_collector.clear_snapshots()
     try:
+        # Imported here so the Flask endpoints are up before marker/torch finish importing
+        set_startup_phase("importing")
+        from service import PDF2MarkdownWorker
+        set_startup_phase("loading_models")
         logger.debug("About to create PDF2MarkdownWorker instance.")
         worker = PDF2MarkdownWorker(STORAGE_ROOT)
         logger.debug("PDF2MarkdownWorker instance created successfully.")
         logger.debug("Starting PDF2MarkdownWorker loop...")
-        worker_loop_started.set()  # Indicate the worker loop has started
-        while True:
-            found_job = False
-            for guid_dir, pdf_path in worker.find_jobs():
-                found_job = True
-                # Extract book_id from guid_dir
-                book_id = Path(guid_dir).name
-                # Log service-start event for this book/job
-                write_service_event("service-start", book_id, "pdf2markdown", storage_root=str(STORAGE_ROOT))
-                try:
-                    worker.process_pdf(guid_dir, pdf_path)
-                    # Log service-stop event on success
-                    write_service_event("service-stop", book_id, "pdf2markdown", storage_root=str(STORAGE_ROOT), result="success")
-                except Exception as e:
-                    # Log service-stop event on error
-                    write_service_event("service-stop", book_id, "pdf2markdown", storage_root=str(STORAGE_ROOT), result="error", error=str(e))
-                    logger.error_with_error(f"Error processing {guid_dir}: {e}", e)
-            if not found_job:
-                logger.debug("No jobs found. Sleeping...")
-            time.sleep(10)
+        set_startup_phase("starting_workers")
+        # Books are converted in forked worker processes, never next to the Flask server, so a runaway
+        # conversion can be killed and the worker replaced without taking the service down
+        processes = max(1, WORKER_PROCESSES)
+        logger.info(f"Starting pool of {processes} worker processes")
+        pool = WorkerPool(worker, STORAGE_ROOT, processes, WORKER_MAX_MEMORY_MB)
+        pool.run(on_started=mark_ready)
     except Exception as e:
+        set_startup_phase("failed")
         logger.error_with_error(f"Fatal error in main: {e}", e)
         raise
 
+def mark_ready():
+    set_startup_phase("ready")
+    worker_loop_started.set()  # Indicate the worker loop has started
+    get_logger(STORAGE_ROOT).info(f"Worker ready, startup phases: {startup_state['durations']}")
+
 def run_flask():
     app.run(host="0.0.0.0", port=3000)
 
@@ -0,0 +1,297 @@
+"""
+In-process metrics in the Prometheus text exposition format, without a client library.
+Counters, gauges and histograms live in one registry per process. Worker pool children periodically
+write a snapshot of their registry to a node-local directory; the process serving /metrics merges
+those snapshots with its own registry (and folds in the totals of children that have exited).
+"""
+
+import bisect
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import instrumentation
+from process_utils import pid_alive, rss_bytes
+from storage_io import atomic_write_json
+
+SNAPSHOT_DIR = Path(tempfile.gettempdir()) / "pdf2markdown-metrics"
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    escaped = (name + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for name, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._registry = registry
+        self.values: Dict[Labels, Any] = {}
+        registry.metrics[name] = self
+
+    @property
+    def _lock(self) -> threading.Lock:
+        # Looked up on every use, as a forked child replaces the registry's lock
+        return self._registry.lock
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[_labels(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, registry: "Registry", name: str, help_text: str, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(registry, name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(key)
+            if series is None:
+                # Per-bucket counts (not cumulative) plus +Inf, then sum
+                series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, Metric] = {}
+        # Worker processes are forked from threads that scrape or snapshot the registry; the lock is
+        # taken around a fork so no child starts with it held
+        os.register_at_fork(before=self._before_fork, after_in_parent=self._after_fork_in_parent,
+                            after_in_child=self._after_fork_in_child)
+
+    def _before_fork(self):
+        self.lock.acquire()
+
+    def _after_fork_in_parent(self):
+        self.lock.release()
+
+    def _after_fork_in_child(self):
+        self.lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return Counter(self, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return Gauge(self, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DURATION_BUCKETS) -> Histogram:
+        return Histogram(self, name, help_text, buckets)
+
+    def reset(self):
+        """Forget all values, e.g. in a forked child that must only report its own work."""
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+
+    def snapshot(self) -> Dict[str, List]:
+        """JSON-serializable copy of the values: {metric name: [[labels, value], ...]}."""
+        with self.lock:
+            return {name: [[list(map(list, key)), json.loads(json.dumps(value))] for key, value in metric.values.items()]
+                    for name, metric in self.metrics.items() if metric.values}
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("pdf2markdown_stage_seconds", "Wall time of conversion pipeline stages.")
+JOB_SECONDS = REGISTRY.histogram("pdf2markdown_job_seconds", "Wall time of processed books.")
+PAGE_SECONDS = REGISTRY.histogram("pdf2markdown_page_seconds", "Conversion wall time per page of processed books.",
+                                  (0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 60))
+PAGES_TOTAL = REGISTRY.counter("pdf2markdown_pages_total", "Pages of processed books.")
+JOBS_TOTAL = REGISTRY.counter("pdf2markdown_jobs_processed_total", "Books processed, by result.")
+MODEL_LOAD_SECONDS = REGISTRY.gauge("pdf2markdown_model_load_seconds", "Time spent loading the Marker models, by source.")
+
+
+def _observe_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def install():
+    """Feed instrumentation stages into the stage histogram."""
+    instrumentation.add_sink(_observe_stage)
+
+
+# Set in worker processes that report through snapshot files
+_snapshot_process: Optional[str] = None
+
+
+def write_snapshot(process: str):
+    """Write this process's registry (and its RSS) where the /metrics process can merge it."""
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    atomic_write_json(SNAPSHOT_DIR / f"{os.getpid()}.json", {
+        "pid": os.getpid(), "process": process, "rss_bytes": rss_bytes(), "metrics": REGISTRY.snapshot()
+    }, indent=None)
+
+
+def flush_snapshot():
+    """Write the snapshot now (e.g. when a book finishes) if this process reports through snapshots."""
+    if _snapshot_process is not None:
+        try:
+            write_snapshot(_snapshot_process)
+        except OSError:
+            pass
+
+
+def start_snapshot_writer(process: str, interval: float):
+    """In a forked worker: report only this process's work from now on, writing a snapshot every interval seconds."""
+    global _snapshot_process
+    REGISTRY.reset()
+    _snapshot_process = process
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            flush_snapshot()
+    threading.Thread(target=loop, name="pdf2markdown-metrics", daemon=True).start()
+
+
+def _merge_values(metric: Metric, merged: Dict[Labels, Any], values: List):
+    for labels, value in values:
+        key = tuple(tuple(label) for label in labels)
+        if metric.kind == "counter":
+            merged[key] = merged.get(key, 0.0) + value
+        elif metric.kind == "gauge":
+            merged[key] = value
+        else:
+            current = merged.get(key)
+            if current is None:
+                merged[key] = [list(value[0]), value[1]]
+            else:
+                current[0] = [a + b for a, b in zip(current[0], value[0])]
+                current[1] += value[1]
+
+
+class MetricsCollector:
+    """Merges this process's registry with the snapshots of worker processes and renders the result."""
+
+    def __init__(self, registry: Registry = REGISTRY):
+        self.registry = registry
+        # Totals of exited workers, so counters do not go backwards when a worker is restarted
+        self._retired: Dict[str, Dict[Labels, Any]] = {}
+        self._lock = threading.Lock()
+        # Worker processes are forked from the server process whose scrape threads take this lock
+        os.register_at_fork(before=self._before_fork, after_in_parent=self._after_fork_in_parent,
+                            after_in_child=self._after_fork_in_child)
+
+    def _before_fork(self):
+        self._lock.acquire()
+
+    def _after_fork_in_parent(self):
+        self._lock.release()
+
+    def _after_fork_in_child(self):
+        self._lock = threading.Lock()
+
+    def clear_snapshots(self):
+        """Drop snapshots left by a previous run of the service."""
+        for path in SNAPSHOT_DIR.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    def _read_snapshots(self) -> Tuple[List[Dict], List[Dict]]:
+        live, exited = [], []
+        for path in SNAPSHOT_DIR.glob("*.json"):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if pid_alive(snapshot["pid"]):
+                live.append(snapshot)
+            else:
+                exited.append(snapshot)
+                path.unlink(missing_ok=True)
+        return live, exited
+
+    def render(self, extra_gauges: Iterable[Tuple[str, str, Dict[str, Any], float]] = ()) -> str:
+        """
+        Prometheus text format of every metric. extra_gauges are (name, help, labels, value) tuples
+        computed at scrape time (queue depth, job counts, ...).
+        """
+        live, exited = self._read_snapshots()
+        with self._lock:
+            for snapshot in exited:
+                for name, values in snapshot["metrics"].items():
+                    metric = self.registry.metrics.get(name)
+                    if metric is not None and metric.kind != "gauge":
+                        _merge_values(metric, self._retired.setdefault(name, {}), values)
+            own = self.registry.snapshot()
+            lines: List[str] = []
+            for name, metric in self.registry.metrics.items():
+                merged: Dict[Labels, Any] = {}
+                _merge_values(metric, merged, list(self._retired.get(name, {}).items()))
+                _merge_values(metric, merged, own.get(name, []))
+                for snapshot in live:
+                    _merge_values(metric, merged, snapshot["metrics"].get(name, []))
+                if merged:
+                    lines.extend(self._render_metric(metric, merged))
+        rss = [("main", rss_bytes())] + [(snapshot["process"], snapshot["rss_bytes"]) for snapshot in live]
+        lines.append("# HELP pdf2markdown_process_resident_memory_bytes Resident memory of the service processes.")
+        lines.append("# TYPE pdf2markdown_process_resident_memory_bytes gauge")
+        lines.extend(f"pdf2markdown_process_resident_memory_bytes{_format_labels([('process', process)])} {value}" for process, value in rss)
+        declared = set()
+        for name, help_text, labels, value in extra_gauges:
+            if name not in declared:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                declared.add(name)
+            lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_metric(metric: Metric, values: Dict[Labels, Any]) -> List[str]:
+        lines = [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+        for labels, value in sorted(values.items()):
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(metric.buckets) + [math.inf], counts):
+                cumulative += count
+                lines.append(f"{metric.name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{metric.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
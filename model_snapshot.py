@@ -0,0 +1,87 @@
+"""
+Pre-serialized snapshot of the Marker model dict.
+Loading the snapshot memory-maps the weights instead of resolving checkpoints and building every
+predictor, so a container with a baked-in snapshot becomes ready much faster. Any problem with the
+snapshot falls back to marker's create_model_dict().
+
+Build a snapshot (e.g. during the Docker build):
+    python model_snapshot.py build /app/models/marker-models.pt
+"""
+
+import sys
+import time
+from importlib import metadata as importlib_metadata
+from pathlib import Path
+from typing import Any, Dict, Optional
+from logger import get_logger
+from config import MODEL_SNAPSHOT_PATH
+from metrics import MODEL_LOAD_SECONDS
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def _snapshot_fingerprint() -> Dict[str, Any]:
+    import torch
+    versions = {}
+    for package in ("marker-pdf", "surya-ocr", "transformers"):
+        try:
+            versions[package] = importlib_metadata.version(package)
+        except importlib_metadata.PackageNotFoundError:
+            versions[package] = None
+    return {"format": SNAPSHOT_FORMAT_VERSION, "torch": torch.__version__, **versions}
+
+
+def save_model_snapshot(path: Path) -> Path:
+    """Create the models with marker's defaults and serialize them to path."""
+    import torch
+    from marker.models import create_model_dict
+    models = create_model_dict()
+    # llm_service is injected by PdfConverter at runtime and is not part of the snapshot
+    models.pop("llm_service", None)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    torch.save({"fingerprint": _snapshot_fingerprint(), "models": models}, tmp_path)
+    tmp_path.replace(path)
+    return path
+
+
+def _load_snapshot(path: Path) -> Optional[Dict[str, Any]]:
+    import torch
+    logger = get_logger()
+    snapshot = torch.load(path, mmap=True, weights_only=False)
+    if snapshot.get("fingerprint") != _snapshot_fingerprint():
+        logger.warning(f"Model snapshot {path} was built with {snapshot.get('fingerprint')}, ignoring it.")
+        return None
+    for predictor in snapshot["models"].values():
+        model = getattr(predictor, "model", None)
+        if model is not None:
+            model.eval()
+    return snapshot["models"]
+
+
+def load_model_dict() -> Dict[str, Any]:
+    """Load the Marker models, from MODEL_SNAPSHOT_PATH when it exists and matches the installed versions."""
+    logger = get_logger()
+    started = time.monotonic()
+    if MODEL_SNAPSHOT_PATH and Path(MODEL_SNAPSHOT_PATH).exists():
+        try:
+            models = _load_snapshot(Path(MODEL_SNAPSHOT_PATH))
+            if models is not None:
+                MODEL_LOAD_SECONDS.set(time.monotonic() - started, source="snapshot")
+                logger.info(f"Loaded models from snapshot {MODEL_SNAPSHOT_PATH} in {time.monotonic() - started:.1f}s")
+                return models
+        except Exception as e:
+            logger.warning(f"Could not load model snapshot {MODEL_SNAPSHOT_PATH}: {e}")
+    from marker.models import create_model_dict
+    models = create_model_dict()
+    MODEL_LOAD_SECONDS.set(time.monotonic() - started, source="created")
+    logger.info(f"Created models in {time.monotonic() - started:.1f}s")
+    return models
+
+
+if __name__ == "__main__":
+    target = sys.argv[2] if len(sys.argv) > 2 else MODEL_SNAPSHOT_PATH
+    if len(sys.argv) < 2 or sys.argv[1] != "build" or not target:
+        print("Usage: python model_snapshot.py build [path]  (path defaults to MODEL_SNAPSHOT_PATH)")
+        sys.exit(2)
+    print(f"Model snapshot written to {save_model_snapshot(Path(target))}")
@@ -0,0 +1,192 @@
+"""
+Content-addressed cache of converted pages.
+Each entry holds one page's markdown fragment, extracted images, page stats and table-of-contents
+entries, keyed by a hash of the page content and the Marker/Surya versions. Page numbers are stored
+as a placeholder so a page can be reused at a different position in another book.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from importlib import metadata as importlib_metadata
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from pdf_utils import get_file_hash, get_page_fingerprints
+
+# Bump when the stored format or the way fragments are produced changes
+CACHE_FORMAT_VERSION = 1
+PAGE_PLACEHOLDER = "{page}"
+_PAGE_IN_NAME = re.compile(r"_page_(\d+)_")
+
+
+def _pipeline_version() -> str:
+    versions = []
+    for package in ("marker-pdf", "surya-ocr"):
+        try:
+            versions.append(f"{package}={importlib_metadata.version(package)}")
+        except importlib_metadata.PackageNotFoundError:
+            versions.append(f"{package}=unknown")
+    return ";".join(versions + [f"format={CACHE_FORMAT_VERSION}"])
+
+
+@dataclass
+class CachedPage:
+    """One converted page with its page number replaced by PAGE_PLACEHOLDER."""
+    markdown: str
+    page_stats: Dict[str, Any]
+    table_of_contents: List[Dict[str, Any]] = field(default_factory=list)
+    images: Dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def from_page(cls, page_id: int, markdown: str, page_stats: Dict[str, Any], table_of_contents: List[Dict[str, Any]],
+                  images: Dict[str, bytes]) -> "CachedPage":
+        marker = f"_page_{page_id}_"
+        placeholder = f"_page_{PAGE_PLACEHOLDER}_"
+        return cls(
+            markdown=markdown.replace(marker, placeholder),
+            page_stats={**page_stats, "page_id": PAGE_PLACEHOLDER},
+            table_of_contents=[{**entry, "page_id": PAGE_PLACEHOLDER} for entry in table_of_contents],
+            images={name.replace(marker, placeholder, 1): data for name, data in images.items()},
+        )
+
+    def for_page(self, page_id: int) -> "CachedPage":
+        """Return the page with the placeholder replaced by page_id."""
+        placeholder = f"_page_{PAGE_PLACEHOLDER}_"
+        marker = f"_page_{page_id}_"
+        return CachedPage(
+            markdown=self.markdown.replace(placeholder, marker),
+            page_stats={**self.page_stats, "page_id": page_id},
+            table_of_contents=[{**entry, "page_id": page_id} for entry in self.table_of_contents],
+            images={name.replace(placeholder, marker, 1): data for name, data in self.images.items()},
+        )
+
+
+def page_of_image(image_name: str) -> Optional[int]:
+    """Page number encoded in a Marker image name (_page_N_Picture_M.ext)."""
+    match = _PAGE_IN_NAME.match(image_name)
+    return int(match.group(1)) if match else None
+
+
+class PageCache:
+    """SQLite-backed page cache with a total size bound and least-recently-used eviction."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / "pages.sqlite"
+        self.max_bytes = max_bytes
+        self.version = _pipeline_version()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._file_hashes: Dict[tuple, str] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections must not cross a fork, so each process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    key TEXT PRIMARY KEY, markdown TEXT, page_stats TEXT, toc TEXT,
+                    size INTEGER, last_used REAL);
+                CREATE TABLE IF NOT EXISTS page_images (
+                    key TEXT, name TEXT, data BLOB, PRIMARY KEY (key, name));
+                CREATE TABLE IF NOT EXISTS file_pages (
+                    file_hash TEXT, page INTEGER, key TEXT, PRIMARY KEY (file_hash, page));
+                CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+                CREATE INDEX IF NOT EXISTS file_pages_key ON file_pages (key);
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 0), total_size INTEGER NOT NULL);
+                INSERT OR IGNORE INTO cache_meta (id, total_size)
+                    SELECT 0, COALESCE(SUM(size), 0) FROM pages WHERE NOT EXISTS (SELECT 1 FROM cache_meta);
+            """)
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _file_hash(self, pdf_path: Path) -> str:
+        stat = pdf_path.stat()
+        cache_key = (str(pdf_path), stat.st_size, stat.st_mtime_ns)
+        if cache_key not in self._file_hashes:
+            self._file_hashes[cache_key] = get_file_hash(pdf_path)
+        return self._file_hashes[cache_key]
+
+    def page_keys(self, pdf_path: Path, pages: List[int]) -> Dict[int, str]:
+        """
+        Cache keys for the given pages. Pages of a PDF seen before are looked up by the file hash,
+        so duplicate uploads skip fingerprinting as well as conversion. Keys stored under another
+        pipeline version are recomputed (and replaced), so a version bump never serves stale pages.
+        """
+        conn = self._connection()
+        file_hash = self._file_hash(pdf_path)
+        keys: Dict[int, str] = {}
+        current_prefix = f"{self.version}:"
+        for page, key in conn.execute("SELECT page, key FROM file_pages WHERE file_hash = ?", (file_hash,)):
+            if page in pages and key.startswith(current_prefix):
+                keys[page] = key
+        missing = [page for page in pages if page not in keys]
+        if missing:
+            for page, fingerprint in get_page_fingerprints(pdf_path, missing).items():
+                keys[page] = f"{self.version}:{fingerprint}"
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO file_pages (file_hash, page, key) VALUES (?, ?, ?)",
+                                 [(file_hash, page, keys[page]) for page in missing])
+        return keys
+
+    def get(self, key: str) -> Optional[CachedPage]:
+        conn = self._connection()
+        row = conn.execute("SELECT markdown, page_stats, toc FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        images = {name: data for name, data in conn.execute("SELECT name, data FROM page_images WHERE key = ?", (key,))}
+        with conn:
+            conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+        return CachedPage(markdown=row[0], page_stats=json.loads(row[1]), table_of_contents=json.loads(row[2]), images=images)
+
+    def put(self, key: str, page: CachedPage):
+        page_stats = json.dumps(page.page_stats)
+        toc = json.dumps(page.table_of_contents)
+        size = len(page.markdown) + len(page_stats) + len(toc) + sum(len(data) for data in page.images.values())
+        conn = self._connection()
+        with conn:
+            # The running total in cache_meta changes in the same write transaction as the rows it sums
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE cache_meta SET total_size = total_size + ? - COALESCE((SELECT size FROM pages WHERE key = ?), 0)",
+                         (size, key))
+            conn.execute("INSERT OR REPLACE INTO pages (key, markdown, page_stats, toc, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, page.markdown, page_stats, toc, size, time.time()))
+            conn.execute("DELETE FROM page_images WHERE key = ?", (key,))
+            conn.executemany("INSERT INTO page_images (key, name, data) VALUES (?, ?, ?)",
+                             [(key, name, data) for name, data in page.images.items()])
+            total = conn.execute("SELECT total_size FROM cache_meta").fetchone()[0]
+        if total > self.max_bytes:
+            self._evict()
+
+    def total_size(self) -> int:
+        return self._connection().execute("SELECT total_size FROM cache_meta").fetchone()[0]
+
+    def _evict(self):
+        """Drop least recently used pages until the cache is at 90% of its size bound."""
+        conn = self._connection()
+        target = self.max_bytes * 0.9
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            total = conn.execute("SELECT total_size FROM cache_meta").fetchone()[0]
+            if total <= self.max_bytes:
+                # Another process evicted meanwhile
+                return
+            evicted = []
+            freed = 0
+            for key, size in conn.execute("SELECT key, size FROM pages ORDER BY last_used"):
+                if total - freed <= target:
+                    break
+                evicted.append((key,))
+                freed += size
+            conn.executemany("DELETE FROM pages WHERE key = ?", evicted)
+            conn.executemany("DELETE FROM page_images WHERE key = ?", evicted)
+            # File lookups pointing at evicted pages would only lead to misses
+            conn.executemany("DELETE FROM file_pages WHERE key = ?", evicted)
+            conn.execute("UPDATE cache_meta SET total_size = total_size - ?", (freed,))
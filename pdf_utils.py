@@ -0,0 +1,60 @@
+"""
+Cheap PDF inspection helpers that do not need the Marker models.
+"""
+
+from pathlib import Path
+from typing import Dict, List
+
+
+def get_page_count(pdf_path: Path) -> int:
+    """Return the number of pages in a PDF without rendering it."""
+    import pypdfium2 as pdfium
+    doc = pdfium.PdfDocument(str(pdf_path))
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def split_page_ranges(page_count: int, chunk_pages: int) -> List[List[int]]:
+    """Split pages 0..page_count-1 into consecutive ranges of at most chunk_pages pages."""
+    if chunk_pages <= 0:
+        return [list(range(page_count))]
+    return [list(range(start, min(start + chunk_pages, page_count))) for start in range(0, page_count, chunk_pages)]
+
+
+def get_file_hash(path: Path) -> str:
+    """SHA-256 of a file, read in 1 MB blocks."""
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_page_fingerprints(pdf_path: Path, pages: List[int], scale: float = 0.5) -> Dict[int, str]:
+    """
+    Hash the content of each page: its text layer plus a low-resolution grayscale render.
+    Identical pages in different PDFs get the same fingerprint.
+    """
+    import hashlib
+    import pypdfium2 as pdfium
+    fingerprints = {}
+    doc = pdfium.PdfDocument(str(pdf_path))
+    try:
+        for page_index in pages:
+            page = doc[page_index]
+            textpage = page.get_textpage()
+            digest = hashlib.sha256()
+            digest.update(textpage.get_text_bounded().encode("utf-8", "surrogatepass"))
+            bitmap = page.render(scale=scale, grayscale=True)
+            image = bitmap.to_pil()
+            digest.update(f"{image.width}x{image.height}".encode())
+            digest.update(image.tobytes())
+            fingerprints[page_index] = digest.hexdigest()
+            textpage.close()
+            page.close()
+    finally:
+        doc.close()
+    return fingerprints
@@ -0,0 +1,26 @@
+"""
+Process helpers shared by the worker pool, job leases, the running-jobs registry and the metrics collector.
+"""
+
+import os
+from typing import Optional
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether a process with this pid exists on this host. One owned by another user counts as alive."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def rss_bytes(pid: Optional[int] = None) -> int:
+    """Resident set size of a process (this one by default), or 0 if it cannot be read."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
@@ -0,0 +1,112 @@
+"""
+Live progress of one conversion: pages done of total, current stage, pages/sec and ETA.
+The figures are written into pdf2markdown-progress.json (atomically, through the worker's
+save_progress) at most once per interval, so frequent updates cost no extra I/O. While a long render
+reports nothing (a book or page range converted in one Marker call), a heartbeat thread rewrites the
+file periodically so its stage, elapsed time and ETA show the job is alive.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from timestamps import isoformat_utc
+
+
+class ProgressTracker:
+    """
+    Collects progress reported by the converter and the worker. write(progress) persists the whole
+    progress file content: the worker's state (status, step, chunk checkpoint) plus a "progress" entry.
+    estimated_seconds_per_page gives an ETA before the first pages finish.
+    """
+
+    def __init__(self, write: Callable[[Dict[str, Any]], None], pages_total: Optional[int], min_interval: float,
+                 estimated_seconds_per_page: Optional[float] = None):
+        self._write = write
+        self.pages_total = pages_total
+        self.min_interval = min_interval
+        self.estimated_seconds_per_page = estimated_seconds_per_page
+        self.state: Dict[str, Any] = {"status": "processing"}
+        self.stage = "starting"
+        self.pages_done = 0
+        # Pages finished in an earlier attempt (resumed chunks) do not count towards the speed
+        self._pages_resumed = 0
+        self.started = time.time()
+        self._last_write = 0.0
+        # Serializes writes of the worker and the heartbeat thread
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        elapsed = now - self.started
+        converted = self.pages_done - self._pages_resumed
+        pages_per_second = converted / elapsed if converted > 0 and elapsed > 0 else None
+        progress = {
+            "stage": self.stage,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "percent": round(100 * self.pages_done / self.pages_total, 1) if self.pages_total else None,
+            "pages_per_second": round(pages_per_second, 3) if pages_per_second else None,
+            "eta_seconds": None,
+            "elapsed_seconds": round(elapsed),
+            "started_at": isoformat_utc(self.started),
+            "updated_at": isoformat_utc(now)
+        }
+        if self.pages_total:
+            remaining = max(0, self.pages_total - self.pages_done)
+            if pages_per_second:
+                progress["eta_seconds"] = round(remaining / pages_per_second)
+                progress["eta_source"] = "measured"
+            elif self.estimated_seconds_per_page:
+                # Nothing finished yet (e.g. a book rendered in one pass): count down from the estimate
+                progress["eta_seconds"] = round(max(0.0, (self.pages_total - self._pages_resumed) * self.estimated_seconds_per_page - elapsed))
+                progress["eta_source"] = "estimated"
+            if progress["eta_seconds"] is not None:
+                progress["eta"] = isoformat_utc(now + progress["eta_seconds"])
+        return progress
+
+    def write(self, force: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_write < self.min_interval:
+                return
+            self._last_write = now
+            self._write({**self.state, "progress": self.snapshot()})
+
+    @contextmanager
+    def heartbeat(self, interval: float):
+        """Rewrite the progress every interval seconds while the block runs, unless it was written meanwhile."""
+        if interval <= 0:
+            yield
+            return
+        stopped = threading.Event()
+
+        def beat():
+            while not stopped.wait(interval):
+                if time.monotonic() - self._last_write >= interval:
+                    self.write(force=True)
+
+        thread = threading.Thread(target=beat, name="pdf2markdown-progress-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def update(self, force: bool = True, **state):
+        """Change the worker state (step, chunk checkpoint, ...) and write it; unthrottled by default."""
+        self.state.update(state)
+        if "step" in state:
+            self.stage = state["step"]
+        self.write(force)
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+        self.write()
+
+    def add_pages(self, pages: int, resumed: bool = False):
+        self.pages_done += pages
+        if resumed:
+            self._pages_resumed += pages
+        self.write()
@@ -0,0 +1,49 @@
+"""
+Result archive served by the download API.
+Built by the worker when a job completes and written atomically, so a download never sees a
+partial zip. Already-compressed images are stored rather than deflated again.
+"""
+
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from book_metadata import MARKER_METADATA_FILENAME
+
+RESULT_ARCHIVE_SUFFIX = "_result.zip"
+STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.gif'}
+
+
+def result_archive_path(guid_dir: Path, md_path: Path) -> Path:
+    return guid_dir / f"{md_path.stem}{RESULT_ARCHIVE_SUFFIX}"
+
+
+def build_result_archive(guid_dir: Path, md_path: Path) -> Path:
+    """Zip the markdown, bookmetadata.json, the Marker metadata sidecar and images/ of a job into {stem}_result.zip."""
+    zip_path = result_archive_path(guid_dir, md_path)
+    # Unique per call: concurrent first downloads on Flask's threads share a pid
+    fd, tmp_name = tempfile.mkstemp(dir=zip_path.parent, prefix=f".{zip_path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    # mkstemp creates the file private to this user; the archive is shared like the other job files
+    os.chmod(tmp_path, 0o644)
+    meta_path = guid_dir / "bookmetadata.json"
+    marker_meta_path = guid_dir / MARKER_METADATA_FILENAME
+    image_dir_path = guid_dir / "images"
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
+            zipf.write(md_path, arcname=f"{md_path.stem}.md")
+            if meta_path.exists():
+                zipf.write(meta_path, arcname="bookmetadata.json")
+            if marker_meta_path.exists():
+                # Already gzip-compressed
+                zipf.write(marker_meta_path, arcname=MARKER_METADATA_FILENAME, compress_type=zipfile.ZIP_STORED)
+            if image_dir_path.exists():
+                for img_file in sorted(image_dir_path.iterdir()):
+                    compression = zipfile.ZIP_STORED if img_file.suffix.lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                    zipf.write(img_file, arcname=f"images/{img_file.name}", compress_type=compression)
+        os.replace(tmp_path, zip_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return zip_path
@@ -0,0 +1,299 @@
+"""
+Job scheduler between job discovery and conversion.
+Pending books are ordered shortest-job-first by page count, weighted by priority class and aged by
+waiting time so large books are not starved. A node-wide memory budget caps how many books convert
+at once. The queue (positions and estimated start times) is published for the job_status API, one
+snapshot per node (running jobs and speed are per node), merged by read_queue.
+"""
+
+import fcntl
+import json
+import os
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from logger import get_logger
+from pdf_utils import get_page_count
+from process_utils import pid_alive
+from storage_io import atomic_write_json
+from timestamps import isoformat_utc
+from config import (CHUNK_PAGES, ESTIMATED_SECONDS_PER_PAGE, JOB_BASE_MEMORY_MB, JOB_MEMORY_PER_PAGE_MB, MEMORY_BUDGET_MB, NODE_ID,
+                    SCHEDULER_AGING_PAGES_PER_MINUTE, STREAM_PAGES, WORKER_PROCESSES)
+
+QUEUE_FILENAME_PREFIX = "pdf2markdown-queue."
+# The worker pool touches its node's snapshot this often; snapshots older than QUEUE_STALE_SECONDS are of nodes that are gone
+QUEUE_REFRESH_SECONDS = 60
+QUEUE_STALE_SECONDS = 300
+PRIORITY_WEIGHTS = {"high": 4.0, "normal": 1.0, "low": 0.25}
+DEFAULT_PRIORITY = "normal"
+# Node-local registry of the jobs converting on this host (read by the worker pool's watchdog)
+RUNNING_JOBS_DIR = Path(tempfile.gettempdir()) / "pdf2markdown-running"
+
+
+@dataclass
+class ScheduledJob:
+    guid_dir: Path
+    pdf_path: Path
+    page_count: int
+    priority: str
+    queued_at: float
+
+    @property
+    def job_id(self) -> str:
+        return self.guid_dir.name
+
+    @property
+    def memory_mb(self) -> int:
+        """Estimated peak memory. Chunked and streaming modes only hold one window of pages at a time."""
+        window = CHUNK_PAGES or STREAM_PAGES or self.page_count
+        return JOB_BASE_MEMORY_MB + JOB_MEMORY_PER_PAGE_MB * min(self.page_count, window)
+
+    def cost(self, now: float) -> float:
+        """Scheduling cost: weighted page count minus an allowance that grows while the job waits."""
+        waited_minutes = max(0.0, now - self.queued_at) / 60
+        return self.page_count / PRIORITY_WEIGHTS.get(self.priority, 1.0) - SCHEDULER_AGING_PAGES_PER_MINUTE * waited_minutes
+
+
+def read_job_priority(guid_dir: Path) -> str:
+    try:
+        with open(guid_dir / "job.json", 'r', encoding='utf-8') as f:
+            priority = json.load(f).get("priority", DEFAULT_PRIORITY)
+    except (OSError, ValueError):
+        return DEFAULT_PRIORITY
+    return priority if priority in PRIORITY_WEIGHTS else DEFAULT_PRIORITY
+
+
+def queue_path(storage_root: Path, node_id: str = NODE_ID) -> Path:
+    return storage_root / f"{QUEUE_FILENAME_PREFIX}{node_id}.json"
+
+
+def _read_queue_file(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def refresh_queue_snapshot(storage_root: Path, node_id: str = NODE_ID):
+    """Mark this node's snapshot as current, e.g. while its only worker is busy with one long book."""
+    try:
+        os.utime(queue_path(storage_root, node_id))
+    except OSError:
+        pass
+
+
+def read_queue(storage_root: Path, now: Optional[float] = None) -> Dict:
+    """
+    Queue snapshot of all nodes. Every node queues the same shared books, so a job is listed once,
+    with its best position and earliest estimated start over the nodes. Running jobs are the union.
+    """
+    now = time.time() if now is None else now
+    snapshots = []
+    for entry in os.scandir(storage_root):
+        # pdf2markdown-queue.json (no node id) is the single snapshot of older versions
+        if entry.name.startswith(QUEUE_FILENAME_PREFIX) and entry.name.endswith(".json") and entry.name != f"{QUEUE_FILENAME_PREFIX}json":
+            try:
+                if now - entry.stat().st_mtime > QUEUE_STALE_SECONDS:
+                    continue
+            except OSError:
+                continue
+            snapshot = _read_queue_file(Path(entry.path))
+            if isinstance(snapshot, dict):
+                snapshots.append(snapshot)
+    jobs: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for job_id, queued in snapshot.get("jobs", {}).items():
+            current = jobs.get(job_id)
+            if current is None:
+                jobs[job_id] = dict(queued)
+            else:
+                current["position"] = min(current["position"], queued["position"])
+                current["estimated_start"] = min(current["estimated_start"], queued["estimated_start"])
+    speeds = [snapshot["seconds_per_page"] for snapshot in snapshots if isinstance(snapshot.get("seconds_per_page"), (int, float))]
+    return {
+        "nodes": [snapshot.get("node") for snapshot in snapshots],
+        "seconds_per_page": round(statistics.mean(speeds), 3) if speeds else None,
+        "running": sorted({job_id for snapshot in snapshots for job_id in snapshot.get("running", [])}),
+        "jobs": jobs
+    }
+
+
+def read_seconds_per_page(storage_root: Path) -> Optional[float]:
+    """Conversion speed measured by this node's schedulers, or the average of the other nodes before it has one."""
+    snapshot = _read_queue_file(queue_path(storage_root))
+    try:
+        return float(snapshot["seconds_per_page"]) if snapshot else read_queue(storage_root)["seconds_per_page"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+class RunningJobs:
+    """Node-local registry of converting jobs and their memory estimates, shared by the worker processes."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_path = directory / ".lock"
+
+    def _entries_locked(self) -> List[Dict]:
+        entries = []
+        for entry_path in self.directory.glob("*.json"):
+            try:
+                with open(entry_path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                alive = pid_alive(entry["pid"])
+            except (OSError, ValueError, KeyError):
+                alive = False
+            if not alive:
+                # Left behind by a process that died mid-job
+                entry_path.unlink(missing_ok=True)
+                continue
+            entries.append(entry)
+        return entries
+
+    def _locked(self):
+        fd = os.open(self._lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _unlock(self, fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def entries(self) -> List[Dict]:
+        fd = self._locked()
+        try:
+            return self._entries_locked()
+        finally:
+            self._unlock(fd)
+
+    def try_admit(self, job: ScheduledJob, budget_mb: int, estimated_seconds: float) -> bool:
+        """Register the job if it fits the memory budget. A job is always admitted when nothing else runs."""
+        fd = self._locked()
+        try:
+            entries = self._entries_locked()
+            used_mb = sum(entry["memory_mb"] for entry in entries)
+            if budget_mb and entries and used_mb + job.memory_mb > budget_mb:
+                return False
+            atomic_write_json(self.directory / f"{job.job_id}.json", {
+                "job_id": job.job_id, "pid": os.getpid(), "memory_mb": job.memory_mb,
+                "started_at": time.time(), "estimated_seconds": estimated_seconds,
+                "guid_dir": str(job.guid_dir), "pdf": job.pdf_path.name, "page_count": job.page_count
+            }, indent=None)
+            return True
+        finally:
+            self._unlock(fd)
+
+    def release(self, job: ScheduledJob):
+        (self.directory / f"{job.job_id}.json").unlink(missing_ok=True)
+
+
+class Scheduler:
+    """
+    Keeps the pending jobs of one worker process and hands out the next one to convert.
+    Every worker process orders the same jobs the same way, so the job lock decides who runs the head.
+    """
+
+    def __init__(self, storage_root: Path):
+        self.storage_root = storage_root
+        self.logger = get_logger(storage_root)
+        self.queue_path = queue_path(storage_root)
+        self.running = RunningJobs(RUNNING_JOBS_DIR)
+        self.pending: Dict[str, ScheduledJob] = {}
+        self.seconds_per_page = self._load_seconds_per_page()
+
+    def _load_seconds_per_page(self) -> float:
+        return read_seconds_per_page(self.storage_root) or float(ESTIMATED_SECONDS_PER_PAGE)
+
+    def add(self, guid_dir: Path, pdf_path: Path):
+        """Queue a job found by discovery. The page count is read once per job, the priority on every call."""
+        existing = self.pending.get(guid_dir.name)
+        if existing is not None and existing.pdf_path == pdf_path:
+            # job.json may appear after the PDF (books copied in by hand, older API versions)
+            existing.priority = read_job_priority(guid_dir)
+            return
+        try:
+            page_count = get_page_count(pdf_path)
+            queued_at = pdf_path.stat().st_mtime
+        except Exception as e:
+            # Unreadable PDFs cost nothing to schedule; the conversion reports the error
+            self.logger.warning(f"Could not read page count of {pdf_path}: {e}", guid_dir.name)
+            page_count, queued_at = 0, time.time()
+        self.pending[guid_dir.name] = ScheduledJob(guid_dir, pdf_path, page_count, read_job_priority(guid_dir), queued_at)
+
+    def discard(self, job: ScheduledJob):
+        self.pending.pop(job.job_id, None)
+
+    def ordered(self) -> List[ScheduledJob]:
+        now = time.time()
+        return sorted(self.pending.values(), key=lambda job: (job.cost(now), job.queued_at))
+
+    def estimated_seconds(self, job: ScheduledJob) -> float:
+        return job.page_count * self.seconds_per_page
+
+    def peek(self) -> Optional[ScheduledJob]:
+        """Return the cheapest pending job (without removing it) and publish the queue."""
+        ordered = self.ordered()
+        self.publish(ordered)
+        return ordered[0] if ordered else None
+
+    def admit(self, job: ScheduledJob) -> bool:
+        """
+        Reserve memory for the next job, before it is claimed, and remove it from the queue. Returns False
+        when it has to wait; the caller then runs nothing else, so a large book at the head of the queue cannot starve.
+        """
+        if not self.running.try_admit(job, MEMORY_BUDGET_MB, self.estimated_seconds(job)):
+            self.logger.info(f"Job {job.job_id} ({job.page_count} pages, ~{job.memory_mb} MB) waits for the memory budget")
+            return False
+        self.pending.pop(job.job_id, None)
+        return True
+
+    def release(self, job: ScheduledJob):
+        """Give back the reservation of an admitted job that will not run here (claimed elsewhere or blocked)."""
+        self.running.release(job)
+        self.publish(self.ordered())
+
+    def retain(self, job_ids: Set[str]):
+        """Drop pending jobs a full scan no longer finds (completed or removed meanwhile)."""
+        for job_id in list(self.pending):
+            if job_id not in job_ids:
+                del self.pending[job_id]
+
+    def finish(self, job: ScheduledJob, elapsed_seconds: float, succeeded: bool):
+        """Release the job's memory reservation and learn the conversion speed from successful jobs."""
+        self.running.release(job)
+        # Near-instant runs are books another worker finished meanwhile and say nothing about speed
+        if succeeded and job.page_count > 0 and elapsed_seconds >= 1:
+            observed = elapsed_seconds / job.page_count
+            self.seconds_per_page = 0.8 * self.seconds_per_page + 0.2 * observed
+        self.publish(self.ordered())
+
+    def publish(self, ordered: List[ScheduledJob]):
+        """Write queue positions and estimated start times for the job_status API."""
+        now = time.time()
+        running = self.running.entries()
+        workers = max(1, WORKER_PROCESSES)
+        backlog = sum(max(0.0, entry["estimated_seconds"] - (now - entry["started_at"])) for entry in running)
+        queue = {}
+        for position, job in enumerate(ordered, start=1):
+            queue[job.job_id] = {
+                "position": position,
+                "page_count": job.page_count,
+                "priority": job.priority,
+                "estimated_start": isoformat_utc(now + backlog / workers)
+            }
+            backlog += self.estimated_seconds(job)
+        try:
+            atomic_write_json(self.queue_path, {
+                "node": NODE_ID,
+                "updated_at": isoformat_utc(now),
+                "seconds_per_page": round(self.seconds_per_page, 3),
+                "running": [entry["job_id"] for entry in running],
+                "jobs": queue
+            }, indent=None)
+        except OSError as e:
+            self.logger.warning(f"Could not write queue snapshot: {e}")
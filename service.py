@@ -1,13 +1,60 @@
 import json
 import base64
+import gc
+import io
+import math
+import re
+import multiprocessing
+import multiprocessing.util
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any
-from marker.converters.pdf import PdfConverter
-from marker.models import create_model_dict
+from typing import TYPE_CHECKING, Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
 from logger import get_logger
+from model_snapshot import load_model_dict
+from job_index import JobIndex, current_signature, pdf_signature
+from config import (CHUNK_PAGES, IMAGE_FORMAT, IMAGE_MAX_DIMENSION, IMAGE_QUALITY, IMAGE_WRITER_THREADS, PAGE_CACHE_DIR,
+                    PAGE_CACHE_MAX_MB, PARALLEL_PAGE_THRESHOLD, PARALLEL_PROCESSES, RESULT_ARCHIVE, STREAM_PAGES, TEXT_FAST_PATH,
+                    TEXT_FAST_PATH_MAX_IMAGE_COVERAGE, TEXT_FAST_PATH_MAX_PATHS, TEXT_FAST_PATH_MIN_CHARS, WORKER_PROCESSES,
+                    PROGRESS_HEARTBEAT_SECONDS, PROGRESS_WRITE_INTERVAL_SECONDS)
+from image_writer import ImageWriter
+from instrumentation import stage
+from page_cache import CachedPage, PageCache, page_of_image
+from pdf_utils import get_page_count, split_page_ranges
+from result_archive import build_result_archive
+from storage_io import atomic_write_json, atomic_write_text
+from text_layer import FAST_PATH_METHOD, classify_pages, extract_text_pages
+from tuning import apply_thread_settings, get_tuning_profile
+from progress import ProgressTracker
+from job_retry import carried_retry_state, retry_blocked
+from job_lease import active_lease
+from book_metadata import (MARKER_METADATA_FILENAME, METADATA_FILENAME, read_book_metadata, summarize_marker_metadata,
+                           write_book_metadata, write_marker_metadata)
+from scheduler import read_seconds_per_page
+from cgroup_limits import effective_cpu_count
+
+if TYPE_CHECKING:
+    # marker pulls in torch; it is imported when the converter is built, not when this module loads
+    from marker.converters.pdf import PdfConverter
 
 PROGRESS_FILENAME = "pdf2markdown-progress.json"
-METADATA_FILENAME = "bookmetadata.json"
+CHUNKS_DIRNAME = "pdf2markdown-chunks"
+# Page marker Marker's Markdown renderer emits with paginate_output: "\n\n{page_id}" + "-" * 48 + "\n\n"
+PAGE_SEPARATOR_PATTERN = re.compile(r"\n*\{(\d+)\}-{48}\n\n")
+IMAGE_REFERENCE_PATTERN = re.compile(r'!\[\]\((_page_\d+_Picture_\d+\.\w+)\)')
+
+# Converter inherited by the forked page-range processes; set just before the pool forks.
+_parallel_converter: Optional["MarkerPDFConverter"] = None
+
+def _init_parallel_process(threads: int):
+    import torch
+    torch.set_num_threads(threads)
+    # Executor processes exit through os._exit, skipping atexit; multiprocessing still runs its finalizers
+    multiprocessing.util.Finalize(None, get_logger().close, exitpriority=10)
+
+def _render_in_process(pdf_file: Path, image_dir_path: Path, page_range: List[int], book_id: str | None) -> tuple[str, dict, int]:
+    return _parallel_converter._render(pdf_file, image_dir_path, page_range, book_id)
 
 class MarkerPDFConverter:
     """Converts PDF files to Markdown format using Marker, with image extraction and metadata."""
@@ -21,8 +68,14 @@ class MarkerPDFConverter:
         if self.extract_images:
             self.image_dir.mkdir(exist_ok=True)
             logger.debug("MarkerPDFConverter: image_dir created (if not exists).")
+        self.page_cache = PageCache(Path(PAGE_CACHE_DIR), PAGE_CACHE_MAX_MB * 1024 * 1024) if PAGE_CACHE_DIR else None
+        # Set by the worker for the book being converted; finished page ranges are reported to it
+        self.progress: Optional[ProgressTracker] = None
+        self.tuning = get_tuning_profile()
         try:
-            self.converter = PdfConverter(artifact_dict=create_model_dict())
+            apply_thread_settings(self.tuning)
+            self.artifact_dict = load_model_dict()
+            self.converter = self._build_converter()
             logger.debug("MarkerPDFConverter: PdfConverter created.")
         except Exception as e:
             logger.info(f"MarkerPDFConverter: PdfConverter creation failed with error: {e}")
@@ -30,179 +83,585 @@ class MarkerPDFConverter:
             raise
         logger.debug("MarkerPDFConverter __init__ completed.")
 
+    def _build_converter(self, page_range: Optional[List[int]] = None, paginate_output: bool = False) -> "PdfConverter":
+        """Create a PdfConverter sharing the loaded models, optionally limited to a page range."""
+        from marker.converters.pdf import PdfConverter
+        config = self.tuning.converter_config() if self.tuning is not None else {}
+        if page_range is not None:
+            config["page_range"] = page_range
+        if paginate_output:
+            config["paginate_output"] = True
+        return PdfConverter(artifact_dict=self.artifact_dict, config=config or None)
+
+    def _render_cached(self, pdf_file: Path, image_dir_path: Path, page_range: Optional[List[int]] = None, book_id: str | None = None) -> tuple[str, dict, int]:
+        """
+        Like _render, but pages found in the page cache are not converted. The remaining pages are
+        converted per page (see _convert_pages) and added to the cache.
+        """
+        logger = get_logger()
+        pages = page_range if page_range is not None else list(range(get_page_count(pdf_file)))
+        keys = self.page_cache.page_keys(pdf_file, pages)
+        cached = {}
+        for page in pages:
+            entry = self.page_cache.get(keys[page])
+            # Pages cached by the text fast path are converted with the models again once it is turned off
+            if entry is not None and (TEXT_FAST_PATH or entry.page_stats.get('text_extraction_method') != FAST_PATH_METHOD):
+                cached[page] = entry.for_page(page)
+        missing = [page for page in pages if page not in cached]
+        logger.info(f"Page cache: {len(cached)} hits, {len(missing)} misses", book_id)
+        if missing:
+            for page, entry in self._convert_pages(pdf_file, missing, book_id).items():
+                self.page_cache.put(keys[page], CachedPage.from_page(page, entry.markdown, entry.page_stats, entry.table_of_contents, entry.images))
+                cached[page] = entry
+        text, metadata, image_count = self._assemble_pages(cached, pages, image_dir_path, book_id)
+        metadata['page_cache'] = {'hits': len(pages) - len(missing), 'misses': len(missing)}
+        return text, metadata, image_count
+
+    def _convert_pages(self, pdf_file: Path, pages: List[int], book_id: str | None = None) -> Dict[int, CachedPage]:
+        """
+        Convert pages one result per page. With TEXT_FAST_PATH, pages with a trustworthy text layer are
+        extracted directly; the rest (or all pages without it) are rendered by Marker with paginated
+        output and split. The fast path's routing decision is kept in each page's page_stats.
+        """
+        converted: Dict[int, CachedPage] = {}
+        routes: Dict[int, str] = {}
+        if TEXT_FAST_PATH:
+            with stage("classify_pages"):
+                routes = classify_pages(pdf_file, pages, TEXT_FAST_PATH_MIN_CHARS, TEXT_FAST_PATH_MAX_IMAGE_COVERAGE, TEXT_FAST_PATH_MAX_PATHS)
+            fast = [page for page in pages if routes[page] == FAST_PATH_METHOD]
+            if fast:
+                with stage("text_layer"):
+                    texts = extract_text_pages(pdf_file, fast)
+                for page in fast:
+                    converted[page] = CachedPage(markdown=texts[page],
+                                                 page_stats={'page_id': page, 'text_extraction_method': FAST_PATH_METHOD})
+            get_logger().info(f"Text fast path: {len(fast)} of {len(pages)} pages", book_id)
+        slow = [page for page in pages if page not in converted]
+        if slow:
+            with stage("marker"):
+                rendered = self._build_converter(slow, paginate_output=True)(str(pdf_file))
+            for page, entry in self._split_rendered_pages(rendered, slow).items():
+                if page in routes:
+                    entry.page_stats = {**entry.page_stats, 'text_layer_route': routes[page]}
+                converted[page] = entry
+        return converted
+
+    def _assemble_pages(self, converted: Dict[int, CachedPage], pages: List[int], image_dir_path: Path, book_id: str | None = None) -> tuple[str, dict, int]:
+        """Join per-page results in page order, save their images and build the Marker-style metadata."""
+        texts = [converted[page].markdown for page in pages if converted[page].markdown]
+        images = {name: data for page in pages for name, data in converted[page].images.items()}
+        metadata = {
+            'table_of_contents': [item for page in pages for item in converted[page].table_of_contents],
+            'page_stats': [converted[page].page_stats for page in pages]
+        }
+        text, image_count = self._write_images_and_update_references("\n\n".join(texts), images, image_dir_path, book_id)
+        return text, metadata, image_count
+
+    @staticmethod
+    def _split_rendered_pages(rendered, pages: List[int]) -> Dict[int, CachedPage]:
+        """Split paginated Marker output into one CachedPage per page, with images encoded to bytes."""
+        fragments = {page: "" for page in pages}
+        parts = PAGE_SEPARATOR_PATTERN.split(rendered.markdown)
+        for page_id, fragment in zip(parts[1::2], parts[2::2]):
+            fragments[int(page_id)] = fragment.strip()
+        stats = {entry.get('page_id'): entry for entry in rendered.metadata.get('page_stats', [])}
+        split = {page: CachedPage(markdown=fragments[page], page_stats=stats.get(page, {'page_id': page})) for page in pages}
+        for item in rendered.metadata.get('table_of_contents') or []:
+            if item.get('page_id') in split:
+                split[item['page_id']].table_of_contents.append(item)
+        for image_id, image_data in (rendered.images or {}).items():
+            page = page_of_image(image_id)
+            if page in split:
+                split[page].images[image_id] = MarkerPDFConverter._encode_image(image_id, image_data)
+        return split
+
+    @staticmethod
+    def _encode_image(image_filename: str, image_data: Any) -> bytes:
+        """Encode a Marker image (PIL image or base64 string) in the format implied by its name."""
+        if hasattr(image_data, 'save'):
+            buffer = io.BytesIO()
+            image_data.save(buffer, format='JPEG' if image_filename.lower().endswith(('.jpg', '.jpeg')) else 'PNG')
+            return buffer.getvalue()
+        if isinstance(image_data, str):
+            if image_data.startswith('data:'):
+                image_data = image_data.split(',', 1)[1]
+            return base64.b64decode(image_data)
+        return image_data
+
+    def _render(self, pdf_file: Path, image_dir_path: Path, page_range: Optional[List[int]] = None, book_id: str | None = None) -> tuple[str, dict, int]:
+        """Run Marker on the PDF (or a page range of it), save images and return (markdown, marker metadata, image count)."""
+        if self.page_cache is not None:
+            return self._render_cached(pdf_file, image_dir_path, page_range, book_id)
+        if TEXT_FAST_PATH:
+            pages = page_range if page_range is not None else list(range(get_page_count(pdf_file)))
+            return self._assemble_pages(self._convert_pages(pdf_file, pages, book_id), pages, image_dir_path, book_id)
+        converter = self.converter if page_range is None else self._build_converter(page_range)
+        with stage("marker"):
+            rendered = converter(str(pdf_file))
+        text = rendered.markdown
+        metadata = rendered.metadata
+        images = rendered.images
+        text, image_count = self._write_images_and_update_references(text, images, image_dir_path, book_id)
+        return text, metadata, image_count
+
+    def _report_pages(self, pages: int, resumed: bool = False):
+        if self.progress is not None:
+            self.progress.add_pages(pages, resumed)
+
+    def _report_stage(self, name: str):
+        if self.progress is not None:
+            self.progress.set_stage(name)
+
+    def _use_parallel(self, page_count: int) -> bool:
+        return PARALLEL_PAGE_THRESHOLD > 0 and PARALLEL_PROCESSES > 1 and page_count >= PARALLEL_PAGE_THRESHOLD
+
+    def _render_streaming(self, pdf_file: Path, image_dir_path: Path, page_count: int, book_id: str | None = None) -> Iterator[tuple[str, dict, int]]:
+        """
+        Render STREAM_PAGES pages at a time, releasing each window's images and document before the next.
+        Each window is a separate Marker document, see _write_results for how that changes the output.
+        """
+        for page_range in split_page_ranges(page_count, STREAM_PAGES):
+            result = self._render(pdf_file, image_dir_path, page_range, book_id)
+            self._report_pages(len(page_range))
+            yield result
+            gc.collect()
+
+    def _render_ranges(self, pdf_file: Path, image_dir_path: Path, page_ranges: Dict[int, List[int]], book_id: str | None = None,
+                       parallel: bool = False) -> Iterator[Tuple[int, tuple[str, dict, int]]]:
+        """
+        Render page ranges keyed by index, yielding (index, result) as each range finishes.
+        In parallel mode the ranges are converted in forked processes sharing the loaded models and
+        results arrive in completion order. Marker names images after the original page number
+        (_page_N_Picture_M), so images written by different processes never collide. Each range is a
+        separate Marker document, see _write_results for how that changes the output.
+        """
+        if not parallel or len(page_ranges) < 2:
+            for index, page_range in page_ranges.items():
+                result = self._render(pdf_file, image_dir_path, page_range, book_id)
+                self._report_pages(len(page_range))
+                yield index, result
+            return
+        global _parallel_converter
+        _parallel_converter = self
+        processes = min(PARALLEL_PROCESSES, len(page_ranges))
+        threads = max(1, effective_cpu_count() // max(1, WORKER_PROCESSES) // processes)
+        executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("fork"),
+                                       initializer=_init_parallel_process, initargs=(threads,))
+        try:
+            futures = {executor.submit(_render_in_process, pdf_file, image_dir_path, page_range, book_id): index
+                       for index, page_range in page_ranges.items()}
+            for future in as_completed(futures):
+                result = future.result()
+                self._report_pages(len(page_ranges[futures[future]]))
+                yield futures[future], result
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+    def _write_results(self, output_file: Path, results: Iterable[tuple[str, dict, int]]) -> tuple[dict, int]:
+        """
+        Append page-range results to output_file in page order as they arrive, joined the way the
+        Markdown renderer joins pages, so only one range's markdown is held in memory at a time.
+        The file is written under a temporary name and renamed into place when complete.
+        Returns the merged Marker metadata and the image count.
+
+        The result is not always identical to rendering the book in one pass. Marker's document-wide
+        processors only see one range: heading levels are clustered per range, repeated headers and
+        footers are only recognized within a range, and text (or a table) continuing across a range
+        boundary is split into two blocks. "python -m benchmarks.run --single-pass-diff" measures it.
+        """
+        metadata: Dict[str, Any] = {}
+        image_count = 0
+        wrote_text = False
+        tmp_path = output_file.with_name(f".{output_file.name}.partial")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for text, range_metadata, range_image_count in results:
+                if text:
+                    with stage("write_markdown"):
+                        if wrote_text:
+                            f.write("\n\n")
+                        f.write(text)
+                    wrote_text = True
+                image_count += range_image_count
+                metadata = self._merge_marker_metadata(metadata, range_metadata)
+        os.replace(tmp_path, output_file)
+        return metadata, image_count
+
+    def _build_conversion_metadata(self, metadata: dict, image_count: int, output_file: Path, image_dir_path: Path) -> dict:
+        page_cache = metadata.pop('page_cache', None)
+        conversion_metadata = {
+            'total_pages': len(metadata.get('page_stats', [])),
+            'total_images': image_count,
+            'output_file': str(output_file),
+            'image_directory': str(image_dir_path) if self.extract_images else None,
+            'marker_metadata': metadata
+        }
+        if page_cache is not None:
+            conversion_metadata['page_cache'] = page_cache
+        page_stats = metadata.get('page_stats', [])
+        fast_pages = sum(1 for stats in page_stats if stats.get('text_extraction_method') == FAST_PATH_METHOD)
+        if TEXT_FAST_PATH or fast_pages:
+            reasons: Dict[str, int] = {}
+            for stats in page_stats:
+                if stats.get('text_extraction_method') != FAST_PATH_METHOD and 'text_layer_route' in stats:
+                    reasons[stats['text_layer_route']] = reasons.get(stats['text_layer_route'], 0) + 1
+            conversion_metadata['text_fast_path'] = {
+                'fast_pages': fast_pages,
+                'model_pages': len(page_stats) - fast_pages,
+                'model_reasons': reasons
+            }
+        return conversion_metadata
+
     def convert_pdf_to_markdown(self, pdf_path: str, output_path: str, image_dir_path: Path, book_id: str | None = None) -> dict:
         pdf_file = Path(pdf_path)
         output_file = Path(output_path)
         logger = get_logger()
         logger.info(f"Starting conversion: {pdf_file.name} -> {output_file.name}", book_id)
+        self._report_stage("rendering")
         try:
-            rendered = self.converter(str(pdf_file))
-            text = rendered.markdown
-            metadata = rendered.metadata
-            images = rendered.images
-            image_count = 0
-            image_paths = {}
-            if self.extract_images and images:
-                image_count, image_paths = self._save_images(images, image_dir_path, book_id)
-            text = self._update_image_references(text, image_paths, book_id)
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(text)
-            conversion_metadata = {
-                'total_pages': len(metadata.get('page_stats', [])),
-                'total_images': image_count,
-                'output_file': str(output_file),
-                'image_directory': str(image_dir_path) if self.extract_images else None,
-                'marker_metadata': metadata
-            }
+            page_count = get_page_count(pdf_file) if PARALLEL_PAGE_THRESHOLD > 0 or STREAM_PAGES > 0 else 0
+            if self._use_parallel(page_count):
+                page_ranges = split_page_ranges(page_count, math.ceil(page_count / PARALLEL_PROCESSES))
+                logger.info(f"Converting {page_count} pages in {len(page_ranges)} parallel page ranges", book_id)
+                results = dict(self._render_ranges(pdf_file, image_dir_path, dict(enumerate(page_ranges)), book_id, parallel=True))
+                metadata, image_count = self._write_results(output_file, (results.pop(index) for index in range(len(page_ranges))))
+            elif STREAM_PAGES > 0:
+                logger.info(f"Streaming {page_count} pages in windows of {STREAM_PAGES} pages", book_id)
+                metadata, image_count = self._write_results(output_file, self._render_streaming(pdf_file, image_dir_path, page_count, book_id))
+            else:
+                text, metadata, image_count = self._render(pdf_file, image_dir_path, book_id=book_id)
+                self._report_pages(len(metadata.get('page_stats', [])))
+                with stage("write_markdown"):
+                    atomic_write_text(output_file, text)
+            conversion_metadata = self._build_conversion_metadata(metadata, image_count, output_file, image_dir_path)
             logger.info("Conversion completed successfully!", book_id)
-            logger.info(f"Conversion metadata: {conversion_metadata}", book_id)
+            logger.info(lambda: f"Conversion metadata: {conversion_metadata}", book_id)
             return conversion_metadata
         except Exception as e:
             logger.error_with_error(f"Error during conversion: {str(e)}", e, book_id)
             raise
 
-    def _save_images(self, images: Dict[str, Any], image_dir_path: Path, book_id: str | None = None) -> tuple[int, Dict[str, str]]:
-        image_count = 0
-        image_paths = {}
-        image_dir_path.mkdir(exist_ok=True)
+    def convert_pdf_to_markdown_chunked(self, pdf_path: str, output_path: str, image_dir_path: Path, chunk_dir: Path, chunk_pages: int,
+                                        completed_chunks: Optional[set[int]] = None,
+                                        on_chunk_complete: Optional[Callable[[int, int], None]] = None,
+                                        book_id: str | None = None) -> dict:
+        """
+        Convert the PDF in fixed page ranges, persisting each chunk's markdown and metadata in chunk_dir.
+        Chunks listed in completed_chunks whose files exist are not converted again, so an interrupted
+        conversion resumes at the first unfinished chunk. on_chunk_complete(index, total) is called after
+        each chunk is persisted so the caller can checkpoint progress. Chunks are separate Marker
+        documents, so the output can differ from a single pass at chunk boundaries (see _write_results).
+        """
+        pdf_file = Path(pdf_path)
+        output_file = Path(output_path)
         logger = get_logger()
+        logger.info(f"Starting chunked conversion: {pdf_file.name} -> {output_file.name} ({chunk_pages} pages per chunk)", book_id)
         try:
-            for image_id, image_data in images.items():
-                try:
-                    image_filename = image_id
-                    image_path = image_dir_path / image_filename
-                    if hasattr(image_data, 'save'):
-                        if image_filename.lower().endswith('.png'):
-                            image_format = 'PNG'
-                        elif image_filename.lower().endswith(('.jpg', '.jpeg')):
-                            image_format = 'JPEG'
-                        else:
-                            image_format = 'PNG'
-                        image_data.save(image_path, format=image_format)
-                        image_paths[image_id] = f"{image_dir_path.name}/{image_filename}"
-                        image_count += 1
-                        logger.debug(f"Extracted image: {image_filename} ({getattr(image_data, 'size', 'unknown size')})", book_id)
-                    elif isinstance(image_data, str):
-                        if image_data.startswith('data:'):
-                            image_data = image_data.split(',', 1)[1]
-                        image_bytes = base64.b64decode(image_data)
-                        with open(image_path, 'wb') as f:
-                            f.write(image_bytes)
-                        image_paths[image_id] = f"{image_dir_path.name}/{image_filename}"
-                        image_count += 1
-                        logger.debug(f"Extracted image: {image_filename} (base64)", book_id)
-                    else:
-                        logger.warning(f"Unknown image data type for {image_id}: {type(image_data)}", book_id)
-                except Exception as e:
-                    logger.warning(f"Could not save image {image_id}: {e}", book_id)
+            page_count = get_page_count(pdf_file)
+            page_ranges = split_page_ranges(page_count, chunk_pages)
+            total = len(page_ranges)
+            chunk_dir.mkdir(exist_ok=True)
+            completed = set(completed_chunks or ())
+            pending = {}
+            for index, page_range in enumerate(page_ranges):
+                md_chunk_path, meta_chunk_path = self._chunk_paths(chunk_dir, index)
+                if index in completed and md_chunk_path.exists() and meta_chunk_path.exists():
+                    logger.info(f"Chunk {index + 1}/{total} already converted, skipping.", book_id)
+                    self._report_pages(len(page_range), resumed=True)
+                else:
+                    pending[index] = page_range
+            self._report_stage("rendering")
+            for index, (text, metadata, image_count) in self._render_ranges(pdf_file, image_dir_path, pending, book_id, self._use_parallel(page_count)):
+                page_range = page_ranges[index]
+                md_chunk_path, meta_chunk_path = self._chunk_paths(chunk_dir, index)
+                with stage("write_chunk"):
+                    atomic_write_text(md_chunk_path, text)
+                    atomic_write_json(meta_chunk_path, {
+                        'pages': [page_range[0], page_range[-1]],
+                        'total_images': image_count,
+                        'marker_metadata': metadata
+                    }, indent=None)
+                completed.add(index)
+                logger.info(f"Chunk {index + 1}/{total} converted (pages {page_range[0] + 1}-{page_range[-1] + 1})", book_id)
+                if on_chunk_complete:
+                    on_chunk_complete(index, total)
+            self._report_stage("merging_chunks")
+            metadata, image_count = self._write_results(output_file, self._load_chunks(chunk_dir, total))
+            conversion_metadata = self._build_conversion_metadata(metadata, image_count, output_file, image_dir_path)
+            logger.info("Conversion completed successfully!", book_id)
+            logger.info(lambda: f"Conversion metadata: {conversion_metadata}", book_id)
+            return conversion_metadata
+        except Exception as e:
+            logger.error_with_error(f"Error during conversion: {str(e)}", e, book_id)
+            raise
+
+    @staticmethod
+    def _chunk_paths(chunk_dir: Path, index: int) -> tuple[Path, Path]:
+        return chunk_dir / f"chunk_{index:05d}.md", chunk_dir / f"chunk_{index:05d}.json"
+
+    def _load_chunks(self, chunk_dir: Path, total: int) -> Iterator[tuple[str, dict, int]]:
+        """Read the persisted chunks back one at a time, in page order."""
+        for index in range(total):
+            md_chunk_path, meta_chunk_path = self._chunk_paths(chunk_dir, index)
+            with open(md_chunk_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            with open(meta_chunk_path, 'r', encoding='utf-8') as f:
+                chunk_meta = json.load(f)
+            yield text, chunk_meta.get('marker_metadata', {}), chunk_meta.get('total_images', 0)
+
+    @staticmethod
+    def _merge_marker_metadata(merged: Dict[str, Any], chunk_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Append a later page range's Marker metadata, keeping page_stats and table_of_contents in page order."""
+        if not merged:
+            merged = {**chunk_metadata,
+                      'table_of_contents': list(chunk_metadata.get('table_of_contents') or []),
+                      'page_stats': list(chunk_metadata.get('page_stats', []))}
+            if 'page_cache' in chunk_metadata:
+                merged['page_cache'] = dict(chunk_metadata['page_cache'])
+            return merged
+        merged['table_of_contents'].extend(chunk_metadata.get('table_of_contents') or [])
+        merged['page_stats'].extend(chunk_metadata.get('page_stats', []))
+        if 'page_cache' in chunk_metadata:
+            counters = merged.setdefault('page_cache', {'hits': 0, 'misses': 0})
+            for name in ('hits', 'misses'):
+                counters[name] += chunk_metadata['page_cache'].get(name, 0)
+        return merged
+
+    def _image_writer(self, image_dir_path: Path, book_id: str | None = None) -> ImageWriter:
+        return ImageWriter(image_dir_path, IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_MAX_DIMENSION, IMAGE_WRITER_THREADS, book_id)
+
+    def _write_images_and_update_references(self, text: str, images: Dict[str, Any], image_dir_path: Path, book_id: str | None = None) -> tuple[str, int]:
+        """
+        Save images on the image writer's thread pool while the markdown references are rewritten.
+        The writes only overlap that rewrite: they are waited for before returning, so the markdown
+        is never written before the images it references.
+        """
+        if not (self.extract_images and images):
+            return self._update_image_references(text, {}, book_id), 0
+        logger = get_logger()
+        try:
+            with stage("save_images"):
+                writer = self._image_writer(image_dir_path, book_id)
+                image_paths = writer.submit_all(images)
         except Exception as e:
             logger.warning(f"Image extraction failed: {e}", book_id)
-        if image_count == 0:
-            logger.debug("No images found or extracted from the document", book_id)
-        else:
-            logger.debug(f"Successfully extracted {image_count} images", book_id)
-        return image_count, image_paths
+            return self._update_image_references(text, {}, book_id), 0
+        text = self._update_image_references(text, image_paths, book_id)
+        # Only the time spent waiting for writes that did not overlap the reference rewrite
+        with stage("save_images"):
+            image_count, _ = writer.wait()
+        return text, image_count
 
     def _update_image_references(self, markdown_text: str, image_paths: Dict[str, str], book_id: str | None = None) -> str:
-        import re
         logger = get_logger()
-        image_pattern = r'!\[\]\((_page_\d+_Picture_\d+\.\w+)\)'
+        image_refs = []
         def replace_image_path(match):
             original_path = match.group(1)
+            image_refs.append(original_path)
             if original_path in image_paths:
                 return f'![]({image_paths[original_path]})'
             else:
                 local_image_path = f"{self.image_dir.name}/{original_path}"
                 return f'![]({local_image_path})'
-        updated_text = re.sub(image_pattern, replace_image_path, markdown_text)
-        image_refs = re.findall(image_pattern, markdown_text)
+        # Rewrite and collect the references in a single pass over the text
+        with stage("update_image_references"):
+            updated_text = IMAGE_REFERENCE_PATTERN.sub(replace_image_path, markdown_text)
         if image_refs:
-            logger.info(f"Found {len(image_refs)} image references: {image_refs}", book_id)
+            logger.info(lambda: f"Found {len(image_refs)} image references: {image_refs}", book_id)
             extracted_count = sum(1 for ref in image_refs if ref in image_paths)
             logger.info(f"Successfully extracted {extracted_count}/{len(image_refs)} images", book_id)
         return updated_text
 
 class PDF2MarkdownWorker:
-    def __init__(self, storage_root: Path):
+    def __init__(self, storage_root: Path, converter: Optional[MarkerPDFConverter] = None):
         self.storage_root = storage_root
-        self.converter = MarkerPDFConverter()
+        # A converter can be shared (e.g. by the benchmark harness) to avoid loading the models twice
+        self.converter = converter or MarkerPDFConverter()
         self.logger = get_logger(storage_root)
+        self.index = JobIndex(storage_root)
         self.logger.info(f"PDF2MarkdownWorker initialized with storage_root: {storage_root}")
+        if CHUNK_PAGES > 0:
+            self.logger.warning(f"CHUNK_PAGES={CHUNK_PAGES} is experimental: headings, page headers/footers and text crossing "
+                                "a chunk boundary can come out differently than in a single pass.")
 
-    def find_jobs(self):
+    def find_jobs(self, guid_dirs: Optional[Iterable[Path]] = None):
+        """
+        Yield (guid_dir, pdf_path) for every unfinished book. Scans all of storage_root unless guid_dirs
+        is given. In a full scan, books the job index records as completed, or as failed with no retry
+        due, cost one stat of their PDF (to notice a replaced PDF) instead of a glob and a progress file
+        read. guid_dirs come from discovery events, so they are always globbed: the event may be a new
+        PDF in a finished folder.
+        """
         self.logger.info("Entering find_jobs()...")
-        for guid_dir in self.storage_root.iterdir():
-            if guid_dir.is_dir():
-                # Support any original*.pdf
-                for pdf_path in guid_dir.glob("original*.pdf"):
-                    progress_path = guid_dir / PROGRESS_FILENAME
-                    job_completed = False
-                    if progress_path.exists():
-                        try:
-                            with open(progress_path, 'r') as f:
-                                progress = json.load(f)
-                            # Check if this specific PDF has been processed (by output .md file)
-                            md_path = guid_dir / f"{pdf_path.stem}.md"
-                            if progress.get("status") == "completed" and md_path.exists():
-                                job_completed = True
-                        except Exception as e:
-                            self.logger.warning(f"Could not read progress file {progress_path}: {e}")
-                    if pdf_path.exists() and not job_completed:
-                        self.logger.info(f"Found job: {pdf_path}")
-                        yield guid_dir, pdf_path
+        self.index.refresh()
+        scan = guid_dirs is None
+        if scan:
+            guid_dirs = (Path(entry.path) for entry in os.scandir(self.storage_root) if entry.is_dir())
+        # Finished books the index does not know yet, recorded together once the scan ends
+        backfill: Dict[str, Dict[str, Any]] = {}
+        try:
+            yield from self._find_jobs(guid_dirs, backfill, scan)
+        finally:
+            self.index.record_many(backfill)
         self.logger.info("Exiting find_jobs()")
 
+    def _find_jobs(self, guid_dirs: Iterable[Path], backfill: Dict[str, Dict[str, Any]], scan: bool):
+        for guid_dir in guid_dirs:
+            settled = self.index.settled(guid_dir.name)
+            replaced = self.index.pdf_replaced(guid_dir)
+            if (scan and settled and not replaced) or not guid_dir.is_dir():
+                continue
+            lease = active_lease(guid_dir)
+            if lease is not None:
+                # Being converted by another process or node; found again if its lease expires
+                self.logger.debug(f"Skipping {guid_dir.name}, leased by {lease.get('node')} (pid {lease.get('pid')})")
+                continue
+            if replaced:
+                self.logger.info(f"The PDF of {self.index.get(guid_dir.name)['status']} book {guid_dir.name} was replaced, converting it again", guid_dir.name)
+                self.index.forget(guid_dir.name)
+                # Drops the terminal status, the retry state and any chunk checkpoint of the old PDF
+                self.save_progress(guid_dir, {"status": "pending"})
+            # Support any original*.pdf
+            for pdf_path in guid_dir.glob("original*.pdf"):
+                progress_path = guid_dir / PROGRESS_FILENAME
+                job_completed = False
+                if progress_path.exists():
+                    try:
+                        with open(progress_path, 'r') as f:
+                            progress = json.load(f)
+                        # Check if this specific PDF has been processed (by output .md file)
+                        md_path = guid_dir / f"{pdf_path.stem}.md"
+                        if progress.get("status") == "completed" and md_path.exists():
+                            job_completed = True
+                            backfill[guid_dir.name] = JobIndex.entry("completed", pdf_path.name, signature=pdf_signature(pdf_path))
+                        elif blocked := retry_blocked(progress):
+                            self.logger.debug(f"Skipping killed job {pdf_path}: {blocked}")
+                            backfill[guid_dir.name] = JobIndex.entry("failed", pdf_path.name, progress.get("error"), pdf_signature(pdf_path),
+                                                                     progress.get("next_retry_at"))
+                            continue
+                    except Exception as e:
+                        self.logger.warning(f"Could not read progress file {progress_path}: {e}")
+                if pdf_path.exists() and not job_completed:
+                    self.logger.info(f"Found job: {pdf_path}")
+                    yield guid_dir, pdf_path
+
     def load_progress(self, guid_dir: Path) -> Dict[str, Any]:
         progress_path = guid_dir / PROGRESS_FILENAME
         self.logger.info(f"Loading progress from {progress_path}")
         if progress_path.exists():
             with open(progress_path, 'r') as f:
                 progress = json.load(f)
-            self.logger.info(f"Loaded progress: {progress}")
+            self.logger.info(lambda: f"Loaded progress: {progress}")
             return progress
         self.logger.info("No progress file found, returning default progress.")
         return {"status": "pending"}
 
     def save_progress(self, guid_dir: Path, progress: Dict[str, Any]):
         progress_path = guid_dir / PROGRESS_FILENAME
-        self.logger.info(f"Saving progress to {progress_path}: {progress}")
-        with open(progress_path, 'w') as f:
-            json.dump(progress, f, indent=2)
+        self.logger.info(lambda: f"Saving progress to {progress_path}: {progress}")
+        with stage("write_progress"):
+            atomic_write_json(progress_path, progress)
         self.logger.info("Progress saved.")
 
-    def process_pdf(self, guid_dir: Path, pdf_path: Path):
+    def _progress_tracker(self, guid_dir: Path, pdf_path: Path) -> ProgressTracker:
+        try:
+            pages_total = get_page_count(pdf_path)
+        except Exception as e:
+            self.logger.warning(f"Could not read page count of {pdf_path}: {e}", guid_dir.name)
+            pages_total = None
+        return ProgressTracker(lambda progress: self.save_progress(guid_dir, progress), pages_total,
+                               PROGRESS_WRITE_INTERVAL_SECONDS, read_seconds_per_page(self.storage_root))
+
+    def _convert_chunked(self, guid_dir: Path, pdf_path: Path, md_path: Path, image_dir_path: Path, progress: Dict[str, Any],
+                         tracker: ProgressTracker, book_id: str) -> dict:
+        """Run a chunked conversion, checkpointing each finished chunk in the progress file."""
+        checkpoint = progress.get("chunks") or {}
+        completed: set[int] = set()
+        if checkpoint.get("size") == CHUNK_PAGES and checkpoint.get("pdf") == pdf_path.name:
+            completed = set(checkpoint.get("completed", []))
+            self.logger.info(f"Resuming chunked conversion with {len(completed)} completed chunks", book_id)
+        state = {"pdf": pdf_path.name, "size": CHUNK_PAGES, "total": checkpoint.get("total"), "completed": sorted(completed)}
+        tracker.update(step="converting", chunks=state)
+
+        def on_chunk_complete(index: int, total: int):
+            completed.add(index)
+            state["total"] = total
+            state["completed"] = sorted(completed)
+            # The checkpoint is always written, whatever the progress throttling
+            tracker.update(chunks=state)
+
+        return self.converter.convert_pdf_to_markdown_chunked(
+            str(pdf_path), str(md_path), image_dir_path, guid_dir / CHUNKS_DIRNAME, CHUNK_PAGES,
+            completed, on_chunk_complete, book_id)
+
+    def process_pdf(self, guid_dir: Path, pdf_path: Path, owner: Optional[Dict[str, Any]] = None):
+        """Convert one book. owner (node, pid, lease generation of the claim) is recorded in the progress file."""
         book_id = guid_dir.name
         self.logger.info(f"Starting process_pdf for {pdf_path}", book_id)
         progress = self.load_progress(guid_dir)
         md_path = guid_dir / f"{pdf_path.stem}.md"
         if progress.get("status") == "completed" and md_path.exists():
             self.logger.info(f"Skipping {pdf_path}, already completed.", book_id)
+            self.index.record(book_id, "completed", pdf_path.name, signature=pdf_signature(pdf_path))
             return
         try:
             self.logger.info(f"Processing {pdf_path}", book_id)
-            self.save_progress(guid_dir, {"status": "processing", "step": "converting"})
             image_dir_path = guid_dir / "images"
-            conversion_metadata = self.converter.convert_pdf_to_markdown(str(pdf_path), str(md_path), image_dir_path, book_id)
-            self.save_progress(guid_dir, {"status": "processing", "step": "writing_metadata"})
+            tracker = self._progress_tracker(guid_dir, pdf_path)
+            tracker.state.update(carried_retry_state(progress))
+            if owner is not None:
+                tracker.state["owner"] = owner
+            self.converter.progress = tracker
+            try:
+                with tracker.heartbeat(PROGRESS_HEARTBEAT_SECONDS):
+                    if CHUNK_PAGES > 0:
+                        conversion_metadata = self._convert_chunked(guid_dir, pdf_path, md_path, image_dir_path, progress, tracker, book_id)
+                    else:
+                        tracker.update(step="converting")
+                        conversion_metadata = self.converter.convert_pdf_to_markdown(str(pdf_path), str(md_path), image_dir_path, book_id)
+            finally:
+                self.converter.progress = None
+            tracker.update(step="writing_metadata")
             # Read existing bookmetadata.json if it exists, otherwise create new
-            meta_path = guid_dir / "bookmetadata.json"
             existing_metadata = {}
-            if meta_path.exists():
-                try:
-                    with open(meta_path, 'r', encoding='utf-8') as f:
-                        existing_metadata = json.load(f)
-                    self.logger.info(f"Read existing bookmetadata.json for {guid_dir.name}", book_id)
-                except Exception as e:
-                    self.logger.warning(f"Could not read existing bookmetadata.json: {e}", book_id)
-            # Merge conversion metadata with existing metadata
-            merged_metadata = {**existing_metadata, **conversion_metadata}
-            # Write merged metadata back to file
-            with open(meta_path, 'w', encoding='utf-8') as f:
-                json.dump(merged_metadata, f, indent=2)
-            self.logger.info(f"Merged metadata written to {meta_path}", book_id)
-            self.save_progress(guid_dir, {"status": "completed"})
+            try:
+                existing_metadata = read_book_metadata(guid_dir)
+                if existing_metadata:
+                    self.logger.info(f"Read existing {METADATA_FILENAME} for {guid_dir.name}", book_id)
+            except Exception as e:
+                self.logger.warning(f"Could not read existing {METADATA_FILENAME}: {e}", book_id)
+            # Marker's per-page metadata goes to the sidecar; bookmetadata.json keeps a summary of it
+            marker_metadata = conversion_metadata.pop('marker_metadata', {})
+            existing_metadata.pop('marker_metadata', None)
+            merged_metadata = {**existing_metadata, **conversion_metadata,
+                               'marker_summary': summarize_marker_metadata(marker_metadata),
+                               'marker_metadata_file': MARKER_METADATA_FILENAME}
+            with stage("write_metadata"):
+                write_marker_metadata(guid_dir, marker_metadata)
+                write_book_metadata(guid_dir, merged_metadata)
+            self.logger.info(f"Merged metadata written to {guid_dir / METADATA_FILENAME}", book_id)
+            if RESULT_ARCHIVE:
+                tracker.update(step="building_archive")
+                with stage("build_archive"):
+                    zip_path = build_result_archive(guid_dir, md_path)
+                self.logger.info(f"Result archive written to {zip_path}", book_id)
+            tracker.stage = "completed"
+            self.save_progress(guid_dir, {"status": "completed", "progress": tracker.snapshot(),
+                                          **({"owner": owner} if owner is not None else {})})
+            self.index.record(book_id, "completed", pdf_path.name, signature=pdf_signature(pdf_path))
+            shutil.rmtree(guid_dir / CHUNKS_DIRNAME, ignore_errors=True)
             self.logger.info(f"Completed {pdf_path}", book_id)
         except Exception as e:
             self.logger.error_with_error(f"Error processing {pdf_path}: {e}", e, book_id)
-            self.save_progress(guid_dir, {"status": "failed", "error": str(e)})
+            failed_progress = {"status": "failed", "error": str(e), **carried_retry_state(progress)}
+            if owner is not None:
+                failed_progress["owner"] = owner
+            # Keep the chunk checkpoint so the retry resumes instead of starting over
+            chunks = self.load_progress(guid_dir).get("chunks")
+            if chunks:
+                failed_progress["chunks"] = chunks
+            self.save_progress(guid_dir, failed_progress)
+            # Skipped by scans until the PDF is replaced
+            self.index.record(book_id, "failed", pdf_path.name, str(e), current_signature(pdf_path))
         self.logger.info(f"Exiting process_pdf for {pdf_path}", book_id)
\ No newline at end of file
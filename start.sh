@@ -1,7 +1,10 @@
 #!/bin/bash
 set -e
 
-pip install --upgrade pip
-pip install -r requirements.txt
+# Dependencies are installed at image build time; skip the reinstall on every container start
+if [ "${SKIP_PIP_INSTALL:-0}" != "1" ]; then
+    pip install --upgrade pip
+    pip install -r requirements.txt
+fi
 
 python main.py 
\ No newline at end of file
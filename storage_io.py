@@ -0,0 +1,29 @@
+"""
+Crash-safe file writes for files shared through the storage directory.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Write data to a temporary file next to path and rename it into place."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_text(path: Path, text: str):
+    """Write text to a temporary file next to path and rename it into place."""
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def atomic_write_json(path: Path, data: Any, indent: int | None = 2):
+    """Serialize data as JSON and write it atomically."""
+    atomic_write_text(path, json.dumps(data, indent=indent))
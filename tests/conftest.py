@@ -0,0 +1,14 @@
+"""
+Shared setup of the unit tests. The service modules live in the repository root and the logger
+writes to STORAGE_ROOT, so both are set up before any of them is imported.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="pdf2markdown-tests-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,69 @@
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from werkzeug import formparser
+
+import api
+import main
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "STORAGE_ROOT", tmp_path)
+    app = Flask(__name__)
+    app.register_blueprint(api.api)
+    return app.test_client()
+
+
+def test_job_json_is_written_before_the_pdf_appears(client, tmp_path, monkeypatch):
+    renamed = []
+
+    def replace(source, target):
+        # The worker may pick the book up right after the PDF is renamed into place
+        if str(target).endswith(".pdf"):
+            renamed.append(json.loads((Path(target).parent / "job.json").read_text()))
+        real_replace(source, target)
+
+    real_replace = os.replace
+    monkeypatch.setattr(os, "replace", replace)
+    response = client.post("/convert?priority=high", data=b"%PDF-1.4 body", content_type="application/pdf")
+    assert response.status_code == 202
+    job_dir = tmp_path / response.get_json()["job_id"]
+    assert renamed and renamed[0]["priority"] == "high"
+    assert (job_dir / "originalbook.pdf").read_bytes() == b"%PDF-1.4 body"
+    assert sorted(path.name for path in job_dir.iterdir()) == ["job.json", "originalbook.pdf"]
+
+
+def test_rejected_uploads_leave_nothing_behind(client, tmp_path, monkeypatch):
+    assert client.post("/convert", data=b"", content_type="application/pdf").status_code == 400
+    monkeypatch.setattr(api, "MAX_UPLOAD_BYTES", 4)
+    assert client.post("/convert", data=b"%PDF-1.4", content_type="application/pdf").status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_multipart_upload_is_written_straight_to_the_job(client, tmp_path, monkeypatch):
+    def spool(*args, **kwargs):
+        raise AssertionError("the upload was spooled to a temporary file")
+
+    monkeypatch.setattr(formparser, "default_stream_factory", spool)
+    body = b"%PDF-1.4 " + b"x" * 300_000
+    response = client.post("/convert", data={"file": (io.BytesIO(body), "book.pdf"), "priority": "low"},
+                           content_type="multipart/form-data")
+    assert response.status_code == 202
+    job_dir = tmp_path / response.get_json()["job_id"]
+    assert (job_dir / "originalbook.pdf").read_bytes() == body
+    meta = json.loads((job_dir / "job.json").read_text())
+    assert meta["priority"] == "low" and meta["sha256"] == hashlib.sha256(body).hexdigest() == response.get_json()["sha256"]
+
+
+def test_multipart_without_a_file(client, tmp_path):
+    response = client.post("/convert", data={"priority": "low"}, content_type="multipart/form-data")
+    assert response.status_code == 400
+    response = client.post("/convert", data={"file": (io.BytesIO(b""), "")}, content_type="multipart/form-data")
+    assert response.get_json() == {"error": "No selected file"}
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import pytest
+
+import cgroup_limits
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    """A fake /sys/fs/cgroup and /proc/self/cgroup; returns a function writing /proc/self/cgroup."""
+    root = tmp_path / "cgroup"
+    root.mkdir()
+    proc_cgroup = tmp_path / "proc-self-cgroup"
+    proc_cgroup.write_text("0::/\n")
+    read = cgroup_limits._read
+    monkeypatch.setattr(cgroup_limits, "CGROUP_ROOT", root)
+    monkeypatch.setattr(cgroup_limits, "_read", lambda path: read(proc_cgroup if path == Path("/proc/self/cgroup") else path))
+    return root, proc_cgroup.write_text
+
+
+def test_unlimited_without_cgroup_files(cgroup):
+    assert cgroup_limits.cpu_limit() is None
+    assert cgroup_limits.memory_limit_bytes() is None
+
+
+def test_cgroup_v2_root(cgroup):
+    root, _ = cgroup
+    (root / "cpu.max").write_text("250000 100000\n")
+    (root / "memory.max").write_text("2147483648\n")
+    assert cgroup_limits.cpu_limit() == 2.5
+    assert cgroup_limits.memory_limit_bytes() == 2 * 1024 ** 3
+
+
+def test_cgroup_v2_max_is_unlimited(cgroup):
+    root, _ = cgroup
+    (root / "cpu.max").write_text("max 100000\n")
+    (root / "memory.max").write_text("max\n")
+    assert cgroup_limits.cpu_limit() is None
+    assert cgroup_limits.memory_limit_bytes() is None
+
+
+def test_cgroup_v2_own_directory_comes_first(cgroup):
+    root, write_proc = cgroup
+    write_proc("0::/system.slice/app.service\n")
+    own = root / "system.slice" / "app.service"
+    own.mkdir(parents=True)
+    (own / "cpu.max").write_text("50000 100000\n")
+    (root / "cpu.max").write_text("max 100000\n")
+    assert cgroup_limits.cpu_limit() == 0.5
+
+
+def test_cgroup_v1(cgroup):
+    root, write_proc = cgroup
+    write_proc("4:memory:/docker/abc\n3:cpu,cpuacct:/docker/abc\n")
+    cpu = root / "cpu" / "docker" / "abc"
+    memory = root / "memory" / "docker" / "abc"
+    cpu.mkdir(parents=True)
+    memory.mkdir(parents=True)
+    (cpu / "cpu.cfs_quota_us").write_text("150000\n")
+    (cpu / "cpu.cfs_period_us").write_text("100000\n")
+    (memory / "memory.limit_in_bytes").write_text("1073741824\n")
+    assert cgroup_limits.cpu_limit() == 1.5
+    assert cgroup_limits.memory_limit_bytes() == 1024 ** 3
+
+
+def test_cgroup_v1_unlimited(cgroup):
+    root, _ = cgroup
+    (root / "cpu").mkdir()
+    (root / "memory").mkdir()
+    (root / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (root / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (root / "memory" / "memory.limit_in_bytes").write_text("9223372036854771712\n")
+    assert cgroup_limits.cpu_limit() is None
+    assert cgroup_limits.memory_limit_bytes() is None
+
+
+def test_effective_cpu_count_rounds_the_quota_up(cgroup, monkeypatch):
+    root, _ = cgroup
+    (root / "cpu.max").write_text("150000 100000\n")
+    monkeypatch.setattr(cgroup_limits.os, "sched_getaffinity", lambda pid: set(range(8)))
+    assert cgroup_limits.effective_cpu_count() == 2
+    (root / "cpu.max").write_text("10000 100000\n")
+    assert cgroup_limits.effective_cpu_count() == 1
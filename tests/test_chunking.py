@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+import service
+from pdf_utils import split_page_ranges
+from service import MarkerPDFConverter
+
+
+def test_split_page_ranges_last_chunk_is_shorter():
+    assert split_page_ranges(7, 3) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_split_page_ranges_exact_multiple():
+    assert split_page_ranges(6, 3) == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_split_page_ranges_chunk_larger_than_the_book():
+    assert split_page_ranges(2, 10) == [[0, 1]]
+
+
+def test_split_page_ranges_without_chunking_and_empty_books():
+    assert split_page_ranges(3, 0) == [[0, 1, 2]]
+    assert split_page_ranges(0, 5) == []
+
+
+def test_merge_marker_metadata_keeps_page_order_and_sums_cache_counts():
+    first = {'table_of_contents': [{'title': 'A', 'page_id': 0}], 'page_stats': [{'page_id': 0}, {'page_id': 1}],
+             'page_cache': {'hits': 1, 'misses': 1}, 'debug_data_path': 'x'}
+    second = {'table_of_contents': None, 'page_stats': [{'page_id': 2}], 'page_cache': {'hits': 0, 'misses': 1}}
+    third = {'table_of_contents': [{'title': 'B', 'page_id': 3}], 'page_stats': [{'page_id': 3}]}
+    merged = {}
+    for metadata in (first, second, third):
+        merged = MarkerPDFConverter._merge_marker_metadata(merged, metadata)
+    assert [stats['page_id'] for stats in merged['page_stats']] == [0, 1, 2, 3]
+    assert merged['table_of_contents'] == [{'title': 'A', 'page_id': 0}, {'title': 'B', 'page_id': 3}]
+    assert merged['page_cache'] == {'hits': 1, 'misses': 2}
+    assert merged['debug_data_path'] == 'x'
+    # The first range's metadata is copied, not extended in place
+    assert len(first['page_stats']) == 2 and first['page_cache'] == {'hits': 1, 'misses': 1}
+
+
+class FakeConverter(MarkerPDFConverter):
+    """MarkerPDFConverter without models; each page range renders to a line naming its pages."""
+
+    def __init__(self):
+        self.extract_images = False
+        self.page_cache = None
+        self.progress = None
+        self.rendered = []
+
+    def _render(self, pdf_file, image_dir_path, page_range=None, book_id=None):
+        self.rendered.append(page_range)
+        text = f"pages {page_range[0]}-{page_range[-1]}"
+        return text, {'page_stats': [{'page_id': page} for page in page_range], 'table_of_contents': []}, len(page_range)
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.setattr(service, "get_page_count", lambda pdf_file: 7)
+    return tmp_path
+
+
+def convert(converter, book, completed):
+    reported = []
+    metadata = converter.convert_pdf_to_markdown_chunked(
+        str(book / "original.pdf"), str(book / "original.md"), book / "images", book / "chunks", 3,
+        completed, lambda index, total: reported.append((index, total)))
+    return metadata, reported
+
+
+def test_chunked_conversion_merges_chunks_in_page_order(book):
+    converter = FakeConverter()
+    metadata, reported = convert(converter, book, set())
+    assert (book / "original.md").read_text() == "pages 0-2\n\npages 3-5\n\npages 6-6"
+    assert reported == [(0, 3), (1, 3), (2, 3)]
+    assert metadata['total_pages'] == 7 and metadata['total_images'] == 7
+
+
+def test_resume_reconverts_a_half_written_chunk(book):
+    convert(FakeConverter(), book, set())
+    # Killed while writing chunk 1: its markdown exists but its metadata does not, and chunk 2 was never checkpointed
+    (book / "chunks" / "chunk_00001.json").unlink()
+    (book / "chunks" / "chunk_00002.md").write_text("stale")
+    resumed = FakeConverter()
+    metadata, reported = convert(resumed, book, {0, 1})
+    assert resumed.rendered == [[3, 4, 5], [6]]
+    assert reported == [(1, 3), (2, 3)]
+    assert (book / "original.md").read_text() == "pages 0-2\n\npages 3-5\n\npages 6-6"
+    assert [stats['page_id'] for stats in metadata['marker_metadata']['page_stats']] == list(range(7))
+    assert json.loads((book / "chunks" / "chunk_00001.json").read_text())['pages'] == [3, 5]
+
+
+def test_resume_skips_all_completed_chunks(book):
+    convert(FakeConverter(), book, set())
+    resumed = FakeConverter()
+    _, reported = convert(resumed, book, {0, 1, 2})
+    assert resumed.rendered == [] and reported == []
+    assert (book / "original.md").read_text() == "pages 0-2\n\npages 3-5\n\npages 6-6"
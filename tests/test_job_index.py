@@ -0,0 +1,138 @@
+import os
+
+import pytest
+
+from job_index import JobIndex, pdf_signature
+from service import PROGRESS_FILENAME, PDF2MarkdownWorker
+from storage_io import atomic_write_json
+
+
+@pytest.fixture
+def worker(tmp_path):
+    # find_jobs never touches the converter, so no models are loaded
+    return PDF2MarkdownWorker(tmp_path, converter=object())
+
+
+def make_book(storage_root, book_id, completed=False):
+    guid_dir = storage_root / book_id
+    guid_dir.mkdir()
+    pdf_path = guid_dir / "original.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    if completed:
+        (guid_dir / "original.md").write_text("# Book")
+        atomic_write_json(guid_dir / PROGRESS_FILENAME, {"status": "completed"})
+    return guid_dir, pdf_path
+
+
+def replace_pdf(pdf_path):
+    stat = pdf_path.stat()
+    pdf_path.write_bytes(b"%PDF-1.7 new")
+    os.utime(pdf_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_record_many_and_reload(tmp_path):
+    index = JobIndex(tmp_path)
+    index.record_many({"a": JobIndex.entry("completed", "original.pdf"), "b": JobIndex.entry("failed", "original.pdf", "boom")})
+    index.record_many({})
+    reloaded = JobIndex(tmp_path)
+    assert reloaded.is_completed("a") and not reloaded.is_completed("b")
+    assert reloaded.get("b") == {"status": "failed", "pdf": "original.pdf", "error": "boom"}
+    assert reloaded.status_counts() == {"completed": 1, "failed": 1}
+    reloaded.forget("a")
+    index.refresh()
+    assert index.get("a") is None
+
+
+def test_pdf_replaced(tmp_path):
+    guid_dir, pdf_path = make_book(tmp_path, "book")
+    index = JobIndex(tmp_path)
+    index.record("book", "completed", pdf_path.name)
+    # Entries without a signature (written by older versions) are trusted
+    assert not index.pdf_replaced(guid_dir)
+    index.record("book", "completed", pdf_path.name, signature=pdf_signature(pdf_path))
+    assert not index.pdf_replaced(guid_dir)
+    replace_pdf(pdf_path)
+    assert index.pdf_replaced(guid_dir)
+    pdf_path.unlink()
+    assert not index.pdf_replaced(guid_dir)
+
+
+def test_scan_backfills_completed_books_once(tmp_path, worker):
+    make_book(tmp_path, "done", completed=True)
+    make_book(tmp_path, "new")
+    assert [guid_dir.name for guid_dir, _ in worker.find_jobs()] == ["new"]
+    assert JobIndex(tmp_path).is_completed("done")
+    # Indexed books are skipped without reading their progress file
+    (tmp_path / "done" / PROGRESS_FILENAME).write_text("not json")
+    assert [guid_dir.name for guid_dir, _ in worker.find_jobs()] == ["new"]
+
+
+def test_scan_converts_a_replaced_pdf_again(tmp_path, worker):
+    guid_dir, pdf_path = make_book(tmp_path, "book", completed=True)
+    assert list(worker.find_jobs()) == []
+    replace_pdf(pdf_path)
+    assert list(worker.find_jobs()) == [(guid_dir, pdf_path)]
+    assert JobIndex(tmp_path).get("book") is None
+    assert worker.load_progress(guid_dir) == {"status": "pending"}
+
+
+def test_discovery_events_find_a_new_pdf_in_a_completed_folder(tmp_path, worker):
+    guid_dir, _ = make_book(tmp_path, "book", completed=True)
+    assert list(worker.find_jobs()) == []
+    second = guid_dir / "original-2.pdf"
+    second.write_bytes(b"%PDF-1.4 second")
+    # A full scan trusts the index; the folder queued by the watcher is looked at
+    assert list(worker.find_jobs()) == []
+    assert list(worker.find_jobs([guid_dir])) == [(guid_dir, second)]
+
+
+def test_leased_books_are_skipped(tmp_path, worker):
+    from job_lease import JobLease
+    guid_dir, _ = make_book(tmp_path, "book")
+    lease = JobLease(guid_dir, node_id="other-node")
+    assert lease.acquire()
+    assert list(worker.find_jobs()) == []
+    lease.release()
+    assert [found for found, _ in worker.find_jobs()] == [guid_dir]
+
+
+def test_settled_failures(tmp_path):
+    guid_dir, pdf_path = make_book(tmp_path, "book")
+    index = JobIndex(tmp_path)
+    index.record("book", "failed", pdf_path.name, "boom")
+    # Without a signature a replaced PDF would go unnoticed, so the book is still scanned
+    assert not index.settled("book")
+    index.record("book", "failed", pdf_path.name, "boom", pdf_signature(pdf_path))
+    assert index.settled("book")
+    index.record("book", "failed", pdf_path.name, "killed", pdf_signature(pdf_path), "2030-01-01T00:00:00+00:00")
+    assert index.settled("book", now=1_800_000_000)
+    assert not index.settled("book", now=1_900_000_000)
+    assert not index.settled("unknown")
+
+
+def test_scan_skips_failed_books_until_the_pdf_is_replaced(tmp_path, worker):
+    guid_dir, pdf_path = make_book(tmp_path, "book")
+    atomic_write_json(guid_dir / PROGRESS_FILENAME, {"status": "failed", "error": "boom"})
+    worker.index.record("book", "failed", pdf_path.name, "boom", pdf_signature(pdf_path))
+    (guid_dir / PROGRESS_FILENAME).write_text("not json")
+    assert list(worker.find_jobs()) == []
+    replace_pdf(pdf_path)
+    assert list(worker.find_jobs()) == [(guid_dir, pdf_path)]
+    assert JobIndex(tmp_path).get("book") is None
+    assert worker.load_progress(guid_dir) == {"status": "pending"}
+
+
+def test_scan_backfills_killed_books_and_finds_them_when_the_retry_is_due(tmp_path, worker):
+    guid_dir, pdf_path = make_book(tmp_path, "book")
+    killed = {"status": "failed", "error": "Conversion killed: timeout", "killed": {"reason": "timeout"}, "attempts": 1,
+              "next_retry_at": "2100-01-01T00:00:00+00:00"}
+    atomic_write_json(guid_dir / PROGRESS_FILENAME, killed)
+    assert list(worker.find_jobs()) == []
+    entry = JobIndex(tmp_path).get("book")
+    assert entry["status"] == "failed" and entry["next_retry_at"] == killed["next_retry_at"]
+    # Skipped by the index from now on
+    (guid_dir / PROGRESS_FILENAME).write_text("not json")
+    assert list(worker.find_jobs()) == []
+    atomic_write_json(guid_dir / PROGRESS_FILENAME, {**killed, "next_retry_at": "2000-01-01T00:00:00+00:00"})
+    worker.index.record("book", "failed", pdf_path.name, killed["error"], pdf_signature(pdf_path), "2000-01-01T00:00:00+00:00")
+    assert list(worker.find_jobs()) == [(guid_dir, pdf_path)]
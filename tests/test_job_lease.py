@@ -0,0 +1,220 @@
+import functools
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+import job_lease
+import scheduler
+import worker_pool
+from job_lease import LEASE_PREFIX, UNREADABLE_LEASE_SECONDS, JobLease, active_lease, current_lease, lease_active
+from logger import get_logger
+from storage_io import atomic_write_json
+
+# Node of the race test that stops working on its first job while keeping its lease alive
+HANGING_NODE = "node-hanging"
+
+
+def test_only_one_claim_holds(tmp_path):
+    first, second = JobLease(tmp_path, "node-a", 60), JobLease(tmp_path, "node-b", 60)
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.holds() and first.generation == 1
+    assert active_lease(tmp_path, "node-b")["node"] == "node-a"
+
+
+def test_release_lets_the_next_generation_claim(tmp_path):
+    first, second = JobLease(tmp_path, "node-a", 60), JobLease(tmp_path, "node-b", 60)
+    assert first.acquire()
+    first.release()
+    assert active_lease(tmp_path, "node-b") is None
+    assert second.acquire() and second.generation == 2
+    assert not first.renew()
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    stalled, other = JobLease(tmp_path, "node-a", 0.2), JobLease(tmp_path, "node-b", 0.2)
+    assert stalled.acquire()
+    assert not other.acquire()
+    time.sleep(0.3)
+    assert other.acquire() and other.generation == 2
+    # The stalled owner finds out on its next heartbeat
+    assert not stalled.holds() and not stalled.renew()
+
+
+def test_lease_of_a_dead_process_on_the_same_node(tmp_path):
+    lease = {"node": "node-a", "pid": 2 ** 22 + 1, "expires_at": time.time() + 60}
+    assert not lease_active(lease, "node-a")
+    # Other nodes cannot see its processes and wait for the expiry
+    assert lease_active(lease, "node-b")
+
+
+def test_old_generations_are_pruned(tmp_path):
+    for _ in range(4):
+        lease = JobLease(tmp_path, "node-a", 60)
+        assert lease.acquire()
+        lease.release()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"{LEASE_PREFIX}3", f"{LEASE_PREFIX}4"]
+
+
+def test_stale_claim_backs_off(tmp_path, monkeypatch):
+    """A claimer that read an old generation and stalled must not hold a generation below the newest."""
+    atomic_write_json(tmp_path / f"{LEASE_PREFIX}2", {"released": True, "expires_at": 0})
+    atomic_write_json(tmp_path / f"{LEASE_PREFIX}5", {"node": "node-b", "pid": 1, "expires_at": time.time() + 60})
+    # The claimer's first look predates generations 3 to 5, so it creates generation 3
+    views = iter([(2, {"released": True, "expires_at": 0})])
+    monkeypatch.setattr(job_lease, "current_lease", lambda guid_dir, lease_seconds: next(views, None) or current_lease(guid_dir, lease_seconds))
+    lease = JobLease(tmp_path, "node-a", 60)
+    assert not lease.acquire()
+    assert lease.generation is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"{LEASE_PREFIX}2", f"{LEASE_PREFIX}5"]
+
+
+def test_unreadable_lease_blocks_only_briefly(tmp_path):
+    path = tmp_path / f"{LEASE_PREFIX}1"
+    path.touch()
+    generation, lease = current_lease(tmp_path, 120)
+    assert generation == 1
+    assert lease["expires_at"] == pytest.approx(path.stat().st_mtime + UNREADABLE_LEASE_SECONDS)
+    old = time.time() - UNREADABLE_LEASE_SECONDS - 1
+    os.utime(path, (old, old))
+    claim = JobLease(tmp_path, "node-a", 120)
+    assert claim.acquire() and claim.generation == 2
+
+
+def test_heartbeat_keeps_the_lease_and_reports_a_takeover(tmp_path):
+    lease = JobLease(tmp_path, "node-a", 0.4)
+    assert lease.acquire()
+    lost = []
+    lease.start_heartbeat(lambda: lost.append(True), interval=0.1)
+    time.sleep(0.6)
+    assert lease.holds() and not lost
+    # Taken over by another node, e.g. after a long storage stall
+    atomic_write_json(tmp_path / f"{LEASE_PREFIX}{lease.generation + 1}", {"node": "node-b", "pid": 1, "expires_at": time.time() + 60})
+    time.sleep(0.3)
+    assert lost == [True]
+    lease.release()
+
+
+class RaceWorker:
+    """
+    Stand-in for PDF2MarkdownWorker in the race: finds the unfinished jobs of a directory and "converts"
+    one by logging its start and end around a sleep. The hanging node never finishes its first job.
+    """
+
+    def __init__(self, books: Path, node_id: str, work_seconds: float, hang: bool):
+        self.books = books
+        self.node_id = node_id
+        self.work_seconds = work_seconds
+        self.hang = hang
+        self.logger = get_logger()
+        self.index = self
+
+    def find_jobs(self, guid_dirs=None):
+        return [(job, job / "book.pdf") for job in sorted(self.books.iterdir()) if not (job / "done").exists()]
+
+    def load_progress(self, guid_dir):
+        return {}
+
+    def is_completed(self, job_id):
+        return (self.books / job_id / "done").exists()
+
+    def _log(self, job: Path, event: str, owner: Dict[str, Any]):
+        with open(job / "claims.log", 'a') as f:
+            f.write(json.dumps({"node": self.node_id, "event": event, "at": time.time(), "lease": owner["lease"]}) + "\n")
+
+    def process_pdf(self, guid_dir: Path, pdf_path: Path, owner: Dict[str, Any]):
+        if (guid_dir / "done").exists():
+            # Finished by another node since it was queued here
+            return
+        self._log(guid_dir, "start", owner)
+        if self.hang:
+            # A node that stops working but keeps its lease alive until it is killed
+            time.sleep(3600)
+        time.sleep(self.work_seconds)
+        self._log(guid_dir, "end", owner)
+        atomic_write_json(guid_dir / "done", {"node": self.node_id})
+
+
+def _race_node(root: Path, node_id: str, lease_seconds: float, work_seconds: float, hang: bool):
+    """One node: the worker loop of worker_pool with its own node id, lease length and node-local running jobs."""
+    worker_pool.JobLease = functools.partial(JobLease, node_id=node_id, lease_seconds=lease_seconds)
+    scheduler.RUNNING_JOBS_DIR = root / "running" / node_id
+    worker = RaceWorker(root / "books", node_id, work_seconds, hang)
+    jobs = scheduler.Scheduler(root)
+    while worker.find_jobs():
+        worker_pool.run_available_jobs(worker, root, jobs)
+        time.sleep(0.05)
+
+
+def _check_claims(root: Path, killed_at: float) -> Tuple[List[str], int]:
+    """Problems found in the claim logs (overlapping owners, lost or repeated jobs), and the number of takeovers."""
+    problems = []
+    takeovers = 0
+    for job in sorted((root / "books").iterdir()):
+        events = [json.loads(line) for line in (job / "claims.log").read_text().splitlines()] if (job / "claims.log").exists() else []
+        owner: Optional[Dict[str, Any]] = None
+        completions = 0
+        for event in events:
+            if event["event"] == "start":
+                if owner is not None:
+                    # Only the hanging node leaves a job unfinished, and its lease holds until it is killed
+                    if owner["node"] != HANGING_NODE or event["at"] < killed_at:
+                        problems.append(f"{job.name}: {event['node']} claimed it while {owner['node']} still held it")
+                    takeovers += 1
+                owner = event
+            else:
+                if owner is None or owner["node"] != event["node"] or owner["lease"] != event["lease"]:
+                    problems.append(f"{job.name}: {event['node']} finished without holding the lease")
+                completions += 1
+                owner = None
+        if completions != 1:
+            problems.append(f"{job.name}: completed {completions} times")
+    return problems, takeovers
+
+
+@pytest.fixture
+def race_dir(tmp_path):
+    """LEASE_TEST_DIR runs the race on another directory, e.g. the shared mount; tmpfs otherwise."""
+    base = os.environ.get("LEASE_TEST_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else str(tmp_path))
+    root = Path(tempfile.mkdtemp(prefix="pdf2markdown-leases-", dir=base))
+    yield root
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def test_nodes_race_for_jobs(race_dir, nodes=4, jobs=12, lease_seconds=1.0, work_seconds=1.5):
+    """
+    Node processes (each with its own node id, running worker_pool.run_available_jobs) race for jobs that take longer than the lease, so only
+    heartbeats keep them. One node hangs on its first job and is killed, so its lease must expire and be
+    taken over. Every job must be completed exactly once, never by two owners at the same time.
+    """
+    books = race_dir / "books"
+    for index in range(jobs):
+        (books / f"job-{index:03d}").mkdir(parents=True)
+        (books / f"job-{index:03d}" / "book.pdf").write_bytes(b"%PDF-1.4")
+    context = multiprocessing.get_context("fork")
+    hanging = context.Process(target=_race_node, args=(race_dir, HANGING_NODE, lease_seconds, work_seconds, True))
+    hanging.start()
+    # Let the hanging node claim a job before the others start
+    while not any((job / "claims.log").exists() for job in books.iterdir()):
+        time.sleep(0.01)
+    processes = [context.Process(target=_race_node, args=(race_dir, f"node-{index}", lease_seconds, work_seconds, False))
+                 for index in range(nodes)]
+    for process in processes:
+        process.start()
+    time.sleep(lease_seconds)
+    hanging.kill()
+    killed_at = time.time()
+    hanging.join()
+    for process in processes:
+        process.join(timeout=120)
+    problems, takeovers = _check_claims(race_dir, killed_at)
+    problems += [f"{process.name} exited with code {process.exitcode} (lease lost)" for process in processes if process.exitcode != 0]
+    assert problems == []
+    assert takeovers >= 1, "the hanging node's job was not taken over"
@@ -0,0 +1,42 @@
+from job_retry import EXITED, MEMORY, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF_SECONDS, carried_retry_state, killed_progress, retry_blocked
+
+NOW = 1_700_000_000.0
+
+
+def test_unkilled_books_are_never_blocked():
+    assert retry_blocked({}) is None
+    assert retry_blocked({"status": "processing"}) is None
+    # Failed by a conversion error, not a kill
+    assert retry_blocked({"status": "failed", "error": "boom"}) is None
+
+
+def test_killed_book_waits_for_its_backoff():
+    killed = killed_progress({}, MEMORY, "over 100 MB", now=NOW)
+    assert killed["attempts"] == 1
+    assert retry_blocked(killed, now=NOW + JOB_RETRY_BACKOFF_SECONDS - 1).startswith("next retry at")
+    assert retry_blocked(killed, now=NOW + JOB_RETRY_BACKOFF_SECONDS + 1) is None
+
+
+def test_backoff_doubles_per_attempt():
+    first = killed_progress({}, EXITED, "exit code -9", now=NOW)
+    second = killed_progress(first, EXITED, "exit code -9", now=NOW)
+    assert second["attempts"] == 2
+    assert retry_blocked(second, now=NOW + JOB_RETRY_BACKOFF_SECONDS + 1) is not None
+    assert retry_blocked(second, now=NOW + 2 * JOB_RETRY_BACKOFF_SECONDS + 1) is None
+
+
+def test_gives_up_after_max_attempts():
+    progress = {}
+    for _ in range(JOB_MAX_ATTEMPTS):
+        progress = killed_progress(progress, MEMORY, "over 100 MB", now=NOW)
+    assert "next_retry_at" not in progress
+    assert retry_blocked(progress, now=NOW + 10 ** 9) == f"gave up after {JOB_MAX_ATTEMPTS} killed attempts"
+
+
+def test_checkpoint_owner_and_attempts_are_carried():
+    progress = {"status": "processing", "chunks": {"completed": [0, 1]}, "owner": {"node": "a"}, "progress": {"pages_done": 3}}
+    killed = killed_progress(progress, MEMORY, "over 100 MB", now=NOW)
+    assert killed["chunks"] == progress["chunks"] and killed["owner"] == progress["owner"]
+    assert "progress" not in killed
+    assert carried_retry_state(killed) == {"attempts": 1}
+    assert carried_retry_state({"status": "pending"}) == {}
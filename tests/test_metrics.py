@@ -0,0 +1,62 @@
+import multiprocessing
+import threading
+import time
+
+from metrics import REGISTRY, MetricsCollector, Registry
+
+
+def _reset_registry():
+    REGISTRY.reset()
+
+
+def test_fork_while_the_registry_lock_is_held():
+    """A child forked while another thread snapshots the registry must not inherit the lock held."""
+    held = threading.Event()
+
+    def scrape():
+        with REGISTRY.lock:
+            held.set()
+            time.sleep(0.3)
+
+    thread = threading.Thread(target=scrape)
+    thread.start()
+    held.wait()
+    child = multiprocessing.get_context("fork").Process(target=_reset_registry)
+    child.start()
+    child.join(timeout=5)
+    thread.join()
+    alive = child.is_alive()
+    if alive:
+        child.kill()
+    assert not alive and child.exitcode == 0
+
+
+def test_metrics_follow_the_registry_lock():
+    registry = Registry()
+    counter = registry.counter("test_total", "Test counter.")
+    counter.inc(2, result="ok")
+    registry._after_fork_in_child()
+    assert counter._lock is registry.lock
+    counter.inc(result="ok")
+    assert registry.snapshot() == {"test_total": [[[["result", "ok"]], 3.0]]}
+
+
+def _fork_again(queue):
+    # A worker child forks page-range processes in turn
+    grandchild = multiprocessing.get_context("fork").Process(target=_reset_registry)
+    grandchild.start()
+    grandchild.join(timeout=5)
+    queue.put(grandchild.exitcode)
+
+
+def test_forked_child_can_fork_again():
+    collector = MetricsCollector()
+    queue = multiprocessing.get_context("fork").Queue()
+    child = multiprocessing.get_context("fork").Process(target=_fork_again, args=(queue,))
+    child.start()
+    child.join(timeout=10)
+    alive = child.is_alive()
+    if alive:
+        child.kill()
+    assert not alive and queue.get(timeout=1) == 0
+    assert collector.render()
@@ -0,0 +1,99 @@
+import pytest
+
+import page_cache
+from page_cache import CachedPage, PageCache
+
+
+@pytest.fixture
+def fingerprints(monkeypatch):
+    """Fake page fingerprints (no PDF rendering); records which pages were fingerprinted."""
+    calls = []
+
+    def get_page_fingerprints(pdf_path, pages):
+        calls.append(list(pages))
+        return {page: f"{pdf_path.read_bytes().decode()}-{page}" for page in pages}
+
+    monkeypatch.setattr(page_cache, "get_page_fingerprints", get_page_fingerprints)
+    return calls
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "book.pdf"
+    path.write_bytes(b"book")
+    return path
+
+
+def test_keys_include_the_pipeline_version(tmp_path, pdf, fingerprints):
+    cache = PageCache(tmp_path / "cache", 1024 * 1024)
+    keys = cache.page_keys(pdf, [0, 1])
+    assert keys == {0: f"{cache.version}:book-0", 1: f"{cache.version}:book-1"}
+
+
+def test_known_file_skips_fingerprinting(tmp_path, pdf, fingerprints):
+    cache = PageCache(tmp_path / "cache", 1024 * 1024)
+    first = cache.page_keys(pdf, [0, 1])
+    # Same content under another name and a new cache instance: found by the file hash
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(pdf.read_bytes())
+    assert PageCache(tmp_path / "cache", 1024 * 1024).page_keys(copy, [0, 1, 2]) == {**first, 2: f"{cache.version}:book-2"}
+    assert fingerprints == [[0, 1], [2]]
+
+
+def test_keys_of_another_pipeline_version_are_recomputed(tmp_path, pdf, fingerprints):
+    old = PageCache(tmp_path / "cache", 1024 * 1024)
+    old.version = "marker-pdf=0.1;surya-ocr=0.1;format=0"
+    old.page_keys(pdf, [0])
+    cache = PageCache(tmp_path / "cache", 1024 * 1024)
+    assert cache.page_keys(pdf, [0]) == {0: f"{cache.version}:book-0"}
+    assert fingerprints == [[0], [0]]
+    # The stale key was replaced, so the next lookup is served from file_pages again
+    cache.page_keys(pdf, [0])
+    assert len(fingerprints) == 2
+
+
+def test_page_numbers_are_placeholders(tmp_path):
+    cache = PageCache(tmp_path / "cache", 1024 * 1024)
+    page = CachedPage.from_page(3, "![](_page_3_Picture_1.png) text", {"page_id": 3}, [{"title": "A", "page_id": 3}],
+                                {"_page_3_Picture_1.png": b"png"})
+    cache.put("key", page)
+    restored = cache.get("key").for_page(7)
+    assert restored.markdown == "![](_page_7_Picture_1.png) text"
+    assert restored.page_stats == {"page_id": 7}
+    assert restored.table_of_contents == [{"title": "A", "page_id": 7}]
+    assert restored.images == {"_page_7_Picture_1.png": b"png"}
+
+
+def test_eviction_drops_file_lookups_of_evicted_pages(tmp_path, pdf, fingerprints):
+    cache = PageCache(tmp_path / "cache", 3000)
+    keys = cache.page_keys(pdf, [0, 1, 2])
+    for page in range(3):
+        cache.put(keys[page], CachedPage(markdown="x" * 1000, page_stats={}))
+    conn = cache._connection()
+    remaining = {key for key, in conn.execute("SELECT key FROM pages")}
+    assert keys[0] not in remaining and keys[2] in remaining
+    assert {key for key, in conn.execute("SELECT key FROM file_pages")} == remaining
+
+
+def test_running_total_follows_puts_replacements_and_evictions(tmp_path):
+    cache = PageCache(tmp_path / "cache", 5_000)
+    conn = cache._connection()
+    statements = []
+    for index in range(30):
+        conn.set_trace_callback(statements.append)
+        cache.put(f"key-{index % 12}", CachedPage(markdown="x" * (500 + index), page_stats={}, images={"a.png": b"p" * index}))
+        conn.set_trace_callback(None)
+        assert cache.total_size() == conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0] <= 5_000
+    # Neither put nor the eviction sums the table
+    assert not any("SUM(" in statement for statement in statements)
+    assert any(statement.startswith("DELETE FROM pages") for statement in statements)
+
+
+def test_running_total_of_an_existing_cache(tmp_path):
+    cache = PageCache(tmp_path / "cache", 10_000)
+    cache.put("a", CachedPage(markdown="x" * 100, page_stats={}))
+    conn = cache._connection()
+    # A cache written before the total was kept
+    conn.executescript("DROP TABLE cache_meta")
+    reopened = PageCache(tmp_path / "cache", 10_000)
+    assert reopened.total_size() == 102 + len("[]")
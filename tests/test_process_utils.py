@@ -0,0 +1,22 @@
+import os
+
+import process_utils
+from process_utils import pid_alive, rss_bytes
+
+
+def test_pid_alive(monkeypatch):
+    assert pid_alive(os.getpid())
+    assert not pid_alive(2 ** 22 + 1)
+
+    def kill(pid, signal):
+        raise PermissionError(1, "Operation not permitted")
+
+    # A process of another user exists; only a missing one is dead
+    monkeypatch.setattr(process_utils.os, "kill", kill)
+    assert pid_alive(1)
+
+
+def test_rss_bytes():
+    assert rss_bytes() > 0
+    assert rss_bytes(os.getpid()) > 0
+    assert rss_bytes(2 ** 22 + 1) == 0
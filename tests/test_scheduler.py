@@ -0,0 +1,103 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import scheduler
+import worker_pool
+from job_lease import LEASE_PREFIX
+from scheduler import RunningJobs, ScheduledJob, Scheduler
+from storage_io import atomic_write_json
+
+
+class FakeWorker:
+    """Worker that finds the books of one directory and converts them by writing a marker file."""
+
+    def __init__(self, books: Path):
+        self.books = books
+        self.logger = scheduler.get_logger()
+        self.converted = []
+        self.index = self
+
+    def find_jobs(self, guid_dirs=None):
+        return [(guid_dir, guid_dir / "book.pdf") for guid_dir in sorted(self.books.iterdir())
+                if not (guid_dir / "done").exists()]
+
+    def load_progress(self, guid_dir):
+        return {}
+
+    def process_pdf(self, guid_dir, pdf_path, owner=None):
+        self.converted.append(guid_dir.name)
+        (guid_dir / "done").touch()
+
+    def is_completed(self, job_id):
+        return (self.books / job_id / "done").exists()
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "RUNNING_JOBS_DIR", tmp_path / "running")
+    (tmp_path / "books").mkdir()
+    return tmp_path
+
+
+def make_book(storage: Path, name: str, priority=None) -> Path:
+    guid_dir = storage / "books" / name
+    guid_dir.mkdir()
+    (guid_dir / "book.pdf").write_bytes(b"%PDF-1.4")
+    if priority is not None:
+        atomic_write_json(guid_dir / "job.json", {"priority": priority})
+    return guid_dir
+
+
+def test_priority_is_read_again_once_job_json_appears(storage):
+    jobs = Scheduler(storage)
+    guid_dir = make_book(storage, "book-a")
+    jobs.add(guid_dir, guid_dir / "book.pdf")
+    assert jobs.pending["book-a"].priority == scheduler.DEFAULT_PRIORITY
+    atomic_write_json(guid_dir / "job.json", {"priority": "high"})
+    jobs.add(guid_dir, guid_dir / "book.pdf")
+    assert jobs.pending["book-a"].priority == "high"
+
+
+def test_budget_is_checked_before_the_lease(storage, monkeypatch):
+    """A job waiting for the memory budget must not claim (and so churn lease generations of) its book."""
+    monkeypatch.setattr(scheduler, "MEMORY_BUDGET_MB", 1)
+    jobs = Scheduler(storage)
+    guid_dir = make_book(storage, "book-a")
+    other = ScheduledJob(storage / "books" / "other", Path("other.pdf"), 10, "normal", 0)
+    jobs.running.try_admit(other, 0, 60)
+    worker = FakeWorker(storage / "books")
+    for _ in range(3):
+        worker_pool.run_available_jobs(worker, storage, jobs)
+    assert worker.converted == []
+    assert not any(path.name.startswith(LEASE_PREFIX) for path in guid_dir.iterdir())
+    jobs.running.release(other)
+    worker_pool.run_available_jobs(worker, storage, jobs)
+    assert worker.converted == ["book-a"]
+    assert [entry["job_id"] for entry in jobs.running.entries()] == []
+
+
+def test_claimed_job_gives_back_its_reservation(storage, monkeypatch):
+    guid_dir = make_book(storage, "book-a")
+    atomic_write_json(guid_dir / f"{LEASE_PREFIX}1", {"node": "node-b", "pid": 1, "expires_at": 2 ** 40})
+    jobs = Scheduler(storage)
+    worker = FakeWorker(storage / "books")
+    worker_pool.run_available_jobs(worker, storage, jobs)
+    assert worker.converted == []
+    assert jobs.running.entries() == [] and jobs.pending == {}
+
+
+def test_running_jobs_of_other_users_are_kept(storage, monkeypatch):
+    running = RunningJobs(storage / "running")
+    job = ScheduledJob(storage / "books" / "book-a", Path("book.pdf"), 10, "normal", 0)
+    assert running.try_admit(job, 0, 60)
+
+    def kill(pid, signal):
+        raise PermissionError(1, "Operation not permitted")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "kill", kill)
+        assert [entry["job_id"] for entry in running.entries()] == ["book-a"]
+    atomic_write_json(storage / "running" / "book-b.json", {"job_id": "book-b", "pid": 2 ** 22 + 1, "memory_mb": 1})
+    assert [entry["job_id"] for entry in running.entries()] == ["book-a"]
@@ -0,0 +1,114 @@
+"""
+Text-layer fast path for born-digital pages.
+classify_pages() inspects each page with pypdfium2 (no rendering) and decides whether its embedded
+text layer can be trusted. Those pages are extracted with pdftext, which Marker itself uses for text
+extraction, and formatted as plain paragraphs. Scanned, garbled, image or vector-heavy pages
+(figures, ruled tables, diagrams) still go through the Marker models.
+"""
+
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, List
+
+# page_stats["text_extraction_method"] of pages converted by the fast path
+FAST_PATH_METHOD = "text_layer"
+# Route of a page: FAST_PATH_METHOD, or why the page needs the models
+LOW_TEXT = "low_text"
+GARBLED = "garbled"
+IMAGES = "images"
+VECTOR_GRAPHICS = "vector_graphics"
+
+MAX_GARBAGE_RATIO = 0.02
+SENTENCE_END = ('.', '!', '?', ':', '"', '”', ')')
+
+
+def _garbage_chars(text: str) -> int:
+    """Characters a broken font mapping produces: replacement, private-use, control and (cid:N) codes."""
+    garbage = 5 * text.count("(cid:")
+    for char in text:
+        if char == '\ufffd':
+            garbage += 1
+        elif char not in '\r\n\t' and unicodedata.category(char) in ('Co', 'Cs', 'Cc'):
+            garbage += 1
+    return garbage
+
+
+def classify_pages(pdf_path: Path, pages: List[int], min_chars: int, max_image_coverage: float, max_paths: int) -> Dict[int, str]:
+    """Route each page: FAST_PATH_METHOD when its text layer is trustworthy, otherwise the reason it is not."""
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+    routes = {}
+    doc = pdfium.PdfDocument(str(pdf_path))
+    try:
+        for page_index in pages:
+            page = doc[page_index]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_bounded()
+                width, height = page.get_size()
+                image_area = 0.0
+                paths = 0
+                for obj in page.get_objects(max_depth=2):
+                    if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+                        left, bottom, right, top = obj.get_pos()
+                        image_area += max(0.0, right - left) * max(0.0, top - bottom)
+                    elif obj.type == pdfium_c.FPDF_PAGEOBJ_PATH:
+                        paths += 1
+                visible = len(text) - sum(text.count(char) for char in ' \r\n\t')
+                if visible < min_chars:
+                    routes[page_index] = LOW_TEXT
+                elif _garbage_chars(text) > MAX_GARBAGE_RATIO * visible:
+                    routes[page_index] = GARBLED
+                elif width * height and image_area / (width * height) > max_image_coverage:
+                    routes[page_index] = IMAGES
+                elif paths > max_paths:
+                    routes[page_index] = VECTOR_GRAPHICS
+                else:
+                    routes[page_index] = FAST_PATH_METHOD
+            finally:
+                textpage.close()
+                page.close()
+    finally:
+        doc.close()
+    return routes
+
+
+def _markdown_paragraphs(text: str) -> str:
+    """
+    Join the extracted lines into paragraphs: a blank line, or a short line ending a sentence, closes one.
+    Short lines that start a paragraph without ending a sentence (titles) stand alone.
+    """
+    lines = [line.strip() for line in text.replace('\r\n', '\n').split('\n')]
+    widths = sorted(len(line) for line in lines if line)
+    typical = widths[int(len(widths) * 0.8)] if widths else 0
+    paragraphs: List[str] = []
+    current = ""
+    for line in lines:
+        if not line:
+            if current:
+                paragraphs.append(current)
+                current = ""
+            continue
+        if not current and len(line) < 0.5 * typical and not line.endswith(SENTENCE_END):
+            # A short line on its own, such as a title, stays a paragraph of its own
+            paragraphs.append(line)
+            continue
+        if current.endswith('-') and line[:1].islower():
+            current = current[:-1] + line
+        else:
+            current = f"{current} {line}" if current else line
+        if line.endswith(SENTENCE_END) and len(line) < 0.8 * typical:
+            paragraphs.append(current)
+            current = ""
+    if current:
+        paragraphs.append(current)
+    # Keep extracted text from being read as markdown headings, lists or quotes
+    return "\n\n".join(re.sub(r'^([#>*+-]|\d+[.)])(\s)', r'\\\1\2', paragraph) for paragraph in paragraphs)
+
+
+def extract_text_pages(pdf_path: Path, pages: List[int]) -> Dict[int, str]:
+    """Markdown of each page's text layer, in reading order."""
+    from pdftext.extraction import paginated_plain_text_output
+    texts = paginated_plain_text_output(str(pdf_path), sort=True, hyphens=False, page_range=pages)
+    return {page: _markdown_paragraphs(text) for page, text in zip(pages, texts)}
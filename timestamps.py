@@ -0,0 +1,9 @@
+"""
+Timestamps as written to the progress, queue and index files: ISO 8601 in UTC.
+"""
+
+from datetime import datetime, timezone
+
+
+def isoformat_utc(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
@@ -0,0 +1,212 @@
+"""
+CPU thread and batch-size tuning for the Marker models.
+The defaults of torch and Marker assume the whole host. Here the CPUs and memory the container
+actually gets (cgroup limits) are divided between the worker processes: torch runs one intra-op
+thread per CPU of its share and the model batch sizes follow the memory of that share.
+
+A calibration run measures a few settings around those defaults on sample books and stores the
+fastest one that stays within memory in TUNING_PROFILE_PATH; it is reused at startup while the CPUs,
+memory, worker count and Marker version are unchanged.
+
+    python tuning.py show
+    python tuning.py calibrate [--pdf sample.pdf ...] [--output profile.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from importlib import metadata as importlib_metadata
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from cgroup_limits import effective_cpu_count, effective_memory_bytes
+from logger import get_logger
+from storage_io import atomic_write_json
+from config import TUNING, TUNING_PROFILE_PATH, WORKER_PROCESSES
+
+PROFILE_FORMAT_VERSION = 1
+# Marker batch sizes by the memory (MB) available to one worker process
+BATCH_SIZE_TIERS = (
+    (0, {"layout_batch_size": 1, "detection_batch_size": 1, "recognition_batch_size": 8,
+         "table_rec_batch_size": 1, "ocr_error_batch_size": 1, "equation_batch_size": 1}),
+    (4096, {"layout_batch_size": 2, "detection_batch_size": 2, "recognition_batch_size": 16,
+            "table_rec_batch_size": 2, "ocr_error_batch_size": 2, "equation_batch_size": 2}),
+    (8192, {"layout_batch_size": 4, "detection_batch_size": 4, "recognition_batch_size": 32,
+            "table_rec_batch_size": 4, "ocr_error_batch_size": 4, "equation_batch_size": 4}),
+    (16384, {"layout_batch_size": 8, "detection_batch_size": 8, "recognition_batch_size": 64,
+             "table_rec_batch_size": 8, "ocr_error_batch_size": 8, "equation_batch_size": 8}),
+)
+
+
+@dataclass
+class TuningProfile:
+    torch_threads: int
+    batch_sizes: Dict[str, int]
+    pdftext_workers: int
+    source: str = "auto"
+    measured: Dict[str, Any] = field(default_factory=dict)
+
+    def converter_config(self) -> Dict[str, Any]:
+        """PdfConverter config entries for these settings."""
+        return {**self.batch_sizes, "pdftext_workers": self.pdftext_workers}
+
+
+def host_fingerprint() -> Dict[str, Any]:
+    """What a calibrated profile depends on; a profile is only reused when this is unchanged."""
+    try:
+        marker_version = importlib_metadata.version("marker-pdf")
+    except importlib_metadata.PackageNotFoundError:
+        marker_version = None
+    return {
+        "cpus": effective_cpu_count(),
+        "memory_mb": effective_memory_bytes() // (1024 * 1024),
+        "worker_processes": max(1, WORKER_PROCESSES),
+        "marker-pdf": marker_version
+    }
+
+
+def _tier_index(memory_mb_per_worker: int) -> int:
+    return max(index for index, (minimum, _) in enumerate(BATCH_SIZE_TIERS) if memory_mb_per_worker >= minimum)
+
+
+def auto_profile() -> TuningProfile:
+    """Settings derived from the cgroup limits, shared evenly between the worker processes."""
+    host = host_fingerprint()
+    workers = host["worker_processes"]
+    threads = max(1, host["cpus"] // workers)
+    batch_sizes = dict(BATCH_SIZE_TIERS[_tier_index(host["memory_mb"] // workers)][1])
+    # pdftext forks its own processes; with several workers they would compete for the same CPUs
+    pdftext_workers = 1 if workers > 1 else min(4, threads)
+    return TuningProfile(threads, batch_sizes, pdftext_workers, "auto")
+
+
+def load_profile(path: Path) -> Optional[TuningProfile]:
+    """A saved profile, if it exists and was calibrated on an equivalent host."""
+    logger = get_logger()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read tuning profile {path}: {e}")
+        return None
+    if data.get("version") != PROFILE_FORMAT_VERSION or data.get("host") != host_fingerprint():
+        logger.warning(f"Tuning profile {path} was calibrated for {data.get('host')}, this host is {host_fingerprint()}. Using automatic settings.")
+        return None
+    return TuningProfile(data["torch_threads"], data["batch_sizes"], data["pdftext_workers"], "profile", data.get("measured", {}))
+
+
+def save_profile(path: Path, profile: TuningProfile):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_json(path, {
+        "version": PROFILE_FORMAT_VERSION,
+        "host": host_fingerprint(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **{key: value for key, value in asdict(profile).items() if key != "source"}
+    })
+
+
+_profile: Optional[TuningProfile] = None
+
+
+def get_tuning_profile() -> Optional[TuningProfile]:
+    """The settings in effect: the saved profile, else automatic ones. None when TUNING is "off"."""
+    global _profile
+    if TUNING == "off":
+        return None
+    if _profile is None:
+        _profile = (load_profile(Path(TUNING_PROFILE_PATH)) if TUNING_PROFILE_PATH else None) or auto_profile()
+        get_logger().info(f"Tuning ({_profile.source}): {_profile.torch_threads} torch threads, batch sizes {_profile.batch_sizes}")
+    return _profile
+
+
+def apply_thread_settings(profile: Optional[TuningProfile]):
+    """Set the torch thread count. Explicit OMP_NUM_THREADS/MKL_NUM_THREADS in the environment are kept."""
+    if profile is None:
+        return
+    # Read by the OpenMP/MKL runtimes when torch is first imported
+    os.environ.setdefault("OMP_NUM_THREADS", str(profile.torch_threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(profile.torch_threads))
+    import torch
+    torch.set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+
+
+def _sample_books(pdf_paths: List[Path], work_dir: Path) -> List[Path]:
+    if pdf_paths:
+        return pdf_paths
+    from benchmarks.corpus import build_book
+    # One born-digital and one scanned book exercise both the text and the OCR models
+    return [build_book("text", 4, work_dir / "text.pdf"), build_book("scanned", 4, work_dir / "scanned.pdf")]
+
+
+def calibrate(output: Path, pdf_paths: List[Path]) -> TuningProfile:
+    """Convert sample books with thread and batch-size candidates around the automatic settings and save the fastest."""
+    import torch
+    from benchmarks.run import peak_rss_bytes, reset_peak_rss
+    from pdf_utils import get_page_count
+    from service import MarkerPDFConverter
+    base = auto_profile()
+    host = host_fingerprint()
+    memory_budget = host["memory_mb"] / host["worker_processes"] * 0.9 * 1024 * 1024
+    thread_options = sorted({base.torch_threads, max(1, base.torch_threads // 2), max(1, base.torch_threads * 3 // 4)})
+    tier = _tier_index(host["memory_mb"] // host["worker_processes"])
+    tier_options = [BATCH_SIZE_TIERS[index][1] for index in range(max(0, tier - 1), min(len(BATCH_SIZE_TIERS), tier + 2))]
+    converter = MarkerPDFConverter()
+    best: Optional[TuningProfile] = None
+    with tempfile.TemporaryDirectory(prefix="pdf2markdown-calibrate-") as tmp:
+        books = _sample_books(pdf_paths, Path(tmp))
+        pages = sum(get_page_count(book) for book in books)
+        for threads in thread_options:
+            for batch_sizes in tier_options:
+                candidate = TuningProfile(threads, dict(batch_sizes), base.pdftext_workers, "calibrated")
+                torch.set_num_threads(threads)
+                converter.tuning = candidate
+                converter.converter = converter._build_converter()
+                reset_peak_rss()
+                started = time.perf_counter()
+                for index, book in enumerate(books):
+                    out_dir = Path(tmp) / f"run-{threads}-{batch_sizes['recognition_batch_size']}-{index}"
+                    out_dir.mkdir()
+                    converter.convert_pdf_to_markdown(str(book), str(out_dir / "out.md"), out_dir / "images")
+                seconds = time.perf_counter() - started
+                peak = peak_rss_bytes()
+                candidate.measured = {"pages_per_second": round(pages / seconds, 3), "peak_rss_mb": peak // (1024 * 1024)}
+                fits = peak <= memory_budget
+                print(f"threads={threads:3} recognition_batch={batch_sizes['recognition_batch_size']:3} "
+                      f"{candidate.measured['pages_per_second']:7.3f} pages/s {candidate.measured['peak_rss_mb']:7} MB"
+                      f"{'' if fits else '  (over memory budget)'}", flush=True)
+                if fits and (best is None or candidate.measured["pages_per_second"] > best.measured["pages_per_second"]):
+                    best = candidate
+    if best is None:
+        print("No candidate stayed within the memory budget; keeping the smallest batch sizes.")
+        best = TuningProfile(thread_options[0], dict(BATCH_SIZE_TIERS[0][1]), base.pdftext_workers, "calibrated")
+    save_profile(output, best)
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect or calibrate the model thread and batch-size settings.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="Print the container limits and the settings in effect")
+    calibrate_parser = commands.add_parser("calibrate", help="Measure candidates and save the fastest as the profile")
+    calibrate_parser.add_argument("--pdf", type=Path, action="append", default=[], help="Sample PDF (repeatable); defaults to synthetic books")
+    calibrate_parser.add_argument("--output", type=Path, default=Path(TUNING_PROFILE_PATH) if TUNING_PROFILE_PATH else None,
+                                  help="Profile file (defaults to TUNING_PROFILE_PATH)")
+    args = parser.parse_args(argv)
+    if args.command == "show":
+        print(json.dumps({"host": host_fingerprint(), "profile": asdict(get_tuning_profile()) if get_tuning_profile() else None}, indent=2))
+        return 0
+    if args.output is None:
+        parser.error("--output is required when TUNING_PROFILE_PATH is not set")
+    profile = calibrate(args.output, args.pdf)
+    print(f"Profile written to {args.output}: {profile.torch_threads} threads, batch sizes {profile.batch_sizes}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
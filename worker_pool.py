@@ -0,0 +1,355 @@
+"""
+Supervised pool of worker processes.
+The parent loads the Marker models once and forks the children, so the model weights are shared
+copy-on-write. Children claim jobs with a lease in the {guid} directory, which also keeps other
+nodes sharing the storage away from the book (see job_lease).
+Conversions always run in a child: a child is replaced by a fresh fork after WORKER_MAX_BOOKS books or
+once its memory grows past WORKER_RECYCLE_MEMORY_MB, and the parent's watchdog kills conversions over
+the per-job memory and time limits. A killed book is marked failed with the reason and retried later.
+"""
+
+import atexit
+import gc
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from logger import get_logger
+from event_logger import write_service_event
+from job_discovery import DiscoveryFeed, JobDiscovery
+from job_index import current_signature
+from job_lease import JobLease
+from process_utils import rss_bytes
+from scheduler import QUEUE_REFRESH_SECONDS, RUNNING_JOBS_DIR, RunningJobs, Scheduler, refresh_queue_snapshot
+from instrumentation import stage
+from job_retry import EXITED, MEMORY, TIMEOUT, WORKER_MEMORY, killed_progress, retry_blocked
+from metrics import JOB_SECONDS, JOBS_TOTAL, PAGE_SECONDS, PAGES_TOTAL, flush_snapshot, start_snapshot_writer
+from config import (JOB_MAX_MEMORY_MB, JOB_TIMEOUT_SECONDS, JOB_TIMEOUT_SECONDS_PER_PAGE, JOB_WATCHER, METRICS_SNAPSHOT_SECONDS,
+                    POLL_INTERVAL_SECONDS, RECONCILE_INTERVAL_SECONDS, WORKER_MAX_BOOKS, WORKER_RECYCLE_MEMORY_MB)
+
+def get_private_memory_bytes(pid: int) -> int:
+    """Memory a process does not share with others (private clean + dirty pages), falling back to RSS."""
+    try:
+        private = 0
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                    private += int(line.split()[1]) * 1024
+        return private
+    except OSError:
+        return rss_bytes(pid)
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid followed by all its descendants (e.g. the page-range processes of a parallel conversion)."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", 'r') as f:
+                # The command name may contain spaces and parentheses; the fields after it do not
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, []))
+    return tree
+
+
+class RecyclePolicy:
+    """Decides when a worker process should exit between books, so the pool replaces it with a fresh fork."""
+
+    def __init__(self, max_books: int, max_memory_mb: int):
+        self.max_books = max_books
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.books = 0
+        # Why the process should exit, once it should
+        self.due: Optional[str] = None
+
+    def job_finished(self):
+        self.books += 1
+        if self.max_books and self.books >= self.max_books:
+            self.due = f"converted {self.books} books"
+        elif self.max_memory_bytes:
+            used = get_private_memory_bytes(os.getpid())
+            if used > self.max_memory_bytes:
+                self.due = f"uses {used // (1024 * 1024)} MB after {self.books} books"
+
+
+def run_job(worker, guid_dir: Path, pdf_path: Path, storage_root: Path, owner: Optional[Dict] = None) -> bool:
+    """Process one book, emitting the service-start/service-stop events around it. Returns True on success."""
+    logger = get_logger(storage_root)
+    book_id = Path(guid_dir).name
+    write_service_event("service-start", book_id, "pdf2markdown", storage_root=str(storage_root))
+    try:
+        worker.process_pdf(guid_dir, pdf_path, owner)
+        write_service_event("service-stop", book_id, "pdf2markdown", storage_root=str(storage_root), result="success")
+        return True
+    except Exception as e:
+        write_service_event("service-stop", book_id, "pdf2markdown", storage_root=str(storage_root), result="error", error=str(e))
+        logger.error_with_error(f"Error processing {guid_dir}: {e}", e)
+        return False
+
+
+def run_available_jobs(worker, storage_root: Path, scheduler: Scheduler, guid_dirs: Optional[List[Path]] = None,
+                       recycle: Optional[RecyclePolicy] = None) -> bool:
+    """
+    Queue the available jobs (in guid_dirs, or anywhere if None) and process them in scheduler order
+    until the queue is empty, the memory budget is exhausted or the process is due for recycling.
+    Returns True if any job was found.
+    """
+    found = set()
+    with stage("find_jobs"):
+        for guid_dir, pdf_path in worker.find_jobs(guid_dirs):
+            found.add(guid_dir.name)
+            scheduler.add(guid_dir, pdf_path)
+        if guid_dirs is None:
+            scheduler.retain(found)
+    while True:
+        job = scheduler.peek()
+        if job is None:
+            break
+        # Wait for the memory budget before claiming, so a waiting job does not churn lease generations
+        if not scheduler.admit(job):
+            break
+        lease = JobLease(job.guid_dir)
+        if not lease.acquire():
+            worker.logger.debug(f"Job {job.job_id} is claimed by another worker, skipping.")
+            scheduler.release(job)
+            continue
+        lease.start_heartbeat(lambda: _lease_lost(worker, lease))
+        try:
+            if _retry_blocked(worker, job.guid_dir):
+                # Killed in another worker process since it was queued here
+                scheduler.release(job)
+                continue
+            started = time.monotonic()
+            succeeded = run_job(worker, job.guid_dir, job.pdf_path, storage_root, lease.owner()) and worker.index.is_completed(job.job_id)
+            elapsed = time.monotonic() - started
+            scheduler.finish(job, elapsed, succeeded)
+            record_job_metrics(job.page_count, elapsed, succeeded)
+        finally:
+            lease.release()
+        if recycle is not None:
+            recycle.job_finished()
+            if recycle.due:
+                break
+    return bool(found)
+
+
+def _lease_lost(worker, lease: JobLease):
+    """The book was taken over by another node (our heartbeats stalled past the lease). Stop writing to it at once."""
+    worker.logger.error(f"Lease {lease.path} was taken over, abandoning {lease.guid_dir.name}.", lease.guid_dir.name)
+    # SIGKILL skips every exit hook, so write out the queued log lines first
+    worker.logger.close()
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _retry_blocked(worker, guid_dir: Path) -> bool:
+    try:
+        return retry_blocked(worker.load_progress(guid_dir)) is not None
+    except (OSError, ValueError):
+        return False
+
+
+def record_job_metrics(page_count: int, elapsed: float, succeeded: bool):
+    result = "success" if succeeded else "failed"
+    JOBS_TOTAL.inc(result=result)
+    JOB_SECONDS.observe(elapsed, result=result)
+    if succeeded and page_count > 0:
+        PAGES_TOTAL.inc(page_count)
+        PAGE_SECONDS.observe(elapsed / page_count)
+    flush_snapshot()
+
+
+def create_discovery(storage_root: Path) -> JobDiscovery:
+    discovery = JobDiscovery(storage_root, POLL_INTERVAL_SECONDS, RECONCILE_INTERVAL_SECONDS, JOB_WATCHER == "inotify")
+    discovery.start()
+    return discovery
+
+
+def run_worker_loop(worker, storage_root: Path, recycle: Optional[RecyclePolicy] = None, discovery=None):
+    """
+    Process jobs, woken by job discovery events or its periodic reconciliation scan. Runs forever,
+    or until recycle says the process should be replaced. discovery defaults to a watcher of its own;
+    pool children get a DiscoveryFeed of the node's watcher.
+    """
+    logger = get_logger(storage_root)
+    discovery = discovery or create_discovery(storage_root)
+    scheduler = Scheduler(storage_root)
+    while True:
+        # Jobs waiting for the memory budget are retried every poll interval
+        guid_dirs = discovery.next_batch(POLL_INTERVAL_SECONDS if scheduler.pending else None)
+        if not run_available_jobs(worker, storage_root, scheduler, guid_dirs, recycle) and guid_dirs is None:
+            logger.debug("No jobs found. Waiting...")
+        if recycle is not None and recycle.due:
+            logger.info(f"Worker process {os.getpid()} {recycle.due}, exiting to be replaced.")
+            return
+
+
+def _child_main(worker, storage_root: Path, slot: int, channel):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logger = get_logger(storage_root)
+    logger.info(f"Worker process {slot} started (pid {os.getpid()})")
+    start_snapshot_writer(f"worker-{slot}", METRICS_SNAPSHOT_SECONDS)
+    try:
+        run_worker_loop(worker, storage_root, RecyclePolicy(WORKER_MAX_BOOKS, WORKER_RECYCLE_MEMORY_MB), DiscoveryFeed(channel))
+    finally:
+        # multiprocessing leaves the child with os._exit, which skips the logger's atexit hook
+        logger.close()
+    flush_snapshot()
+
+
+class WorkerPool:
+    """
+    Forks worker processes from a parent holding the loaded models and restarts them when they exit.
+    The supervisor is also the watchdog of the conversions running in the children.
+    """
+
+    def __init__(self, worker, storage_root: Path, processes: int, max_memory_mb: int = 0):
+        self.worker = worker
+        self.storage_root = storage_root
+        self.processes = processes
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.logger = get_logger(storage_root)
+        self._context = multiprocessing.get_context("fork")
+        self._children: Dict[int, multiprocessing.Process] = {}
+        self.running_jobs = RunningJobs(RUNNING_JOBS_DIR)
+        self._discovery: Optional[JobDiscovery] = None
+        self._next_queue_refresh = 0.0
+        # Queue of discovery batches of each child
+        self._channels: Dict[int, "multiprocessing.queues.Queue"] = {}
+        # Running-registry entry of each child's current job, and why the watchdog killed a child
+        self._jobs: Dict[int, Dict] = {}
+        self._kills: Dict[int, tuple[str, str]] = {}
+        atexit.register(self.stop)
+
+    def _start_child(self, slot: int):
+        # Move everything allocated so far out of the GC's reach so collections in the
+        # children do not touch (and therefore copy) the pages holding the model objects.
+        gc.freeze()
+        channel = self._context.Queue()
+        # A new child starts with a full scan
+        channel.put(None)
+        process = self._context.Process(target=_child_main, args=(self.worker, self.storage_root, slot, channel), name=f"pdf2markdown-worker-{slot}")
+        process.start()
+        self._children[slot] = process
+        self._channels[slot] = channel
+        self.logger.info(f"Started worker process {slot} (pid {process.pid})")
+
+    def _forward_discovery(self):
+        """Run the node's only job watcher and hand every batch to all children."""
+        while True:
+            batch = self._discovery.next_batch()
+            for channel in list(self._channels.values()):
+                channel.put(batch)
+
+    def start(self):
+        self._discovery = create_discovery(self.storage_root)
+        threading.Thread(target=self._forward_discovery, name="pdf2markdown-discovery-forwarder", daemon=True).start()
+        for slot in range(self.processes):
+            self._start_child(slot)
+
+    def supervise_once(self):
+        """Restart exited children, kill conversions over the limits and record the books of children that died mid-job."""
+        entries = {entry["pid"]: entry for entry in self.running_jobs.entries()}
+        if time.monotonic() >= self._next_queue_refresh:
+            refresh_queue_snapshot(self.storage_root)
+            self._next_queue_refresh = time.monotonic() + QUEUE_REFRESH_SECONDS
+        for slot, process in list(self._children.items()):
+            if not process.is_alive():
+                process.join()
+                job = self._jobs.pop(slot, None)
+                kill = self._kills.pop(slot, None)
+                if process.exitcode == 0 and job is None:
+                    self.logger.info(f"Worker process {slot} (pid {process.pid}) was recycled, starting a new one.")
+                else:
+                    self.logger.warning(f"Worker process {slot} (pid {process.pid}) exited with code {process.exitcode}, restarting.")
+                    if job is not None:
+                        self._record_killed(job, *(kill or (EXITED, f"worker process exited with code {process.exitcode}")))
+                self._start_child(slot)
+                continue
+            # Entries are only read for live children, so a child that dies keeps its last job
+            self._jobs[slot] = entries.get(process.pid)
+            if slot not in self._kills:
+                self._enforce_limits(slot, process)
+
+    def _enforce_limits(self, slot: int, process: multiprocessing.Process):
+        if self.max_memory_bytes:
+            used = get_private_memory_bytes(process.pid)
+            if used > self.max_memory_bytes:
+                self._kill(slot, process, WORKER_MEMORY,
+                           f"worker process used {used // (1024 * 1024)} MB, over the {self.max_memory_bytes // (1024 * 1024)} MB cap")
+                return
+        job = self._jobs.get(slot)
+        if job is None:
+            return
+        if JOB_MAX_MEMORY_MB:
+            used = sum(get_private_memory_bytes(pid) for pid in process_tree(process.pid))
+            if used > JOB_MAX_MEMORY_MB * 1024 * 1024:
+                self._kill(slot, process, MEMORY, f"conversion used {used // (1024 * 1024)} MB, over the {JOB_MAX_MEMORY_MB} MB job limit")
+                return
+        timeout = JOB_TIMEOUT_SECONDS + JOB_TIMEOUT_SECONDS_PER_PAGE * job.get("page_count", 0)
+        elapsed = time.time() - job["started_at"]
+        if timeout and elapsed > timeout:
+            self._kill(slot, process, TIMEOUT, f"conversion ran for {round(elapsed)} s, over the {timeout} s limit")
+
+    def _kill(self, slot: int, process: multiprocessing.Process, reason: str, detail: str):
+        """Kill the child and its page-range processes; the book is recorded once the child has exited."""
+        self.logger.warning(f"Worker process {slot} (pid {process.pid}): {detail}. Killing it.")
+        self._kills[slot] = (reason, detail)
+        for pid in reversed(process_tree(process.pid)):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _record_killed(self, job: Dict, reason: str, detail: str):
+        """Mark the book of a killed conversion failed with the reason and schedule its retry."""
+        guid_dir = Path(job["guid_dir"])
+        book_id = guid_dir.name
+        # The dead child's lease is on this node, so it can be taken over right away
+        lease = JobLease(guid_dir)
+        if not lease.acquire():
+            # Another worker has already taken the book over
+            return
+        try:
+            progress = self.worker.load_progress(guid_dir)
+            if progress.get("status") == "completed":
+                return
+            killed = killed_progress(progress, reason, detail)
+            self.worker.save_progress(guid_dir, killed)
+            self.worker.index.record(book_id, "failed", job["pdf"], killed["error"], current_signature(guid_dir / job["pdf"]),
+                                     killed.get("next_retry_at"))
+            write_service_event("service-stop", book_id, "pdf2markdown", storage_root=str(self.storage_root), result="error", error=killed["error"])
+            JOBS_TOTAL.inc(result="killed")
+            retry = f"retry at {killed['next_retry_at']}" if "next_retry_at" in killed else "no retries left"
+            self.logger.warning(f"Book {book_id} killed ({reason}) on attempt {killed['attempts']}, {retry}.", book_id)
+        except Exception as e:
+            self.logger.error_with_error(f"Could not record killed book {book_id}: {e}", e)
+        finally:
+            lease.release()
+
+    def run(self, on_started=None):
+        """Start the pool and supervise it forever."""
+        self.start()
+        if on_started:
+            on_started()
+        while True:
+            self.supervise_once()
+            # Woken as soon as a child exits, so a killed book is recorded before another worker can claim it
+            multiprocessing.connection.wait([process.sentinel for process in self._children.values()], timeout=1)
+
+    def stop(self):
+        for process in self._children.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._children.values():
+            process.join(timeout=10)